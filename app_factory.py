@@ -3,9 +3,11 @@ from contextlib import asynccontextmanager
 from pathlib import Path
 from db.database import engine, get_db_session_factory
 from db.database import Base
+from db.book_search import create_book_search_indexes
 from config.settings import Settings
 from ingestion.book_loader import upload_missing_book_ids
 from stats import make_collection_fingerprint
+from vector_store_utils import backfill_book_router
 import matplotlib
 matplotlib.use("Agg")
 from datetime import datetime
@@ -14,6 +16,7 @@ from datetime import datetime
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:      # startup, create tables
         await conn.run_sync(Base.metadata.create_all)
+        await create_book_search_indexes(conn)
 
     settings: Settings = app.state.settings
 
@@ -36,6 +39,8 @@ async def lifespan(app: FastAPI):
                                                     db_factory=db_factory)
 
     hp = settings.get_hyperparams()
+    if hp.retrieval.route_top_m:            # books indexed before the router existed, else two-stage search stays flat
+        await backfill_book_router(sett=settings, vec_store=await settings.get_vector_store())
 
     if len(book_stats) > 0:
         try:
@@ -50,6 +55,7 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    await settings.close_gutendex_client()
     await engine.dispose()
 
 
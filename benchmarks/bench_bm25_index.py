@@ -0,0 +1,53 @@
+"""
+Build time, size and query latency of the local BM25 index on a synthetic corpus (Zipf distributed vocabulary).
+
+    python -m benchmarks.bench_bm25_index --books 10 --chunks-pr-book 3000
+"""
+import argparse, statistics, time
+import numpy as np
+
+from config.params import EmbeddingDimension
+from models.vector_db_model import UploadChunk, EmbeddingVec
+from retrieval.bm25 import BM25Index
+
+
+def _make_book(book_id:int, n_chunks:int, words_pr_chunk:int, vocab:np.ndarray, rng) -> list[UploadChunk]:
+    vec = EmbeddingVec(vector=np.zeros(EmbeddingDimension.SMALL.value, dtype=np.float32), dim=EmbeddingDimension.SMALL)
+    word_ids = np.minimum(rng.zipf(1.2, size=(n_chunks, words_pr_chunk)), len(vocab)) - 1
+    return [UploadChunk(uuid_str=f"{book_id:08d}-0000-0000-0000-{i:012d}", book_name=f"book {book_id}", book_id=book_id,
+                        chunk_id=i, content=" ".join(vocab[ids]), token_count=0, char_count=0, content_vector=vec)
+            for i, ids in enumerate(word_ids)]
+
+
+def run(args) -> None:
+    rng = np.random.default_rng(0)
+    vocab = np.array([f"w{i}" for i in range(50_000)])
+    books = [_make_book(b, args.chunks_pr_book, args.words_pr_chunk, vocab, rng) for b in range(args.books)]
+
+    index = BM25Index()
+    start = time.perf_counter()
+    for chunks in books:
+        index.add_chunks(chunks)
+    build_secs = time.perf_counter() - start
+
+    postings_bytes = sum(s.doc_ids.nbytes + s.tfs.nbytes + s.offsets.nbytes for s in index._segments.values())
+    print(f"{index.n_docs} chunks indexed in {build_secs:.2f}s, postings arrays {postings_bytes / 1e6:.1f} MB")
+
+    queries = [" ".join(vocab[rng.integers(0, 2000, size=args.query_terms)]) for _ in range(200)]
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        index.search(q, k=15)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"{args.query_terms}-term queries: p50 {statistics.median(latencies) * 1000:.2f} ms, "
+          f"p95 {latencies[int(0.95 * len(latencies))] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=10)
+    parser.add_argument("--chunks-pr-book", type=int, default=3000)
+    parser.add_argument("--words-pr-chunk", type=int, default=300)
+    parser.add_argument("--query-terms", type=int, default=6)
+    run(parser.parse_args())
@@ -0,0 +1,64 @@
+"""
+Latency of the /v1/books/* endpoints under concurrency, with the app in-process (ASGI) against the configured Postgres DB.
+Compares the engine settings of config/settings.py against the old engine (echo=True, default pool, statement cache on).
+
+    python -m benchmarks.bench_book_endpoints --requests 400 --concurrency 20 --book-id 84
+"""
+import argparse, asyncio, logging, statistics, time
+from typing import AsyncGenerator
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from config.params import VER_PREFIX
+from config.settings import get_settings
+from db.database import POSTGRES_DB_URL, create_db_engine, get_async_db_sess
+from main import app
+
+
+async def _load(client:AsyncClient, paths:list[str], n_requests:int, concurrency:int) -> tuple[list[float], float]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def _one(i:int) -> None:
+        async with sem:
+            start = time.perf_counter()
+            resp = await client.get(paths[i % len(paths)])
+            latencies.append(time.perf_counter() - start)
+            assert resp.status_code < 500, resp.text
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_one(i) for i in range(n_requests)))
+    return sorted(latencies), time.perf_counter() - start
+
+
+async def run(args) -> None:
+    sett = get_settings()
+    paths = [f"/{VER_PREFIX}/books/{args.book_id}", f"/{VER_PREFIX}/books/search?title={args.title}", f"/{VER_PREFIX}/books/"]
+    engines = {"old": create_async_engine(POSTGRES_DB_URL, echo=True),
+               "tuned": create_db_engine(POSTGRES_DB_URL, sett)}
+
+    for name, engine in engines.items():
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO if name == "old" else logging.WARNING)
+        session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async def _sess() -> AsyncGenerator[AsyncSession, None]:
+            async with session_maker() as session:
+                yield session
+        app.dependency_overrides[get_async_db_sess] = _sess
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            await _load(client, paths, args.concurrency, args.concurrency)       # warm up the pool
+            latencies, secs = await _load(client, paths, args.requests, args.concurrency)
+        await engine.dispose()
+
+        print(f"{name:>5}: {args.requests / secs:6.1f} req/s, p50 {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p95 {latencies[int(0.95 * len(latencies))] * 1000:.1f} ms")
+    app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--book-id", type=int, default=84)
+    parser.add_argument("--title", default="Frankenstein")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,90 @@
+"""
+Flat vs. two-stage (book routed) dense search on a synthetic library: each book covers a few topics,
+its chunk vectors scatter around them. Queries are noisy copies of a random chunk; recall@k is measured
+against the exact flat top k, latency of the routed search includes routing.
+Runs against Qdrant in local in-process mode by default, --url for a server (payload index on book_id).
+
+    python -m benchmarks.bench_book_routing --books 200 --chunks-pr-book 300 --top-m 10
+"""
+import argparse, asyncio, statistics, time, uuid
+import numpy as np
+
+from config.params import EmbeddingDimension
+from config.settings import get_settings
+from db.qdrant_vector_store import QdrantVectorStore
+from models.vector_db_model import UploadChunk, EmbeddingVec
+from qdrant_client import AsyncQdrantClient
+from retrieval.book_router import BookRouter
+
+DIM = EmbeddingDimension.SMALL.value
+
+
+def _unit(m:np.ndarray) -> np.ndarray:
+    return (m / np.linalg.norm(m, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def _book_vecs(n_chunks:int, n_topics:int, rng) -> np.ndarray:
+    topics = _unit(rng.normal(size=(n_topics, DIM)))
+    return _unit(topics[rng.integers(0, n_topics, size=n_chunks)] + 0.6 * _unit(rng.normal(size=(n_chunks, DIM))))
+
+
+def _p(latencies:list[float], q:float) -> float:
+    return sorted(latencies)[int(q * len(latencies))] * 1000
+
+
+async def run(args) -> None:
+    rng = np.random.default_rng(0)
+    store = QdrantVectorStore(settings=get_settings(is_test=True), collection_name="bench_book_routing")
+    store._client = AsyncQdrantClient(url=args.url) if args.url else AsyncQdrantClient(location=":memory:")
+    await store.delete_collection(collection_name=store.collection_name)
+    await store.create_missing_collection(collection_name=store.collection_name)
+    router = BookRouter()
+
+    books: dict[int, np.ndarray] = {}
+    for b_id in range(args.books):
+        vecs = _book_vecs(args.chunks_pr_book, args.topics_pr_book, rng)
+        books[b_id] = vecs
+        await store.upsert_chunks(chunks=[UploadChunk(uuid_str=str(uuid.uuid4()), book_name=f"book {b_id}", book_id=b_id,
+                                                      chunk_id=i, content="", token_count=0, char_count=0,
+                                                      content_vector=EmbeddingVec(vector=v, dim=EmbeddingDimension.SMALL))
+                                          for i, v in enumerate(vecs)])
+        router.add_book(b_id, vecs, n_centroids=args.centroids)
+    print(f"{args.books * args.chunks_pr_book} chunks in {args.books} books, {len(router._vecs)} routing vectors")  # type:ignore
+
+    recalls, flat_lat, routed_lat, route_lat = [], [], [], []
+    for _ in range(args.queries):
+        b_id = int(rng.integers(0, args.books))
+        q = _unit(books[b_id][rng.integers(0, args.chunks_pr_book)] + args.query_noise * _unit(rng.normal(size=DIM)))
+        query = EmbeddingVec(vector=q, dim=EmbeddingDimension.SMALL)
+
+        start = time.perf_counter()
+        flat = await store.search_by_embedding(embed_query_vector=query, filter=None, k=args.k, fields=["uuid_str"])
+        flat_lat.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        routed_books = router.route(q, args.top_m)
+        route_lat.append(time.perf_counter() - start)
+        routed = await store.search_by_embedding(embed_query_vector=query, filter={"book_id": routed_books},
+                                                 k=args.k, fields=["uuid_str"])
+        routed_lat.append(time.perf_counter() - start)
+        recalls.append(len({h.uuid_str for h in flat} & {h.uuid_str for h in routed}) / len(flat))
+
+    print(f"flat   : p50 {_p(flat_lat, 0.5):.2f} ms, p95 {_p(flat_lat, 0.95):.2f} ms")
+    print(f"routed : p50 {_p(routed_lat, 0.5):.2f} ms, p95 {_p(routed_lat, 0.95):.2f} ms "
+          f"(routing alone p50 {_p(route_lat, 0.5):.3f} ms), recall@{args.k} vs flat {statistics.mean(recalls):.3f}")
+    await store.delete_collection(collection_name=store.collection_name)
+    await store.close_conn()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=200)
+    parser.add_argument("--chunks-pr-book", type=int, default=300)
+    parser.add_argument("--topics-pr-book", type=int, default=4)
+    parser.add_argument("--centroids", type=int, default=4)
+    parser.add_argument("--top-m", type=int, default=10)
+    parser.add_argument("--k", type=int, default=15)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-noise", type=float, default=0.5)
+    parser.add_argument("--url", default=None, help="Qdrant server url, default local in-process mode")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,65 @@
+"""
+/v1/books/search latency on a catalogue sized book_metadata table (synthetic titles/authors), SQLite file DB:
+trigram FTS5 search (select_books_like_db) vs. the old ILIKE '%term%' sequential scan.
+
+    python -m benchmarks.bench_book_search --books 75000
+"""
+import argparse, asyncio, statistics, tempfile, time
+from pathlib import Path
+import numpy as np
+from sqlalchemy import insert, select, or_
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from db.book_search import create_book_search_indexes
+from db.database import Base
+from db.operations import select_books_like_db
+from models.schema import DBBookMetaData
+
+
+async def _time(fn, queries:list[tuple[str|None, str|None]]) -> list[float]:
+    latencies = []
+    for title, authors in queries:
+        start = time.perf_counter()
+        await fn(title, authors)
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+async def run(args) -> None:
+    rng = np.random.default_rng(0)
+    words = np.array([f"{w}{i}" for i, w in enumerate(["whale", "island", "prometheus", "case", "tome", "journey", "night", "garden"] * 500)])
+    names = np.array([f"Author{i}, Name{i % 97}" for i in range(args.books // 3)])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp, 'books.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await create_book_search_indexes(conn)
+            rows = [{"gb_id": i + 1, "title": " ".join(rng.choice(words, size=5)), "authors": str(rng.choice(names)),
+                     "summary": "", "languages": "en"} for i in range(args.books)]
+            start = time.perf_counter()
+            await conn.execute(insert(DBBookMetaData), rows)
+            print(f"{args.books} books inserted (+ FTS index) in {time.perf_counter() - start:.1f}s")
+
+        queries = [(str(rng.choice(words))[:-1], None) for _ in range(args.queries // 2)] + \
+                  [(None, str(rng.choice(names)).split(",")[0]) for _ in range(args.queries // 2)]
+
+        async with AsyncSession(engine) as sess:
+            async def _fts(title, authors):
+                return await select_books_like_db(title=title, authors=authors, take=50, db_sess=sess)
+
+            async def _ilike(title, authors):
+                cond = DBBookMetaData.title.ilike(f"%{title}%") if title else or_(DBBookMetaData.authors.ilike(f"%{authors}%"))
+                return (await sess.execute(select(DBBookMetaData).where(cond))).scalars().all()
+
+            for name, fn in {"ilike": _ilike, "trigram fts": _fts}.items():
+                lat = await _time(fn, queries)
+                print(f"{name:>12}: p50 {statistics.median(lat) * 1000:.2f} ms, p95 {lat[int(0.95 * len(lat))] * 1000:.2f} ms")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=75_000)
+    parser.add_argument("--queries", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,85 @@
+"""
+Peak memory (tracemalloc) + time of getting a downloaded book's cleaned text, synthetic Gutenberg formatted book
+served in 64 KB blocks by an httpx MockTransport:
+    old: resp.text -> cache put -> clean_headers by regex on the full text + a lowercased copy
+    new: stream_book_paragraphs, blocks written to the cache and cleaned line by line as they arrive
+
+    python -m benchmarks.bench_book_streaming --mb 40
+"""
+import argparse, asyncio, re, tempfile, time, tracemalloc
+from pathlib import Path
+import httpx
+
+from ingestion.book_cache import BookCache
+from ingestion.book_loader import stream_book_paragraphs
+from ingestion.gutendex_client import GutendexClient
+from models.api_response_model import GBBookMeta
+
+BLOCK_BYTES = 1 << 16
+
+
+def make_book(n_mb:int) -> bytes:
+    para = ("It was on a dreary night of November that I beheld the accomplishment of my toils.\r\n" * 6) + "\r\n"
+    body = para * (n_mb * 1_000_000 // len(para))
+    return ("The Project Gutenberg eBook of Bench\r\n\r\n*** START OF THE PROJECT GUTENBERG EBOOK BENCH ***\r\n\r\n"
+            + body + "*** END OF THE PROJECT GUTENBERG EBOOK BENCH ***\r\n" + "license\r\n" * 400).encode("utf-8")
+
+
+def old_clean_headers(*, raw_book:str) -> str:
+    start_match = re.search(pattern=r'\*\*\*\s?START OF TH(IS|E) PROJECT GUTENBERG EBOOK', string=raw_book)
+    end_match = re.search(pattern=r'\*\*\* end of the project gutenberg ebook', string=raw_book.lower())
+    return raw_book[start_match.end():end_match.start()] if start_match and end_match else ""
+
+
+def make_client(book_p:Path) -> GutendexClient:
+    async def body():
+        with open(book_p, "rb") as f:
+            while block := f.read(BLOCK_BYTES):
+                yield block
+    def handler(request:httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/plain; charset=utf-8"}, content=body())
+    return GutendexClient(base_url="https://gutendex.test", transport=httpx.MockTransport(handler))
+
+
+async def old_path(client:GutendexClient, cache:BookCache, gb_meta:GBBookMeta) -> int:
+    async with client.stream("https://www.gutenberg.test/bench.txt") as resp:
+        await resp.aread()
+    raw = resp.text
+    cache.put(gb_meta, raw)
+    return len(old_clean_headers(raw_book=raw))
+
+
+async def new_path(client:GutendexClient, cache:BookCache, gb_meta:GBBookMeta) -> int:
+    paragraphs = await stream_book_paragraphs(url="https://www.gutenberg.test/bench.txt", gb_meta=gb_meta, book_cache=cache, gutendex=client)
+    book_str = "\n\n".join(paragraphs)
+    del paragraphs
+    return len(book_str)
+
+
+async def measure(fn, book_p:Path, tmp:Path, name:str) -> None:
+    gb_meta = GBBookMeta(id=1, title="Bench", summaries=[], subjects=[], languages=["en"],
+                         authors=[], editors=[], download_count=0, formats={}, copyright=False)
+    client, cache = make_client(book_p), BookCache(root=tmp / name)
+    tracemalloc.start()
+    start = time.perf_counter()
+    n_chars = await fn(client, cache, gb_meta)
+    secs = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await client.aclose()
+    print(f"{name}: {n_chars/1e6:.1f}M cleaned chars, peak {peak/1e6:.0f} MB, {secs:.2f} s")
+
+
+async def run(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        book_p = Path(tmp, "book.txt")
+        book_p.write_bytes(make_book(args.mb))
+        print(f"Book: {book_p.stat().st_size/1e6:.0f} MB")
+        await measure(old_path, book_p, Path(tmp), "old")
+        await measure(new_path, book_p, Path(tmp), "new")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=40)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,50 @@
+"""
+Local embedding store: file size and lookup latency of float16 vs float32 blobs, plus the cosine error of float16,
+for a store of --n text-embedding-3-small sized vectors. Lookups are batches of 64 texts, like an ingestion batch.
+
+    python -m benchmarks.bench_embedding_store --n 50000
+"""
+import argparse, statistics, tempfile, time
+from pathlib import Path
+import numpy as np
+from config.params import EmbeddingDimension
+from ingestion.embedding_store import EmbeddingStore
+from models.vector_db_model import EmbeddingVec
+
+MODEL = "text-embedding-3-small"
+
+
+def run(args) -> None:
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(args.n, 1536)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    texts = [f"sentence group {i} of some book" for i in range(args.n)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in ("float32", "float16"):
+            store = EmbeddingStore(Path(tmp, f"{dtype}.sqlite"), dtype=dtype)
+            start = time.perf_counter()
+            for i in range(0, args.n, 1000):
+                store.put_many(MODEL, texts[i:i + 1000], [EmbeddingVec(vector=v, dim=EmbeddingDimension.SMALL) for v in vecs[i:i + 1000]])
+            write_secs = time.perf_counter() - start
+
+            latencies, cos = [], []
+            for _ in range(200):
+                idxs = rng.integers(0, args.n, size=64)
+                start = time.perf_counter()
+                got = store.get_many(MODEL, 1536, [texts[i] for i in idxs])
+                latencies.append(time.perf_counter() - start)
+                cos.extend(float(g.vector @ vecs[i]) for g, i in zip(got, idxs))      # type:ignore
+            store.close()
+
+            size_mb = sum(p.stat().st_size for p in Path(tmp).glob(f"{dtype}.sqlite*")) / 1e6
+            latencies.sort()
+            print(f"{dtype}: {size_mb:.0f} MB, write {args.n / write_secs:.0f} vecs/s, "
+                  f"get 64: p50 {statistics.median(latencies)*1e3:.2f} ms p95 {latencies[int(0.95 * len(latencies))]*1e3:.2f} ms, "
+                  f"min cosine to original {min(cos):.6f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=50_000)
+    run(parser.parse_args())
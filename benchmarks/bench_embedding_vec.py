@@ -0,0 +1,51 @@
+"""
+Peak RSS + time for turning embedding API responses into Qdrant points for one large book.
+No network: the embedding responses are simulated as base64 float32 strings (what the API returns).
+
+    python -m benchmarks.bench_embedding_vec --chunks 6000
+"""
+import argparse, base64, resource, time, uuid
+import numpy as np
+
+from config.params import EmbeddingDimension
+from embedding_pipeline import _decode_embedding
+from models.vector_db_model import EmbeddingVec, UploadChunk
+from qdrant_client.models import PointStruct
+
+
+def _fake_api_embeddings(n:int, dim:int) -> list[str]:
+    rng = np.random.default_rng(42)
+    return [base64.b64encode(rng.random(dim, dtype=np.float32).tobytes()).decode("ascii") for _ in range(n)]
+
+
+def run(n_chunks:int, chunk_chars:int) -> None:
+    dim = EmbeddingDimension.SMALL
+    api_data = _fake_api_embeddings(n_chunks, dim.value)
+    content = "x" * chunk_chars
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    upload_chunks = [UploadChunk(uuid_str=str(uuid.uuid4()),
+                                book_name="bench", book_id=1, chunk_id=i,
+                                content=content, token_count=0, char_count=chunk_chars,
+                                content_vector=EmbeddingVec(vector=_decode_embedding(d), dim=dim))
+                    for i, d in enumerate(api_data)]
+    embed_secs = time.perf_counter() - start
+
+    # Client boundary: vectors become list[float] (same as QdrantVectorStore.upsert_chunks)
+    start = time.perf_counter()
+    _ = [PointStruct(id=c.uuid_str, vector=c.content_vector.to_list(), payload={"content": c.content})
+            for c in upload_chunks]
+    points_secs = time.perf_counter() - start
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"chunks={n_chunks} build_chunks={embed_secs:.3f}s build_points={points_secs:.3f}s "
+          f"peak_rss_growth={(rss_after - rss_before) / 1024:.1f}MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=6000)
+    parser.add_argument("--chunk-chars", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.chunks, args.chunk_chars)
@@ -0,0 +1,68 @@
+"""
+Dense vs hybrid (dense + BM25 fused by RRF) retrieval on the gold eval set, plus the cost of the fusion itself.
+The recall run needs the configured vector store (collection populated with the gold books, sparse vectors included) + embedding deployment.
+
+    python -m benchmarks.bench_hybrid_rrf --fusion-only
+    python -m benchmarks.bench_hybrid_rrf --top-k 15
+"""
+import argparse, asyncio, csv, statistics, time
+from pathlib import Path
+
+from config.settings import get_settings
+from models.vector_db_model import SearchChunk
+from retrieval.bm25 import tokenize
+from retrieval.fusion import reciprocal_rank_fusion
+from retrieval.retrieve import search_chunks
+
+GOLD_CSV = Path("evals", "datasets", "gb_gold.csv")
+
+
+def bench_fusion(top_k:int, repeats:int=2000) -> None:
+    dense = [SearchChunk(uuid_str=f"d{i}", search_score=1.0) for i in range(top_k)]
+    keyword = [SearchChunk(uuid_str=f"d{i}" if i % 2 else f"k{i}", search_score=1.0) for i in range(top_k)]
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        reciprocal_rank_fusion([dense, keyword], top_n=top_k)
+    secs = (time.perf_counter() - start) / repeats
+    print(f"RRF of 2 x {top_k} hits: {secs * 1e6:.1f} us pr. query")
+
+
+def is_hit(expected:str, chunks:list[SearchChunk]) -> bool:
+    """The expected answer's terms all occur in one retrieved chunk."""
+    answer_terms = set(tokenize(expected))
+    return any(answer_terms <= set(tokenize(c.content or "")) for c in chunks)
+
+
+async def bench_recall(top_k:int) -> None:
+    sett = get_settings()
+    req_lim, tok_lim = sett.get_limiters()
+    vector_store = await sett.get_vector_store()
+    with GOLD_CSV.open(encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    for search_type in ("vector", "hybrid_search"):
+        hits, latencies = 0, []
+        for row in rows:
+            start = time.perf_counter()
+            chunks = await search_chunks(query=row["question"], vector_store=vector_store,
+                                         embed_client=sett.get_async_emb_client(),
+                                         embed_model_deployed=sett.EMBED_MODEL_DEPLOYMENT,
+                                         tok_lim=tok_lim, req_lim=req_lim,
+                                         keep_top_k=top_k, search_type=search_type)       # type:ignore
+            latencies.append(time.perf_counter() - start)
+            hits += is_hit(row["expected_output"], chunks)
+
+        print(f"{search_type:>13}: recall@{top_k} {hits}/{len(rows)} = {hits / len(rows):.2f}, "
+              f"p50 {statistics.median(latencies) * 1000:.0f} ms, max {max(latencies) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--fusion-only", action="store_true")
+    args = parser.parse_args()
+
+    bench_fusion(args.top_k)
+    if not args.fusion_only:
+        asyncio.run(bench_recall(args.top_k))
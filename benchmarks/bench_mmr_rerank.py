@@ -0,0 +1,51 @@
+"""
+Rerank tokens saved by MMR vs. answer quality on the gold eval set.
+For every question the top_k dense hits are fetched once (with vectors), then compared as rerank candidate sets:
+    all top_k  |  the mmr_k most relevant  |  mmr_k picked by MMR
+Quality is the share of questions where the expected answer's terms occur in one of the candidates (what the reranker can find).
+Needs the configured vector store + embedding deployment.
+
+    python -m benchmarks.bench_mmr_rerank --top-k 15 --mmr-k 8 --lambda 0.7
+"""
+import argparse, asyncio, csv
+import tiktoken
+
+from benchmarks.bench_hybrid_rrf import GOLD_CSV, is_hit
+from config.settings import get_settings
+from embedding_pipeline import create_embeddings_async, _count_tokens
+from models.vector_db_model import SearchChunk
+from retrieval.mmr import mmr_select
+
+
+async def run(args) -> None:
+    sett = get_settings()
+    req_lim, tok_lim = sett.get_limiters()
+    vector_store = await sett.get_vector_store()
+    enc = tiktoken.get_encoding("cl100k_base")
+    with GOLD_CSV.open(encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    candidate_sets: dict[str, list[tuple[str, list[SearchChunk]]]] = {"top_k": [], "top_mmr_k": [], "mmr": []}
+    for row in rows:
+        query_vec = (await create_embeddings_async(inp_batches=[[row["question"]]], embed_client=sett.get_async_emb_client(),
+                                                   model_deployed=sett.EMBED_MODEL_DEPLOYMENT,
+                                                   tok_limiter=tok_lim, req_limiter=req_lim))[0]
+        hits = await vector_store.search_by_embedding(embed_query_vector=query_vec, filter=None, k=args.top_k, with_vectors=True)
+        candidate_sets["top_k"].append((row["expected_output"], hits))
+        candidate_sets["top_mmr_k"].append((row["expected_output"], hits[:args.mmr_k]))
+        candidate_sets["mmr"].append((row["expected_output"], mmr_select(query_vec.vector, hits, k=args.mmr_k, lambda_mult=args.lambda_mult)))
+
+    baseline_tokens = None
+    for name, sets in candidate_sets.items():
+        tokens = sum(_count_tokens(c.content or "", enc=enc) for _, chunks in sets for c in chunks) / len(sets)
+        baseline_tokens = baseline_tokens or tokens
+        quality = sum(is_hit(expected, chunks) for expected, chunks in sets) / len(sets)
+        print(f"{name:>10}: {tokens:7.0f} rerank tokens/query ({tokens / baseline_tokens:.0%} of top_k), answer in candidates {quality:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--mmr-k", type=int, default=8)
+    parser.add_argument("--lambda", dest="lambda_mult", type=float, default=0.7)
+    asyncio.run(run(parser.parse_args()))
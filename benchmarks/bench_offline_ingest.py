@@ -0,0 +1,57 @@
+"""
+Offline profile of the ingestion + dense search pipeline with the hashing embedding backend (no Azure, no network
+once tiktoken's cl100k_base file is cached): semantic splitting, embedding batching, rate limiting, upsert into
+the in-memory store, then search_by_embedding latency. --latency-ms simulates the embedding API round trip.
+
+    python -m benchmarks.bench_offline_ingest --paragraphs 2000 --latency-ms 80
+    python -m cProfile -s cumtime -m benchmarks.bench_offline_ingest --paragraphs 500 | head -40
+"""
+import argparse, asyncio, statistics, time
+import numpy as np
+from pyrate_limiter import Limiter, Rate, Duration, InMemoryBucket, BucketAsyncWrapper
+from config.settings import get_settings
+from db.fake_vector_store import InMemoryVectorStore
+from embedding_providers import HashingEmbeddings
+from models.api_response_model import GBBookMeta
+from models.vector_db_model import EmbeddingVec
+from vector_store_utils import async_upload_book_to_index
+
+
+def make_book(n_paragraphs:int) -> str:
+    rng = np.random.default_rng(0)
+    words = np.array("whale sea ship captain harpoon storm island night letter creature science ice voyage friend".split())
+    return "\n\n".join(" ".join(f"{' '.join(rng.choice(words, size=12))}." for _ in range(5)) for _ in range(n_paragraphs))
+
+
+async def run(args) -> None:
+    sett = get_settings(is_test=True).model_copy(update={"EMBEDDING_BACKEND": "hashing", "HASHING_EMBED_LATENCY_SECS": args.latency_ms / 1000})
+    provider = sett.get_async_emb_client()
+    assert isinstance(provider, HashingEmbeddings)
+    store = InMemoryVectorStore()
+    # unlimited budget: measure the pipeline, not the configured Azure quota
+    req_lim, tok_lim = (Limiter(BucketAsyncWrapper(InMemoryBucket([Rate(10**12, Duration.MINUTE)]))) for _ in range(2))
+    book = make_book(args.paragraphs)
+    gb_meta = GBBookMeta(id=1, title="Bench", summaries=["A synthetic sea story."], subjects=[], languages=["en"],
+                         authors=[], editors=[], download_count=0, formats={}, copyright=False)
+
+    start = time.perf_counter()
+    _, stats = await async_upload_book_to_index(vec_store=store, embed_client=provider, token_limiter=tok_lim, request_limiter=req_lim,  # type:ignore
+                                                raw_book_content=book, book_meta=gb_meta, sett=sett, time_started="bench", is_cleaned=True)
+    secs = time.perf_counter() - start
+    print(f"Ingested {len(book)/1e6:.1f}M chars -> {stats.chunk_count} chunks in {secs:.2f} s, "          # type:ignore
+          f"{provider.n_requests} embedding requests / {provider.n_texts} texts")
+
+    latencies = []
+    for q in ["the captain and the whale", "a storm at night", "letter to a friend"] * 100:
+        vec = EmbeddingVec(vector=provider.embed_text(q), dim=sett.get_hyperparams().ingestion.embed_dim)
+        t = time.perf_counter()
+        await store.search_by_embedding(embed_query_vector=vec, filter=None, k=10)
+        latencies.append(time.perf_counter() - t)
+    print(f"search_by_embedding p50 {statistics.median(latencies)*1e3:.2f} ms over {stats.chunk_count} chunks")  # type:ignore
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    asyncio.run(run(parser.parse_args()))
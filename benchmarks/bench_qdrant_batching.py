@@ -0,0 +1,72 @@
+"""
+Time + peak RSS of QdrantVectorStore.upsert_chunks batching for a large book, with the network call stubbed out.
+Compares the analytical size estimator against full JSON serialization of every point (the old estimator).
+
+    python -m benchmarks.bench_qdrant_batching --chunks 6000
+"""
+import argparse, asyncio, json, resource, time
+import numpy as np
+
+from config.settings import get_settings
+from config.params import EmbeddingDimension
+from db.qdrant_vector_store import QdrantVectorStore, MAX_QDRANT_JSON_BYTES
+from models.vector_db_model import UploadChunk, EmbeddingVec
+from qdrant_client.models import PointsList
+
+
+class _NoopClient:
+    def __init__(self):
+        self.batch_sizes:list[int] = []
+        self.max_batch_bytes = 0
+
+    async def upsert(self, *, points, collection_name, **kwargs):
+        self.batch_sizes.append(len(points))
+        self.max_batch_bytes = max(self.max_batch_bytes, len(PointsList(points=points).model_dump_json()))
+
+
+def _make_chunks(n:int, chunk_chars:int) -> list[UploadChunk]:
+    rng = np.random.default_rng(0)
+    return [UploadChunk(uuid_str=f"00000000-0000-0000-0000-{i:012d}", book_name="bench", book_id=1, chunk_id=i,
+                        content="“Call me Ishmael.” " * (chunk_chars // 19), token_count=0, char_count=chunk_chars,
+                        content_vector=EmbeddingVec(vector=rng.random(EmbeddingDimension.SMALL.value, dtype=np.float32) - 0.5,
+                                                    dim=EmbeddingDimension.SMALL))
+            for i in range(n)]
+
+
+def _old_estimate(store:QdrantVectorStore, chunk:UploadChunk) -> int:
+    d = store._chunk_to_point(chunk).model_dump()
+    return len(json.dumps(d, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+async def run(n_chunks:int, chunk_chars:int) -> None:
+    sett = get_settings(is_test=True)
+    chunks = _make_chunks(n_chunks, chunk_chars)
+
+    for name in ("json_dumps", "analytical"):
+        store = QdrantVectorStore(settings=sett, collection_name="bench")
+        client = _NoopClient()
+        store._client = client          # type:ignore
+        if name == "json_dumps":
+            store._estimate_bytes_of_point = lambda c, s=store: _old_estimate(s, c)     # type:ignore
+
+        start = time.perf_counter()
+        await store.upsert_chunks(chunks=chunks)
+        secs = time.perf_counter() - start
+        print(f"{name:>10}: {secs:.2f}s (incl. measuring real batch JSON) batches={len(client.batch_sizes)} "
+              f"max_batch={client.max_batch_bytes / 1024**2:.2f}MB limit={MAX_QDRANT_JSON_BYTES / 1024**2:.0f}MB "
+              f"peak_rss={resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MB")
+
+    start = time.perf_counter()
+    _ = [store._estimate_bytes_of_point(c) for c in chunks]
+    analytic = time.perf_counter() - start
+    start = time.perf_counter()
+    _ = [_old_estimate(store, c) for c in chunks]
+    print(f"estimator only: analytical={analytic:.3f}s json_dumps={time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=6000)
+    parser.add_argument("--chunk-chars", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.chunks, args.chunk_chars))
@@ -0,0 +1,62 @@
+"""
+Points/second for a full-collection rebuild through QdrantVectorStore.upsert_chunks.
+Runs against QDRANT_SEARCH_ENDPOINT from the settings (use a throwaway cluster), or Qdrant's local in-process mode with --local.
+
+    python -m benchmarks.bench_qdrant_rebuild --chunks 20000 --concurrency 1
+    python -m benchmarks.bench_qdrant_rebuild --chunks 20000 --concurrency 4 --no-wait --grpc
+"""
+import argparse, asyncio, time
+import numpy as np
+
+from config.settings import get_settings
+from config.params import EmbeddingDimension
+from db.qdrant_vector_store import QdrantVectorStore
+from models.vector_db_model import UploadChunk, EmbeddingVec
+from qdrant_client import AsyncQdrantClient
+
+COLLECTION = "bench_rebuild"
+
+
+def _make_chunks(n:int, chunk_chars:int) -> list[UploadChunk]:
+    rng = np.random.default_rng(0)
+    return [UploadChunk(uuid_str=f"00000000-0000-0000-0000-{i:012d}", book_name=f"bench book {i % 10}", book_id=i % 10, 
+                        chunk_id=i, content="Call me Ishmael. " * (chunk_chars // 17), token_count=0, char_count=chunk_chars,
+                        content_vector=EmbeddingVec(vector=rng.random(EmbeddingDimension.SMALL.value, dtype=np.float32),
+                                                    dim=EmbeddingDimension.SMALL))
+            for i in range(n)]
+
+
+async def run(args) -> None:
+    sett = get_settings()
+    sett.QDRANT_PREFER_GRPC = args.grpc
+    store = QdrantVectorStore(settings=sett, collection_name=COLLECTION)
+    if args.local:
+        store._client = AsyncQdrantClient(location=":memory:")
+
+    chunks = _make_chunks(args.chunks, args.chunk_chars)
+    await store.delete_collection(collection_name=COLLECTION)
+    await store.create_missing_collection(collection_name=COLLECTION)
+
+    start = time.perf_counter()
+    await store.upsert_chunks(chunks=chunks, 
+                              max_points=args.max_points,
+                              max_concurrency=args.concurrency, 
+                              wait=not args.no_wait)
+    secs = time.perf_counter() - start
+    print(f"grpc={args.grpc} concurrency={args.concurrency} wait={not args.no_wait} max_points={args.max_points}: "
+          f"{len(chunks)} points in {secs:.2f}s -> {len(chunks) / secs:.0f} points/s")
+
+    await store.delete_collection(collection_name=COLLECTION)
+    await store.close_conn()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--chunk-chars", type=int, default=2000)
+    parser.add_argument("--max-points", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--no-wait", action="store_true")
+    parser.add_argument("--grpc", action="store_true")
+    parser.add_argument("--local", action="store_true", help="Qdrant local mode (in-process), no server needed")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,35 @@
+"""
+Cost of a token budget reservation (weight = tokens of one embedding batch) with pyrate's buckets, which store
+`weight` copies of the item, vs. the weighted buckets of rate_limit_buckets.py, which store one entry pr. reservation.
+Fills --n batches of --tokens each into a budget big enough to admit them all, like a minute of ingestion.
+
+    python -m benchmarks.bench_rate_limit_buckets --n 60 --tokens 7000
+"""
+import argparse, statistics, tempfile, time
+from pathlib import Path
+from pyrate_limiter import Duration, InMemoryBucket, Rate, RateItem, SQLiteBucket
+from rate_limit_buckets import InMemoryWeightedBucket, SQLiteWeightedBucket
+
+
+def run(args) -> None:
+    rate = Rate(args.n * args.tokens, Duration.MINUTE)
+    with tempfile.TemporaryDirectory() as tmp:
+        buckets = {"pyrate InMemoryBucket": InMemoryBucket([rate]),
+                   "InMemoryWeightedBucket": InMemoryWeightedBucket([rate], budget="bench_mem"),
+                   "pyrate SQLiteBucket": SQLiteBucket.init_from_file([rate], db_path=str(Path(tmp, "pyrate.sqlite")), use_file_lock=False),
+                   "SQLiteWeightedBucket": SQLiteWeightedBucket([rate], budget="bench_sqlite", path=Path(tmp, "weighted.sqlite"))}
+        for name, bucket in buckets.items():
+            latencies = []
+            for _ in range(args.n):
+                start = time.perf_counter()
+                assert bucket.put(RateItem("tpm", int(time.time() * 1000), args.tokens))
+                latencies.append(time.perf_counter() - start)
+            print(f"{name:<32} put p50 {statistics.median(latencies)*1e3:8.3f} ms, max {max(latencies)*1e3:8.3f} ms, "
+                  f"{args.n} reservations stored as {bucket.count() if isinstance(bucket, InMemoryBucket | SQLiteBucket) else len(bucket._entries())} entries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=60)
+    parser.add_argument("--tokens", type=int, default=7000)
+    run(parser.parse_args())
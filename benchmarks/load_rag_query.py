@@ -0,0 +1,118 @@
+"""
+k6 style closed-loop load test of GET /v1/query/ against a running app (normally pointed at benchmarks/openai_stub_server.py):
+--users virtual users loop over the eval questions for --duration secs. Reports client side latency/throughput and
+p50/p95/p99 pr. rag_stage_seconds stage, from the delta of the histogram buckets scraped from /metrics before and after
+(Prometheus histogram_quantile style, so the stage percentiles are only as precise as the buckets).
+Run the app with a single worker, else /metrics only covers the worker that answered the scrape.
+
+    python -m benchmarks.load_rag_query --base-url http://127.0.0.1:8000 --users 8 --duration 60
+"""
+import argparse, asyncio, csv, math, random, time
+from collections import Counter, defaultdict
+from pathlib import Path
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+from config.params import VER_PREFIX
+
+STAGE_METRIC = "rag_stage_seconds"
+
+
+def histogram_quantile(q:float, buckets:list[tuple[float, float]]) -> float|None:
+    """Like PromQL histogram_quantile: linear interpolation inside the bucket holding the q-th observation.
+    buckets are (le, cumulative count) sorted by le, ending with +Inf."""
+    if not buckets or buckets[-1][1] <= 0:
+        return None
+    rank = q * buckets[-1][1]
+    prev_le, prev_count = 0.0, 0.0
+    for le, count in buckets:
+        if count >= rank:
+            if math.isinf(le):
+                return prev_le          # above the highest finite bucket, the best we know
+            if count == prev_count:
+                return le
+            return prev_le + (le - prev_le) * (rank - prev_count) / (count - prev_count)
+        prev_le, prev_count = le, count
+    return prev_le
+
+
+def parse_stage_buckets(metrics_text:str) -> dict[str, dict[float, float]]:
+    """stage -> {le: cumulative count} of rag_stage_seconds"""
+    stages: dict[str, dict[float, float]] = defaultdict(dict)
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name != STAGE_METRIC:
+            continue
+        for sample in family.samples:
+            if sample.name == f"{STAGE_METRIC}_bucket":
+                stages[sample.labels["stage"]][float(sample.labels["le"])] = sample.value
+    return stages
+
+
+def stage_percentiles(before:dict[str, dict[float, float]], after:dict[str, dict[float, float]],
+                      quantiles:tuple[float, ...]=(0.5, 0.95, 0.99)) -> dict[str, tuple[int, list[float|None]]]:
+    """stage -> (n observations, percentiles) of the observations made between the two scrapes"""
+    result = {}
+    for stage, buckets in after.items():
+        delta = sorted((le, count - before.get(stage, {}).get(le, 0.0)) for le, count in buckets.items())
+        if delta and delta[-1][1] > 0:
+            result[stage] = (int(delta[-1][1]), [histogram_quantile(q, delta) for q in quantiles])
+    return result
+
+
+def load_questions(path:Path) -> list[str]:
+    if path.suffix == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            return [row["question"] for row in csv.DictReader(f) if row.get("question")]
+    return [l.strip() for l in path.read_text(encoding="utf-8").splitlines() if l.strip()]
+
+
+async def _user(client:httpx.AsyncClient, questions:list[str], deadline:float, think_secs:float, seed:int,
+                latencies:list[float], statuses:Counter) -> None:
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            resp = await client.get(f"/{VER_PREFIX}/query/", params={"query": rng.choice(questions)})
+            statuses[resp.status_code] += 1
+            if resp.status_code < 400:
+                latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError as exc:
+            statuses[type(exc).__name__] += 1
+        if think_secs:
+            await asyncio.sleep(rng.expovariate(1 / think_secs))
+
+
+def _ms(secs:float|None) -> str:
+    return "-" if secs is None else f"{secs * 1e3:.0f}"
+
+
+async def run(args) -> None:
+    questions = load_questions(args.questions)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        before = parse_stage_buckets((await client.get("/metrics")).text)
+        latencies: list[float] = []
+        statuses: Counter = Counter()
+        start = time.perf_counter()
+        await asyncio.gather(*(_user(client, questions, start + args.duration, args.think_secs, seed, latencies, statuses)
+                               for seed in range(args.users)))
+        wall = time.perf_counter() - start
+        after = parse_stage_buckets((await client.get("/metrics")).text)
+
+    print(f"{args.users} users, {wall:.1f} s: {sum(statuses.values())} requests, {len(latencies) / wall:.2f} ok req/s, statuses {dict(statuses)}")
+    print(f"{'stage':<22}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    if latencies:
+        latencies.sort()
+        e2e = [latencies[min(len(latencies) - 1, int(q * len(latencies)))] for q in (0.5, 0.95, 0.99)]
+        print(f"{'end_to_end (client)':<22}{len(latencies):>7}" + "".join(f"{_ms(p):>10}" for p in e2e))
+    for stage, (n, pcts) in sorted(stage_percentiles(before, after).items()):
+        print(f"{stage:<22}{n:>7}" + "".join(f"{_ms(p):>10}" for p in pcts))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60, help="secs")
+    parser.add_argument("--think-secs", type=float, default=0.0, help="mean of the exponential pause between a user's requests")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--questions", type=Path, default=Path("evals", "datasets", "gb_ci_pipeline.csv"))
+    asyncio.run(run(parser.parse_args()))
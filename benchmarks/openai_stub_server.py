@@ -0,0 +1,167 @@
+"""
+Local OpenAI compatible stub of the routes the app calls, to load test /v1/query/ without paid Azure endpoints:
+    - embeddings (Azure: /openai/deployments/{model}/embeddings, OpenAI: /v1/embeddings): HashingEmbeddings vectors
+    - responses (Azure: /openai/responses, OpenAI: /v1/responses), as used by responses.parse: JSON matching the
+      requested json_schema. Reranking prompts get scores for the document uuids in them, so the pipeline runs end to end.
+Outputs are deterministic pr. request body. Latency is lognormal around a median pr. route, and a fraction of the
+requests fail with 429 (+ Retry-After, which the openai SDK honours) or 500. GET /stub/stats counts requests pr. route/status.
+
+    python -m benchmarks.openai_stub_server --port 8090 --embed-latency-ms 40 --llm-latency-ms 900 --rate-limit-rate 0.02
+    # and start the app with AZ_OPENAI_EMBED_ENDPOINT=http://127.0.0.1:8090 AZ_OPENAI_GPT_ENDPOINT=http://127.0.0.1:8090
+"""
+import argparse, asyncio, base64, hashlib, json, math, random, re, time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from embedding_providers import HashingEmbeddings
+
+_UUID_RE = re.compile(r"Document uuid:(\S+) ---")
+_WORD_RE = re.compile(r"[A-Za-z]{3,}")
+
+
+@dataclass
+class StubConfig:
+    embed_latency_ms: float = 30.0          # medians of the lognormal latency
+    llm_latency_ms: float = 800.0
+    latency_sigma: float = 0.35             # 0 -> constant latency
+    rate_limit_rate: float = 0.0            # fraction of requests answered with 429
+    error_rate: float = 0.0                 # fraction answered with 500
+    retry_after_secs: float = 1.0
+    embed_dim: int = 1536
+    seed: int = 0
+
+
+def _rng_for(body:bytes) -> random.Random:
+    return random.Random(int.from_bytes(hashlib.blake2b(body, digest_size=8).digest(), "little"))
+
+
+def _resolve(schema:dict, defs:dict) -> dict:
+    ref = schema.get("$ref")
+    return defs[ref.rsplit("/", 1)[-1]] if ref else schema
+
+
+def fake_json_value(schema:dict, *, defs:dict, rng:random.Random, words:list[str], uuids:list[str]) -> Any:
+    """A value matching the (strict) json_schema of a responses.parse text_format, built from the prompt words"""
+    schema = _resolve(schema, defs)
+    if "anyOf" in schema:
+        options = [_resolve(s, defs) for s in schema["anyOf"]]
+        schema = next((s for s in options if s.get("type") != "null"), options[0])
+
+    match schema.get("type"):
+        case "object":
+            props = schema.get("properties", {})
+            value = {k: fake_json_value(s, defs=defs, rng=rng, words=words, uuids=uuids) for k, s in props.items()}
+            if "uuid_str" in props and uuids:
+                value["uuid_str"] = uuids.pop(0)
+            return value
+        case "array":
+            items = _resolve(schema.get("items", {}), defs)
+            n = len(uuids) if "uuid_str" in items.get("properties", {}) else rng.randint(1, 3)    # one score pr. reranked doc
+            return [fake_json_value(items, defs=defs, rng=rng, words=words, uuids=uuids) for _ in range(n)]
+        case "integer":
+            return rng.randint(schema.get("minimum", 0), schema.get("maximum", 10))
+        case "number":
+            return round(rng.uniform(schema.get("minimum", 0), schema.get("maximum", 1)), 3)
+        case "boolean":
+            return rng.random() < 0.5
+        case "null":
+            return None
+        case _:
+            if "enum" in schema:
+                return rng.choice(schema["enum"])
+            return " ".join(rng.choices(words or ["lorem", "ipsum"], k=rng.randint(5, 25)))
+
+
+def _fake_response(body:dict, rng:random.Random) -> dict:
+    messages = body.get("input", "")
+    prompt = messages if isinstance(messages, str) else "\n".join(str(m.get("content", "")) for m in messages)
+    words = _WORD_RE.findall(prompt)
+
+    fmt = (body.get("text") or {}).get("format") or {}
+    if fmt.get("type") == "json_schema":
+        schema = fmt["schema"]
+        value = fake_json_value(schema, defs=schema.get("$defs", {}), rng=rng, words=words, uuids=_UUID_RE.findall(prompt))
+        text = json.dumps(value)
+    else:
+        text = " ".join(rng.choices(words or ["lorem"], k=40))
+
+    n_in, n_out = len(prompt) // 4 + 1, len(text) // 4 + 1          # ~4 chars pr. token is close enough here
+    resp_id = hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+    return {"id": f"resp_{resp_id}", "object": "response", "created_at": int(time.time()), "model": body.get("model", "stub"),
+            "status": "completed", "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+            "output": [{"type": "message", "id": f"msg_{resp_id}", "role": "assistant", "status": "completed",
+                        "content": [{"type": "output_text", "text": text, "annotations": []}]}],
+            "usage": {"input_tokens": n_in, "output_tokens": n_out, "total_tokens": n_in + n_out,
+                      "input_tokens_details": {"cached_tokens": 0}, "output_tokens_details": {"reasoning_tokens": 0}}}
+
+
+def create_stub_app(config:StubConfig|None=None) -> FastAPI:
+    config = config or StubConfig()
+    app = FastAPI(title="OpenAI stub")
+    embedder = HashingEmbeddings(dim=config.embed_dim)
+    fault_rng = random.Random(config.seed)          # latency + injected errors, deterministic in arrival order
+    app.state.config, app.state.stats = config, Counter()
+
+    async def _delay_or_fail(route:str, median_ms:float) -> JSONResponse|None:
+        """Sleeps the simulated latency, returns the error response to send instead if one is injected"""
+        await asyncio.sleep(median_ms / 1000 * math.exp(config.latency_sigma * fault_rng.gauss()))
+        roll = fault_rng.random()
+        if roll < config.rate_limit_rate:
+            app.state.stats[f"{route} 429"] += 1
+            return JSONResponse({"error": {"code": "429", "message": f"Rate limit is exceeded. Try again in {config.retry_after_secs:g} seconds."}},
+                                status_code=429, headers={"retry-after": f"{config.retry_after_secs:g}"})
+        if roll < config.rate_limit_rate + config.error_rate:
+            app.state.stats[f"{route} 500"] += 1
+            return JSONResponse({"error": {"code": "500", "message": "Injected server error"}}, status_code=500)
+        app.state.stats[f"{route} 200"] += 1
+        return None
+
+    @app.post("/openai/deployments/{deployment}/embeddings")
+    @app.post("/v1/embeddings")
+    async def embeddings(request:Request):
+        body = await request.json()
+        if (err := await _delay_or_fail("embeddings", config.embed_latency_ms)) is not None:
+            return err
+        texts = [body["input"]] if isinstance(body["input"], str) else body["input"]
+        data = []
+        for i, t in enumerate(texts):
+            vec = embedder.embed_text(t)
+            emb = base64.b64encode(vec.tobytes()).decode() if body.get("encoding_format") == "base64" else vec.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": emb})
+        n_tok = sum(len(t) // 4 + 1 for t in texts)
+        return {"object": "list", "data": data, "model": body.get("model", "stub"), "usage": {"prompt_tokens": n_tok, "total_tokens": n_tok}}
+
+    @app.post("/openai/responses")
+    @app.post("/v1/responses")
+    async def responses(request:Request):
+        raw = await request.body()
+        if (err := await _delay_or_fail("responses", config.llm_latency_ms)) is not None:
+            return err
+        return _fake_response(json.loads(raw), _rng_for(raw))
+
+    @app.get("/stub/stats")
+    async def stats():
+        return dict(app.state.stats)
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--embed-latency-ms", type=float, default=StubConfig.embed_latency_ms)
+    parser.add_argument("--llm-latency-ms", type=float, default=StubConfig.llm_latency_ms)
+    parser.add_argument("--latency-sigma", type=float, default=StubConfig.latency_sigma)
+    parser.add_argument("--rate-limit-rate", type=float, default=StubConfig.rate_limit_rate)
+    parser.add_argument("--error-rate", type=float, default=StubConfig.error_rate)
+    parser.add_argument("--retry-after-secs", type=float, default=StubConfig.retry_after_secs)
+    parser.add_argument("--embed-dim", type=int, default=StubConfig.embed_dim)
+    parser.add_argument("--seed", type=int, default=StubConfig.seed)
+    args = parser.parse_args()
+    host, port = args.host, args.port
+    del args.host, args.port
+    uvicorn.run(create_stub_app(StubConfig(**vars(args))), host=host, port=port, log_level="warning")
@@ -24,12 +24,23 @@ class IngestionConfig(BaseModel):
     max_tokens_pr_req:int
     sem_split_break_percentile:int
     sem_split_buffer_size: int
+    upsert_max_concurrency: int = 1         # upsert batches in flight at once, 1 = sequential like before (e.g. 4 for faster rebuilds)
+    upsert_wait: bool = True                # False -> don't wait for each batch to be applied, only for the last one + indexing
+    router_centroids_pr_book: int = 4       # chunk vector centroids pr. book in the book routing index
 
 class RetrievalConfig(BaseModel):
     top_k: int = 8
     vector_db:Literal["Qdrant", "Azure AI Search"]
     vector_db_type:Literal["vector", "hybrid_search"]
     top_k:int
+    rrf_k: int = 60             # Reciprocal Rank Fusion constant for hybrid_search
+    keyword_index:Literal["vector_store", "local_bm25"] = "vector_store"      # sparse channel of hybrid_search
+    mmr_k: int|None = None      # keep this many diverse (MMR) of the top_k dense hits for reranking, None = off
+    mmr_lambda: float = 0.7     # MMR relevance vs. diversity trade-off, 1 = relevance only
+    query_expansion:Literal["none", "multi_query", "hyde", "both"] = "none"    # extra LLM generated search queries
+    n_query_paraphrases: int = 3
+    query_expansion_model: str|None = None      # None = the rerank model
+    route_top_m: int|None = None        # two-stage search: only search chunks of the top M books by the book router, None = flat search
 
 class RerankConfig(BaseModel):
     enabled: bool = True
@@ -41,6 +52,8 @@ class RerankConfig(BaseModel):
 class GenerationConfig(BaseModel):
     model: str
     num_context_chunks: int
+    neighbour_window: int = 0               # expand each context chunk with up to N adjacent chunks on each side, 0 = off
+    context_token_budget: int = 4000        # max tokens of all context chunks, when packing + after expansion
 
 
 class ConfigParamSettings(BaseSettings):
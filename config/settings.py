@@ -6,9 +6,18 @@ from pydantic import PrivateAttr, Field
 from typing import Literal
 from db.fake_vector_store import InMemoryVectorStore
 from db.vector_store_abstract import AsyncVectorStore
+from retrieval.bm25 import BM25Index
+from retrieval.book_router import BookRouter
+from ingestion.gutendex_client import GutendexClient, GUTENDEX_URL
+from ingestion.gutenberg_catalog import GutenbergCatalog
+from ingestion.book_cache import BookCache
+from ingestion.checkpoints import IngestCheckpoint
+from ingestion.embedding_store import EmbeddingStore
+from embedding_providers import EmbeddingProvider, HashingEmbeddings
+from rate_limit_buckets import RateLimitBackend, create_budget_limiter
 
 from openai import AsyncAzureOpenAI, AzureOpenAI
-from pyrate_limiter import Limiter, Rate, Duration, InMemoryBucket, BucketAsyncWrapper
+from pyrate_limiter import Limiter, Rate, Duration
 
 # Initializes fields via .env file
 
@@ -24,8 +33,25 @@ class Settings(BaseSettings):
 
     QDRANT_SEARCH_ENDPOINT: str
     QDRANT_SEARCH_KEY: str
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_GRPC_PORT: int = 6334
 
     VECTOR_STORE_TO_USE: Literal["Qdrant", "AzureAiSearch"] = "Qdrant"
+    BM25_INDEX_DIR: Path = Path("bm25_index")      # local keyword index, one subfolder pr. collection
+    BOOK_ROUTER_DIR: Path = Path("book_router")    # book level routing vectors, one .npz pr. collection
+    GUTENDEX_URL: str = GUTENDEX_URL
+    GUTENDEX_CACHE_TTL_SECS: float = 3600          # book metadata rarely changes
+    GUTENBERG_CATALOG_PATH: Path = Path("gutenberg_catalog.sqlite")     # local catalogue mirror, used instead of Gutendex if it exists
+    BOOK_CACHE_DIR: Path = Path("evals", "books")          # downloaded book texts
+    BOOK_CACHE_MAX_BYTES: int = 2_000_000_000              # gzipped, least recently used books are evicted above it
+    INGEST_CHECKPOINT_PATH: Path = Path("ingest_checkpoint.sqlite")     # embeddings of books not fully uploaded yet
+    EMBEDDING_STORE_PATH: Path = Path("embedding_store.sqlite")         # embeddings by text hash, shared by all collections
+    EMBEDDING_BACKEND: Literal["azure", "hashing"] = "azure"            # hashing: offline deterministic embeddings for benchmarks/CI
+    HASHING_EMBED_LATENCY_SECS: float = 0.0                             # simulated latency pr. request of the hashing backend
+    HASHING_EMBED_JITTER_SECS: float = 0.0
+    RATE_LIMIT_BACKEND: RateLimitBackend = "memory"                     # sqlite/redis: the Azure budgets are shared by all workers/replicas
+    RATE_LIMIT_SQLITE_PATH: Path = Path("rate_limits.sqlite")
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
     
     EMBED_MODEL_DEPLOYMENT:str
     AZ_OPENAI_MODEL_DEPLOYMENT:str
@@ -37,6 +63,14 @@ class Settings(BaseSettings):
     DB_PW:str
     DB_USER:str
     DB_PORT:int
+    DB_HOST:str = "aws-1-eu-north-1.pooler.supabase.com"
+    DB_ECHO:bool = False                # log every SQL statement
+    DB_POOL_SIZE:int = 5
+    DB_MAX_OVERFLOW:int = 10
+    DB_POOL_TIMEOUT:float = 30          # secs to wait for a free connection
+    DB_POOL_RECYCLE:int = 1800          # secs, reconnect before the pooler drops idle connections
+    DB_POOL_PRE_PING:bool = True
+    DB_PGBOUNCER_TRANSACTION_MODE:bool|None = None      # no prepared statement caching, None = infer from the port (6543 on Supabase)
 
     is_test:bool = False
     hyperparam_path:Path
@@ -44,9 +78,15 @@ class Settings(BaseSettings):
 
    # Not to be validated as model fields
     _llm_client: AzureOpenAI | None = PrivateAttr(default=None)
-    _async_emb_client: AsyncAzureOpenAI | None = PrivateAttr(default=None)
+    _async_emb_client: AsyncAzureOpenAI | EmbeddingProvider | None = PrivateAttr(default=None)
     _emb_client: AzureOpenAI | None = PrivateAttr(default=None)
     _vector_store: AsyncVectorStore | None = PrivateAttr(default=None)
+    _bm25_index: BM25Index | None = PrivateAttr(default=None)
+    _book_router: BookRouter | None = PrivateAttr(default=None)
+    _gutendex_client: GutendexClient | None = PrivateAttr(default=None)
+    _book_cache: BookCache | None = PrivateAttr(default=None)
+    _ingest_checkpoint: IngestCheckpoint | None = PrivateAttr(default=None)
+    _embedding_store: EmbeddingStore | None = PrivateAttr(default=None)
 
     _req_limiter: Limiter | None = PrivateAttr(default=None)
     _tok_limiter: Limiter | None = PrivateAttr(default=None)
@@ -95,6 +135,52 @@ class Settings(BaseSettings):
             self._vector_store = None
 
 
+    def get_bm25_index(self) -> BM25Index:
+        """Local BM25 index of the active collection, kept in memory only when testing."""
+        if self._bm25_index is None:
+            index_dir = None if self.is_test else self.BM25_INDEX_DIR / self.active_collection
+            self._bm25_index = BM25Index(index_dir=index_dir)
+        return self._bm25_index
+
+
+    def get_book_router(self) -> BookRouter:
+        """Book routing index of the active collection, kept in memory only when testing."""
+        if self._book_router is None:
+            path = None if self.is_test else self.BOOK_ROUTER_DIR / f"{self.active_collection}.npz"
+            self._book_router = BookRouter(path=path)
+        return self._book_router
+
+
+    def get_gutendex_client(self) -> GutendexClient:
+        if self._gutendex_client is None:
+            catalog = GutenbergCatalog(self.GUTENBERG_CATALOG_PATH) if self.GUTENBERG_CATALOG_PATH.exists() else None
+            self._gutendex_client = GutendexClient(base_url=self.GUTENDEX_URL, ttl_secs=self.GUTENDEX_CACHE_TTL_SECS, catalog=catalog)
+        return self._gutendex_client
+
+    async def close_gutendex_client(self) -> None:
+        if self._gutendex_client is not None:
+            await self._gutendex_client.aclose()
+            self._gutendex_client = None
+
+
+    def get_book_cache(self) -> BookCache:
+        if self._book_cache is None:
+            self._book_cache = BookCache(root=self.BOOK_CACHE_DIR, max_bytes=self.BOOK_CACHE_MAX_BYTES)
+        return self._book_cache
+
+    def get_ingest_checkpoint(self) -> IngestCheckpoint:
+        """Ingestion checkpoint, kept in memory only when testing."""
+        if self._ingest_checkpoint is None:
+            self._ingest_checkpoint = IngestCheckpoint(path=Path(":memory:") if self.is_test else self.INGEST_CHECKPOINT_PATH)
+        return self._ingest_checkpoint
+
+    def get_embedding_store(self) -> EmbeddingStore:
+        """Embedding store shared by the collections, kept in memory only when testing."""
+        if self._embedding_store is None:
+            self._embedding_store = EmbeddingStore(path=Path(":memory:") if self.is_test else self.EMBEDDING_STORE_PATH)
+        return self._embedding_store
+
+
     def get_hyperparams(self) -> ConfigParamSettings:
         if self._hyperparams is None:
             self._hyperparams = get_config(path=self.hyperparam_path)
@@ -109,7 +195,12 @@ class Settings(BaseSettings):
         return self._llm_client
 
 
-    def get_async_emb_client(self) -> AsyncAzureOpenAI:
+    def get_async_emb_client(self) -> AsyncAzureOpenAI | EmbeddingProvider:
+        """The Azure OpenAI client, or the offline HashingEmbeddings with EMBEDDING_BACKEND=hashing"""
+        if self._async_emb_client is None and self.EMBEDDING_BACKEND == "hashing":
+            self._async_emb_client = HashingEmbeddings(dim=self.get_hyperparams().ingestion.embed_dim.value,
+                                                       latency_secs=self.HASHING_EMBED_LATENCY_SECS,
+                                                       jitter_secs=self.HASHING_EMBED_JITTER_SECS)
         if self._async_emb_client is None:
             self._async_emb_client = AsyncAzureOpenAI(azure_endpoint=self.AZ_OPENAI_EMBED_ENDPOINT,
                                                 api_version="2024-12-01-preview",
@@ -126,19 +217,20 @@ class Settings(BaseSettings):
 
     
     def get_limiters(self) -> list[Limiter]:
-        """Creates the limiters used for embedding if None. 
+        """Creates the limiters used for embedding if None, on the RATE_LIMIT_BACKEND (always in memory when testing). 
         :returns: [req_limiter, tok_limiter] 
          """
         assert self._hyperparams
+        backend = "memory" if self.is_test else self.RATE_LIMIT_BACKEND
         if self._req_limiter is None:
             REQ_RATE = Rate(self._hyperparams.ingestion.requests_pr_min, Duration.MINUTE)              # 3,000 requests per minute
-            req_bucket = BucketAsyncWrapper(InMemoryBucket([REQ_RATE]))
-            self._req_limiter = Limiter(req_bucket)
+            self._req_limiter = create_budget_limiter(REQ_RATE, budget="embedding_requests", backend=backend,
+                                                      sqlite_path=self.RATE_LIMIT_SQLITE_PATH, redis_url=self.RATE_LIMIT_REDIS_URL)
 
         if self._tok_limiter is None:
             TOK_RATE = Rate(self._hyperparams.ingestion.tokens_pr_min, Duration.MINUTE)                 # 501,000 tokens per minute
-            tok_bucket = BucketAsyncWrapper(InMemoryBucket([TOK_RATE]))
-            self._tok_limiter = Limiter(tok_bucket)
+            self._tok_limiter = create_budget_limiter(TOK_RATE, budget="embedding_tokens", backend=backend,
+                                                      sqlite_path=self.RATE_LIMIT_SQLITE_PATH, redis_url=self.RATE_LIMIT_REDIS_URL)
 
         return [self._req_limiter, self._tok_limiter]
 
@@ -7,6 +7,7 @@ def gbbookmeta_to_db_obj(gbm: GBBookMeta) -> DBBookMetaData:
         title=gbm.title,
         summary=" ".join(gbm.summaries),
         authors=gbm.authors_as_str(),
+        languages=";".join(gbm.languages),
     )
 
 def db_obj_to_response(row: DBBookMetaData) -> BookMetaDataResponse:
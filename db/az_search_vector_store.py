@@ -1,5 +1,8 @@
 
-from db.vector_store_abstract import AsyncVectorStore
+import asyncio
+import numpy as np
+from db.vector_store_abstract import AsyncVectorStore, validate_fields
+from db.upload_batching import estimate_chunk_json_bytes, iter_batches_by_size
 from ingestion.book_loader import upload_missing_book_ids
 from models.api_response_model import GBBookMeta
 from config.settings import Settings
@@ -15,10 +18,21 @@ from azure.search.documents.indexes.models import (
 from typing import Sequence, Any, cast
 from azure.core.credentials import AzureKeyCredential
 from pydantic import PrivateAttr
-from azure.search.documents.models import VectorizedQuery
+from azure.search.documents.models import VectorizedQuery, IndexingResult
 from models.vector_db_model import EmbeddingVec, UploadChunk
 
-ALL_COLLECTION_FIELDS = ["uuid_str", "chunk_nr", "book_name", "book_id", "content"]
+ALL_COLLECTION_FIELDS = ["uuid_str", "chunk_nr", "book_name", "book_id", "content", "content_hash"]
+MAX_AZ_BATCH_DOCS = 1000                    # Azure AI Search limits per index request
+MAX_AZ_BATCH_BYTES = 16 * 1024 * 1024       # 16MB
+
+
+class DocumentUploadError(Exception):
+    """Some documents of an upload were rejected by Azure AI Search. `failed` has the per-document results."""
+    def __init__(self, *, failed:list[IndexingResult], total:int):
+        self.failed = failed
+        details = "; ".join(f"{r.key}: {r.status_code} {r.error_message}" for r in failed[:10])
+        super().__init__(f"{len(failed)}/{total} documents failed to upload. {details}")
+
 
 class AzSearchVectorStore(AsyncVectorStore):
     settings:Settings
@@ -26,7 +40,7 @@ class AzSearchVectorStore(AsyncVectorStore):
     _index_client:SearchIndexClient = PrivateAttr()
 
 
-    async def model_post_init(self, __context):
+    def model_post_init(self, __context):
         # Run after Pydantic validates input and creates the object
         self._search_client = SearchClient(endpoint=self.settings.AZURE_SEARCH_ENDPOINT,
                                         index_name=self.settings.active_collection,
@@ -36,6 +50,24 @@ class AzSearchVectorStore(AsyncVectorStore):
         self._index_client = SearchIndexClient(endpoint=self.settings.AZURE_SEARCH_ENDPOINT,
                                             credential=AzureKeyCredential(self.settings.AZURE_SEARCH_KEY))
         
+    def _select(self, fields:list[str]|None) -> list[str]:
+        """Azure `select=` for a payload field projection, None = all fields (never the vector)."""
+        fields = validate_fields(fields)
+        return ALL_COLLECTION_FIELDS if fields is None else fields
+
+    def _build_eq_filter(self, filters:dict[str, Any]) -> str:
+        """OData filter where all fields must equal the given values, a list/set value matches any of its values."""
+        def _literal(v:Any) -> str:
+            return "'" + v.replace("'", "''") + "'" if isinstance(v, str) else str(v)      # '' escapes a quote in OData
+
+        conds = []
+        for k, v in filters.items():
+            if isinstance(v, (list, set, tuple)):
+                conds.append("(" + " or ".join(f"{k} eq {_literal(x)}" for x in v) + ")")
+            else:
+                conds.append(f"{k} eq {_literal(v)}")
+        return " and ".join(conds)
+
     def _dict_to_search_page(self, d:dict[Any,Any]) -> SearchChunk:
         return SearchChunk(
                 uuid_str=d.get("uuid_str"),
@@ -43,6 +75,7 @@ class AzSearchVectorStore(AsyncVectorStore):
                 book_name=d.get("book_name"),
                 book_id=d.get("book_id"),
                 content=d.get("content"),
+                content_hash=d.get("content_hash"),
                 search_score=d["@search.score"],  # always given by Azure
             )
         
@@ -60,11 +93,54 @@ class AzSearchVectorStore(AsyncVectorStore):
         return AzureAiSearchPage(chunks=chunks, total_count=total_count_, continuation_token=None)        
 
 
-    async def upsert_chunks(self, chunks: list[UploadChunk]) -> None:
-        docs = [chunk.to_dict() for chunk in chunks]
-        
-        for docs in docs:
-            await self._search_client.upload_documents(docs)        #type:ignore
+    def _chunk_to_doc(self, c:UploadChunk) -> dict[str, Any]:
+        # Only fields defined in the index, Azure rejects unknown fields
+        return {
+            "uuid_str": c.uuid_str,
+            "chunk_nr": c.chunk_id,
+            "book_name": c.book_name,
+            "book_id": c.book_id,
+            "content": c.content,
+            "content_hash": c.content_hash,
+            "content_vector": c.content_vector.to_list(),
+        }
+
+
+    async def _upload_batch(self, batch:list[UploadChunk]) -> list[IndexingResult]:
+        # Documents (list[float] vectors) only exist for the batches in flight
+        return await self._search_client.upload_documents(documents=[self._chunk_to_doc(c) for c in batch])
+
+
+    async def upsert_chunks(self, 
+                            chunks: Sequence[UploadChunk],
+                            max_bytes: int = MAX_AZ_BATCH_BYTES,
+                            max_docs: int = MAX_AZ_BATCH_DOCS,
+                            max_concurrency: int|None = None,
+                        ) -> None:
+        """
+        Upload chunks in batches of at most max_docs documents / max_bytes JSON, with up to max_concurrency requests in flight.
+        Azure indexes each document of a batch independently, so after all batches are sent
+        any failed documents are raised together in a DocumentUploadError.
+        """
+        max_concurrency = max_concurrency or self.settings.get_hyperparams().ingestion.upsert_max_concurrency
+        sem = asyncio.Semaphore(max_concurrency)
+        failed: list[IndexingResult] = []
+
+        async def _send(batch:list[UploadChunk]) -> None:
+            try:
+                results = await self._upload_batch(batch)
+                failed.extend(r for r in results if not r.succeeded)
+            finally:
+                sem.release()
+
+        async with asyncio.TaskGroup() as tg:
+            for batch in iter_batches_by_size(chunks, estimate_bytes=estimate_chunk_json_bytes,
+                                              max_bytes=max_bytes, max_items=max_docs):
+                await sem.acquire()
+                tg.create_task(_send(batch))
+
+        if failed:
+            raise DocumentUploadError(failed=failed, total=len(chunks))
 
 
     async def _scroll_chunks_by_filter(
@@ -73,6 +149,7 @@ class AzSearchVectorStore(AsyncVectorStore):
                 limit:int, 
                 search_text:str="*",
                 continuation_token: str | None = None,
+                fields: list[str] | None = None,
             ) -> tuple[list[SearchChunk], str | None, int]:
         """
         Returns ONE page of results plus a continuation token.
@@ -85,7 +162,7 @@ class AzSearchVectorStore(AsyncVectorStore):
                                                 filter=filter_expr,
                                                 query_type="simple",
                                                 include_total_count=True,
-                                                select=ALL_COLLECTION_FIELDS,
+                                                select=self._select(fields),
                                             )
         total_count = await results.get_count()  
 
@@ -109,59 +186,76 @@ class AzSearchVectorStore(AsyncVectorStore):
         return chunks, next_token, total_count
 
 
-    async def get_chunk_by_nr(self, chunk_nr:int, book_id:int) -> SearchPage:
+    async def get_chunk_by_nr(self, chunk_nr:int, book_id:int, fields:list[str]|None=None) -> SearchPage:
         filter_expr = f"book_id eq {book_id} and chunk_nr eq {chunk_nr}" 
         
         resp = await self._search_client.search(                
                                         query_type="simple",
                                         search_text="*",
                                         filter=filter_expr,
-                                        facets=ALL_COLLECTION_FIELDS,
+                                        select=self._select(fields),
                                         include_total_count=True,
-                                        top=1000
+                                        top=1
                                     )
         
         sp = await self._items_to_search_page(items=resp)
         return sp
 
 
+    async def get_chunks_by_nrs(self, *, chunk_nrs_by_book:dict[int, set[int]], fields:list[str]|None=None) -> list[SearchChunk]:
+        n_wanted = sum(len(nrs) for nrs in chunk_nrs_by_book.values())
+        if n_wanted == 0:
+            return []
+
+        # search.in only works on string fields, so chunk_nr is matched by or'ed eq's
+        filter_expr = " or ".join(
+                        f"(book_id eq {book_id} and (" + " or ".join(f"chunk_nr eq {nr}" for nr in sorted(nrs)) + "))"
+                        for book_id, nrs in chunk_nrs_by_book.items() if nrs
+                    )
+        results:AsyncSearchItemPaged = await self._search_client.search(
+                                                search_text="*",
+                                                filter=filter_expr,
+                                                select=self._select(fields),
+                                                top=n_wanted,
+                                            )
+        return [self._dict_to_search_page(r) async for r in results]
+
+
     async def get_chunk_count_in_book(self, book_id:int) -> int:
         resp = await self._search_client.search(                
                                         query_type="simple",
                                         search_text="*",
                                         filter=f"book_id eq {book_id}",
-                                        facets=ALL_COLLECTION_FIELDS,
                                         include_total_count=True,
-                                        top=1000        # MAX
+                                        top=0           # only the count, no documents
                                     )
         return await resp.get_count()
 
 
-    async def get_missing_ids_in_store(self, book_ids: set[int], cont_token:str|None, limit:int) -> set[int]:
-        all_chunks = []
-        all_pages_count = 0
+    async def get_missing_ids_in_store(self, book_ids: set[int], cont_token:str|None=None, limit:int=1000) -> set[int]:
         all_book_ids = set()
 
         while True:
-            az_sp = await self.get_paginated_chunks_by_book_ids(book_ids=book_ids,cont_token=cont_token,limit=limit)
-            all_chunks.extend(az_sp.chunks)
-            all_pages_count += az_sp.total_count if az_sp.total_count else 0
-
-            all_book_ids.add( {sp.book_id for sp in az_sp.chunks if sp.book_id})
-            if az_sp.continuation_token is None:
+            az_sp = await self.get_paginated_chunks_by_book_ids(book_ids=book_ids,cont_token=cont_token,limit=limit,
+                                                                fields=["book_id"])      # no chunk texts needed
+            all_book_ids.update({sp.book_id for sp in az_sp.chunks if sp.book_id})
+            cont_token = az_sp.continuation_token
+            if cont_token is None:
                 break  # no more pages
 
         missing_book_ids = set(book_ids) - set(all_book_ids)
         return missing_book_ids  
 
         
-    async def get_paginated_chunks_by_book_ids(self, *, book_ids:set[int], cont_token:str|None, limit:int) -> AzureAiSearchPage:
+    async def get_paginated_chunks_by_book_ids(self, *, book_ids:set[int], cont_token:str|None=None, limit:int=1000,
+                                               fields:list[str]|None=None) -> AzureAiSearchPage:
         filter_expr = " or ".join([f"book_id eq {b_id}" for b_id in book_ids])
         
         chunks, new_cont_token, total_count = await self._scroll_chunks_by_filter(
                                                                 filter_expr=filter_expr,
                                                                 continuation_token=cont_token,
-                                                                limit=limit
+                                                                limit=limit,
+                                                                fields=fields,
                                                             )
         # found_book_ids = [SearchChunk(**f["value"]) for f in resp.get_facets()["book_id"]] # type:ignore
         sp = AzureAiSearchPage(chunks=chunks, 
@@ -173,32 +267,65 @@ class AzSearchVectorStore(AsyncVectorStore):
     async def search_by_embedding(
             self, 
             embed_query_vector:EmbeddingVec,
+            filter: dict[str, Any]|None = None,
             k: int = 10,
+            fields: list[str]|None = None,
+            with_vectors: bool = False,
         ) -> list[SearchChunk]:
         """
         Returns a list of hits (each hit is a dict with at least: id, score).
         """
-        vec_q = VectorizedQuery(vector=embed_query_vector.vector, k_nearest_neighbors=k, fields="book_name, book_id, content_vector")
+        select = self._select(fields) + (["content_vector"] if with_vectors else [])
+        vec_q = VectorizedQuery(vector=embed_query_vector.to_list(), k_nearest_neighbors=k, fields="content_vector")
 
         results:AsyncSearchItemPaged = await self._search_client.search(
                                                 vector_queries=[vec_q],
+                                                filter=self._build_eq_filter(filter) if filter else None,
                                                 top=k,
+                                                select=select,
                                             )
         hits=[]
         
         async for r in results:
-            chunk = SearchChunk(search_score=r["@search.score"], 
-                                uuid_str=r["uuid_str"],
-                                chunk_id=r["chunk_nr"],
-                                book_id=r["book_id"],
-                                content=r["content"],
-                                book_name=r["book_name"],
-                            )
+            chunk = self._dict_to_search_page(r)
+            if with_vectors:
+                chunk.vector = np.asarray(r["content_vector"], dtype=np.float32)
             hits.append(chunk)
         
         return hits
 
 
+    async def search_by_keywords(self, *, query:str, k:int=10, fields:list[str]|None=None) -> list[SearchChunk]:
+        """Full-text search on `content`, ranked by Azure's BM25 scoring."""
+        results:AsyncSearchItemPaged = await self._search_client.search(
+                                                search_text=query,
+                                                query_type="simple",
+                                                search_fields=["content"],
+                                                top=k,
+                                                select=self._select(fields),
+                                            )
+        return [self._dict_to_search_page(r) async for r in results]
+
+
+    async def delete_chunks(self, *, uuids: set[str]) -> None:
+        if uuids:
+            await self._search_client.delete_documents([{"uuid_str": u} for u in uuids])
+
+
+    async def get_book_chunk_hashes(self, *, book_id: int) -> list[SearchChunk]:
+        results:AsyncSearchItemPaged = await self._search_client.search(
+                                                search_text="*",
+                                                filter=f"book_id eq {book_id}",
+                                                select=["uuid_str", "chunk_nr", "book_id", "content_hash", "content_vector"],
+                                            )
+        chunks = []
+        async for r in results:
+            chunk = self._dict_to_search_page(r)
+            chunk.vector = np.asarray(r["content_vector"], dtype=np.float32)
+            chunks.append(chunk)
+        return chunks
+
+
     async def delete_books(self, book_ids: Sequence[int]) -> None:
         doc_dicts = [{"book_id": b_id} for b_id in book_ids]
         await self._search_client.delete_documents(doc_dicts)
@@ -207,12 +334,14 @@ class AzSearchVectorStore(AsyncVectorStore):
     async def paginated_search_by_text(self, *, 
                                 text_query:str,
                                 limit:int,
-                                cont_token:str|None
+                                cont_token:str|None,
+                                fields:list[str]|None=None,
                             ) -> AzureAiSearchPage:
         chunks, next_token, total_count = await self._scroll_chunks_by_filter(search_text=text_query, 
                                                                             filter_expr="",     # no filter applied
                                                                             continuation_token=cont_token,
-                                                                            limit=limit)
+                                                                            limit=limit,
+                                                                            fields=fields)
 
         return AzureAiSearchPage(chunks=chunks, 
                                 total_count=total_count, 
@@ -230,6 +359,10 @@ class AzSearchVectorStore(AsyncVectorStore):
     async def get_all_unique_book_names(self) -> list[str]:
         raise NotImplementedError("Implemented when needed")
 
+    async def get_all_book_ids(self) -> set[int]:
+        resp = await self._search_client.search(search_text="*", facets=["book_id,count:100000"], top=0)
+        return {int(f["value"]) for f in (await resp.get_facets() or {}).get("book_id", [])}
+
     
     async def create_missing_collection(self, collection_name:str) -> None:
         """Collection in Azure lingo for Search Index"""
@@ -243,10 +376,18 @@ class AzSearchVectorStore(AsyncVectorStore):
                 # semantic_search=_get_semantinc_search_settings()
             )
 
-            self._index_client.create_index(index=new_index)
+            await self._index_client.create_index(index=new_index)
             print(f"Created index: {collection_name}")
         else:
             print(f"Index '{collection_name}' already created")
+            # fields added since the index was created (e.g. content_hash), Azure allows adding but not changing fields
+            index = await self._index_client.get_index(collection_name)
+            existing = {f.name for f in index.fields}
+            missing = [f for f in self._get_index_fields() if f.name not in existing]
+            if missing:
+                index.fields.extend(missing)
+                await self._index_client.create_or_update_index(index)
+                print(f"Added fields {[f.name for f in missing]} to index '{collection_name}'")
 
 
     async def delete_collection(self, collection_name:str) -> None:
@@ -260,6 +401,7 @@ class AzSearchVectorStore(AsyncVectorStore):
                 SimpleField(name="book_name", type=SearchFieldDataType.String, filterable=True, facetable=True),
                 SimpleField(name="book_id", type=SearchFieldDataType.Int32, filterable=True, facetable=True),
                 SearchField(name="content", type=SearchFieldDataType.String, searchable=True),
+                SimpleField(name="content_hash", type=SearchFieldDataType.String),
             ]
         
         assert all(sf.name in SearchChunk.model_fields.keys() for sf in index_fields), f"Vector index fields not matching SearchItem: {SearchChunk.model_fields.keys()} != (index_fields) {index_fields} "
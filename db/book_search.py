@@ -0,0 +1,60 @@
+from sqlalchemy import DDL, Table, event, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# Substring search over book_metadata.title/authors without sequential scans:
+#   - Postgres: pg_trgm GIN indexes, which ILIKE '%term%' uses as is, ranked by similarity()
+#   - SQLite (tests/local): an FTS5 table with the trigram tokenizer, i.e. the same substring semantics, ranked by bm25()
+# Trigram indexes can't match terms shorter than 3 chars, those fall back to a LIKE filter.
+
+BOOK_FTS_TABLE = "book_metadata_fts"
+MIN_TRIGRAM_TERM_LEN = 3
+
+_SQLITE_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {BOOK_FTS_TABLE} USING fts5(title, authors, content='book_metadata', content_rowid='gb_id', tokenize='trigram')",
+    # external content table, kept in sync by triggers
+    f"""CREATE TRIGGER IF NOT EXISTS book_metadata_fts_ai AFTER INSERT ON book_metadata BEGIN
+            INSERT INTO {BOOK_FTS_TABLE}(rowid, title, authors) VALUES (new.gb_id, new.title, new.authors);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS book_metadata_fts_ad AFTER DELETE ON book_metadata BEGIN
+            INSERT INTO {BOOK_FTS_TABLE}({BOOK_FTS_TABLE}, rowid, title, authors) VALUES ('delete', old.gb_id, old.title, old.authors);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS book_metadata_fts_au AFTER UPDATE ON book_metadata BEGIN
+            INSERT INTO {BOOK_FTS_TABLE}({BOOK_FTS_TABLE}, rowid, title, authors) VALUES ('delete', old.gb_id, old.title, old.authors);
+            INSERT INTO {BOOK_FTS_TABLE}(rowid, title, authors) VALUES (new.gb_id, new.title, new.authors);
+        END""",
+]
+
+_PG_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE book_metadata ADD COLUMN IF NOT EXISTS languages VARCHAR NOT NULL DEFAULT ''",     # tables created before the column, '' = unknown, see select_books_like_db
+    "CREATE INDEX IF NOT EXISTS ix_book_metadata_title_trgm ON book_metadata USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_book_metadata_authors_trgm ON book_metadata USING gin (authors gin_trgm_ops)",
+]
+
+
+def register_search_ddl(table:Table) -> None:
+    """Create the SQLite FTS table + triggers along with the book_metadata table (create_all)."""
+    for stmt in _SQLITE_FTS_DDL:
+        event.listen(table, "after_create", DDL(stmt).execute_if(dialect="sqlite"))
+
+
+async def create_book_search_indexes(conn:AsyncConnection) -> None:
+    """
+    Idempotent, run at startup after create_all: creates the indexes on an existing book_metadata table too
+    (create_all only creates missing tables). For SQLite the FTS table is (re)built from book_metadata if it's new.
+    """
+    if conn.dialect.name == "postgresql":
+        for stmt in _PG_TRGM_DDL:
+            await conn.execute(text(stmt))
+
+    elif conn.dialect.name == "sqlite":
+        fts_exists = (await conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :n"), {"n": BOOK_FTS_TABLE})).first()
+        for stmt in _SQLITE_FTS_DDL:
+            await conn.execute(text(stmt))
+        if not fts_exists:
+            await conn.execute(text(f"INSERT INTO {BOOK_FTS_TABLE}({BOOK_FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def fts5_phrase(term:str) -> str:
+    """A term as an FTS5 string literal, i.e. matched as a substring by the trigram tokenizer."""
+    return '"' + term.replace('"', '""') + '"'
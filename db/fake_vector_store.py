@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 from typing import Any, Sequence
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 from pydantic_settings import SettingsConfigDict  # if you want config
-from .vector_store_abstract import AsyncVectorStore
+from .vector_store_abstract import AsyncVectorStore, validate_fields
 from models.api_response_model import SearchChunk, SearchPage
 from models.vector_db_model import UploadChunk, EmbeddingVec
+from retrieval.bm25 import BM25Index
 
 from scipy.spatial import distance
 import numpy as np
@@ -31,6 +32,7 @@ class InMemoryVectorStore(AsyncVectorStore):
     data: dict[int, list[UploadChunk]] = Field(default_factory=dict)
     
     collections: set[str] = Field(default_factory=set)
+    _bm25: BM25Index = PrivateAttr(default_factory=BM25Index)
 
     async def create_missing_collection(self, *, collection_name: str) -> None:
         self.collections.add(collection_name)
@@ -39,18 +41,38 @@ class InMemoryVectorStore(AsyncVectorStore):
     async def delete_collection(self, *, collection_name: str) -> None:
         self.collections.discard(collection_name)
         self.data.clear()
+        self._bm25.clear()
 
 
     async def upsert_chunks(self, *, chunks: Sequence[UploadChunk]) -> None:
-        # Very naive: group by book id and append
-        for chunk in chunks:
-            book_id = chunk.book_id  
-            self.data.setdefault(book_id, []).append(chunk)
+        # group by book id, a chunk with an existing uuid replaces it like in the real stores
+        new_by_uuid = {c.uuid_str: c for c in chunks}
+        for book_id in {c.book_id for c in chunks}:
+            kept = [c for c in self.data.get(book_id, []) if c.uuid_str not in new_by_uuid]
+            self.data[book_id] = kept + [c for c in chunks if c.book_id == book_id]
+        # re-index the touched books as a whole, the index replaces a book's segment
+        book_ids = {c.book_id for c in chunks}
+        self._bm25.add_chunks([c for b_id in book_ids for c in self.data[b_id]])
 
 
     async def delete_books(self, *, book_ids: set[int]) -> None:
         for book_id in book_ids:
             self.data.pop(book_id, None)
+        self._bm25.delete_books(book_ids)
+
+
+    async def delete_chunks(self, *, uuids: set[str]) -> None:
+        for book_id, chunks in self.data.items():
+            kept = [c for c in chunks if c.uuid_str not in uuids]
+            if len(kept) < len(chunks):
+                self.data[book_id] = kept
+                self._bm25.add_chunks(kept) if kept else self._bm25.delete_books({book_id})
+
+
+    async def get_book_chunk_hashes(self, *, book_id: int) -> list[SearchChunk]:
+        return [SearchChunk(uuid_str=c.uuid_str, chunk_id=c.chunk_id, book_id=c.book_id, content_hash=c.content_hash,
+                            vector=c.content_vector.vector, search_score=-1.0)
+                for c in self.data.get(book_id, [])]
 
 
     async def get_missing_ids_in_store(self, *, book_ids: set[int]) -> set[int]:
@@ -58,46 +80,86 @@ class InMemoryVectorStore(AsyncVectorStore):
         return book_ids - existing_ids
 
 
+    async def get_all_book_ids(self) -> set[int]:
+        return {b_id for b_id, chunks in self.data.items() if chunks}
+
+
     async def search_by_embedding(
         self,
         *,
         embed_query_vector: EmbeddingVec,
         filter: dict[str, Any] | None = None,
         k: int = 10,
+        fields: list[str] | None = None,
+        with_vectors: bool = False,
     ) -> list[SearchChunk]:
+        fields = validate_fields(fields)
         candidates:list[tuple[float, UploadChunk]] = []
 
         for book_id, chunks in self.data.items():
             for chunk in chunks:
+                if filter and not self._matches(chunk, filter):
+                    continue
                 chunk_emb = chunk.content_vector 
-                score = distance.cosine(np.array(embed_query_vector.vector), 
-                                        np.array(chunk_emb.vector))
+                score = 1 - distance.cosine(embed_query_vector.vector,     # similarity, not distance
+                                            chunk_emb.vector)
                 candidates.append((score, chunk))
 
         # sort by score descending, take top k
         candidates.sort(key=lambda t: t[0], reverse=True)
         top = candidates[:k]
 
-        results: list[SearchChunk] = []
-        for score, chunk in top:
-            result = SearchChunk(**chunk.model_dump(), search_score=score)
-            results.append(result)
-
+        results = [self._to_search_chunk(chunk, score, fields) for score, chunk in top]
+        if with_vectors:
+            for res, (_, chunk) in zip(results, top):
+                res.vector = chunk.content_vector.vector
         return results
     
 
+    async def search_by_keywords(self, *, query: str, k: int = 10, fields: list[str] | None = None) -> list[SearchChunk]:
+        fields = validate_fields(fields)
+        return [self._to_search_chunk(h, h.search_score, fields) for h in self._bm25.search(query, k=k)]
+
+
+    def _matches(self, chunk: UploadChunk, filter: dict[str, Any]) -> bool:
+        # same semantics as the real stores: all fields must match, a list/set value matches any of its values
+        payload = {"uuid_str": chunk.uuid_str, "chunk_nr": chunk.chunk_id, "book_name": chunk.book_name, "book_id": chunk.book_id}
+        return all(payload.get(k) in v if isinstance(v, (list, set, tuple)) else payload.get(k) == v 
+                   for k, v in filter.items())
+
+
+    def _to_search_chunk(self, chunk: UploadChunk | SearchChunk, score: float, fields: list[str] | None) -> SearchChunk:
+        # mimics the Qdrant payload, which also holds token_count
+        payload = {"uuid_str": chunk.uuid_str, "chunk_nr": chunk.chunk_id, "book_name": chunk.book_name, 
+                   "book_id": chunk.book_id, "content": chunk.content}
+        if fields is not None:
+            payload = {f: payload[f] for f in fields}
+        else:
+            payload["token_count"] = chunk.token_count
+            payload["content_hash"] = chunk.content_hash
+        return SearchChunk.from_payload(payload, search_score=score)
+
+
     async def get_paginated_chunks_by_book_ids(
         self,
         *,
         book_ids: set[int],
+        fields: list[str] | None = None,
     ) -> SearchPage:
         raise NotImplementedError("Not used in current tests. Implemented when needed.")
 
 
-    async def get_chunk_by_nr(self, *, chunk_nr: int, book_id: int) -> SearchPage:
+    async def get_chunk_by_nr(self, *, chunk_nr: int, book_id: int, fields: list[str] | None = None) -> SearchPage:
         raise NotImplementedError("Not used in current tests. Implemented when needed.")
 
 
+    async def get_chunks_by_nrs(self, *, chunk_nrs_by_book: dict[int, set[int]], fields: list[str] | None = None) -> list[SearchChunk]:
+        fields = validate_fields(fields)
+        return [self._to_search_chunk(c, -1.0, fields) 
+                for book_id, nrs in chunk_nrs_by_book.items() 
+                for c in self.data.get(book_id, []) if c.chunk_id in nrs]
+
+
     async def get_chunk_count_in_book(self, *, book_id: int) -> int:
         # Could return len(...) if you want, or stub until needed
         chunks = self.data.get(book_id, [])
@@ -111,8 +173,11 @@ class InMemoryVectorStore(AsyncVectorStore):
         limit: int,
         skip: int,
         continuation_token: str | None = None,
+        fields: list[str] | None = None,
     ) -> SearchPage:
-        raise NotImplementedError("Not used in current tests. Implemented when needed.")
+        fields = validate_fields(fields)
+        hits, total_count = self._bm25.search_page(text_query, skip=skip, limit=limit)
+        return SearchPage(chunks=[self._to_search_chunk(h, h.search_score, fields) for h in hits], total_count=total_count)
 
 
     async def close_conn(self) -> None:
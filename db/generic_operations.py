@@ -1,6 +1,9 @@
 from collections.abc import Sequence
 from models.schema import DBBookMetaData,DBBookChunkStats
 from sqlalchemy import select, delete, and_, or_
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from typing import Any, Type, TypeVar
@@ -50,6 +53,43 @@ async def insert_if_missing_db(
 
 
 
+def _to_insert_row(obj:DeclarativeBase) -> dict[str, Any]:
+    """Column values of an ORM object, unset columns are left out so DB defaults apply."""
+    mapper = sa_inspect(obj).mapper
+    return {attr.key: getattr(obj, attr.key) for attr in mapper.column_attrs if getattr(obj, attr.key) is not None}
+
+
+async def insert_many_if_missing_db(
+                *,
+                objs: Sequence[T],
+                model: Type[T],
+                conflict_col: str,
+                db_sess: AsyncSession,) -> set[Any]:
+    """
+    Bulk insert in one statement: INSERT ... ON CONFLICT (conflict_col) DO NOTHING RETURNING conflict_col (Postgres + SQLite).
+    Doesn't commit, so a whole ingestion batch can be committed at once.
+    Returns: the conflict_col values of the inserted rows
+    """
+    if not objs:
+        return set()
+    
+    dialect = db_sess.bind.dialect.name
+    if dialect == "postgresql":
+        insert_fn = pg_insert
+    elif dialect == "sqlite":
+        insert_fn = sqlite_insert
+    else:
+        raise ValueError(f"Bulk insert not supported for {dialect}")
+    
+    col = getattr(model, conflict_col)
+    stmt = (insert_fn(model)
+                .values([_to_insert_row(o) for o in objs])
+                .on_conflict_do_nothing(index_elements=[conflict_col])
+                .returning(col))
+    res = await db_sess.execute(stmt)
+    return set(res.scalars().all())
+
+
 async def select_by_pk(
                 *,
                 model: Type[T],
@@ -1,7 +1,8 @@
 from db.database import Base
-from db.generic_operations import delete_by_field_db, insert_row_db, select_by_pk, insert_if_missing_db, select_where_db
+from db.generic_operations import delete_by_field_db, insert_row_db, select_by_pk, insert_if_missing_db, select_where_db, insert_many_if_missing_db
 from models.schema import DBBookMetaData,DBBookChunkStats
-from sqlalchemy import select, delete, and_, or_
+from sqlalchemy import select, delete, and_, or_, func, literal, column, text, Integer, Float
+from db.book_search import BOOK_FTS_TABLE, MIN_TRIGRAM_TERM_LEN, fts5_phrase
 # from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
@@ -31,6 +32,32 @@ async def insert_missing_book_db(book_meta:DBBookMetaData, db_sess:AsyncSession)
                             )
     return is_inserted, mess
 
+async def insert_missing_books_db(books:list[DBBookMetaData], db_sess:AsyncSession) -> tuple[set[int], str]:
+    """
+    Bulk insert of books + their chunk_stats (if set) that aren't in the DB yet, then one commit.
+    3 round trips for the whole batch instead of SELECT + INSERT + COMMIT + REFRESH pr. book.
+    Returns: (inserted gb_ids, message)
+    """
+    inserted_ids = await insert_many_if_missing_db(objs=books,
+                                                   model=DBBookMetaData,
+                                                   conflict_col="gb_id",
+                                                   db_sess=db_sess)
+    
+    stats = []
+    for b in books:
+        if b.gb_id in inserted_ids and b.chunk_stats is not None:
+            b.chunk_stats.book_meta_fk = b.gb_id
+            stats.append(b.chunk_stats)
+    await insert_many_if_missing_db(objs=stats, model=DBBookChunkStats, conflict_col="book_meta_fk", db_sess=db_sess)
+    await db_sess.commit()
+
+    skipped = sorted({b.gb_id for b in books} - inserted_ids)
+    mess = f"\nInserted: {DBBookMetaData.__name__}(gb_id in {sorted(inserted_ids)})"
+    if skipped:
+        mess += f"\nAlready in DB: {DBBookMetaData.__name__}(gb_id in {skipped})"
+    return inserted_ids, mess
+
+
 async def insert_missing_chunk_stats_db(chunk_stats:DBBookChunkStats, db_sess:AsyncSession) -> tuple[bool, str]:
     is_inserted, msg = await insert_if_missing_db(
                         obj=chunk_stats,
@@ -102,18 +129,59 @@ async def select_chunk_stats_db_by_id_db(db_sess:AsyncSession,
 
 async def select_books_like_db(title:str|None, 
                             authors:str|None, 
-                            db_sess:AsyncSession) -> list[DBBookMetaData]:
+                            db_sess:AsyncSession,
+                            lang:str|None=None,
+                            skip:int=0,
+                            take:int=50,
+                            ) -> tuple[list[DBBookMetaData], int]:
+    """
+    Case insensitive substring search on title and/or any of the ;-separated authors, optionally only books in lang.
+    Books with unknown languages (stored before the languages column was added) match any lang.
+    Uses the trigram indexes (see db/book_search.py), best matches first.
+    Returns: (the page of books, total number of matches)
+    """
+    author_terms = [a.strip() for a in (authors or "").split(";") if a.strip()]
     conditions = []         # bool expressions to be joined together
+    fts_query = []          # SQLite: FTS5 MATCH query for the terms long enough for trigrams
+    is_sqlite = db_sess.bind.dialect.name == "sqlite"
+
+    def _use_fts(term:str) -> bool:
+        return is_sqlite and len(term) >= MIN_TRIGRAM_TERM_LEN
+
     if title:
-        conditions.append(DBBookMetaData.title.ilike(f"%{title}%"))     # case insensitive
-    if authors:     # authors can be separated by ;
-        conditions.append(or_(*[DBBookMetaData.authors.ilike(f"%{a}%") for a in authors.split(";")]))
+        if _use_fts(title):
+            fts_query.append(f"title : {fts5_phrase(title)}")
+        else:
+            conditions.append(DBBookMetaData.title.ilike(f"%{title}%"))     # case insensitive
+    if author_terms:     # authors can be separated by ;
+        if all(_use_fts(a) for a in author_terms):
+            fts_query.append("(" + " OR ".join(f"authors : {fts5_phrase(a)}" for a in author_terms) + ")")
+        else:
+            conditions.append(or_(*[DBBookMetaData.authors.ilike(f"%{a}%") for a in author_terms]))
+    if lang:
+        # languages = '' is unknown (rows added before the column existed), those aren't filtered out
+        conditions.append(or_(DBBookMetaData.languages == "",
+                              (literal(";") + DBBookMetaData.languages + literal(";")).ilike(f"%;{lang};%")))
+
+    stmt = select(DBBookMetaData, func.count().over().label("total")).where(*conditions)
+    if fts_query:
+        fts_hits = (text(f"SELECT rowid, bm25({BOOK_FTS_TABLE}) AS rank FROM {BOOK_FTS_TABLE} WHERE {BOOK_FTS_TABLE} MATCH :fts_query")
+                        .bindparams(fts_query=" AND ".join(fts_query))
+                        .columns(column("rowid", Integer), column("rank", Float))
+                        .subquery("fts_hits"))
+        stmt = (stmt.join(fts_hits, fts_hits.c.rowid == DBBookMetaData.gb_id)
+                    .order_by(fts_hits.c.rank, DBBookMetaData.gb_id))
+    elif title and not is_sqlite:
+        stmt = stmt.order_by(func.similarity(DBBookMetaData.title, title).desc(), DBBookMetaData.gb_id)
+    else:
+        stmt = stmt.order_by(DBBookMetaData.gb_id)
+
+    rows = (await db_sess.execute(stmt.offset(skip).limit(take))).all()
+    if rows:
+        return [r[0] for r in rows], rows[0].total
     
-    return await select_where_db(
-                    model=DBBookMetaData,
-                    conditions=conditions,
-                    db_sess=db_sess,
-                )
+    total = 0 if skip == 0 else (await db_sess.execute(select(func.count()).select_from(stmt.order_by(None).subquery()))).scalar_one()
+    return [], total
 
 
 async def delete_book_db(db_sess:AsyncSession, gb_id:int) -> None:
@@ -1,11 +1,13 @@
-import json
-import asyncio
-from typing import Any
+import asyncio, logging
+import numpy as np
+from typing import Any, Sequence
 from pydantic import PrivateAttr
 
 from config.settings import Settings 
 from models.vector_db_model import UploadChunk, EmbeddingVec, SearchChunk, SearchPage, QDrantSearchPage
-from .vector_store_abstract import AsyncVectorStore
+from .vector_store_abstract import AsyncVectorStore, validate_fields
+from .upload_batching import estimate_chunk_json_bytes, iter_batches_by_size, JSON_BYTES_PR_FLOAT
+from retrieval.bm25 import bm25_sparse_vector, query_sparse_vector, tokenize
 
 from qdrant_client import AsyncQdrantClient
 from qdrant_client.models import (
@@ -17,10 +19,20 @@ from qdrant_client.models import (
     MatchText,
     Distance,
     VectorParams,
+    SparseVectorParams,
+    SparseVector,
+    Modifier,
     Record,
-    FacetValueHit
+    QueryRequest,
+    ScoredPoint,
+    FacetValueHit,
+    PointIdsList,
+    CollectionStatus,
 )
-MAX_QDRANT_JSON_BYTES = 20 * 1024 * 1024  # 28MB
+MAX_QDRANT_JSON_BYTES = 20 * 1024 * 1024  # 20MB
+SPARSE_VECTOR_NAME = "bm25"                 # named sparse vector next to the unnamed dense one, for keyword search
+SPARSE_JSON_BYTES_PR_TERM = 11 + JSON_BYTES_PR_FLOAT       # uint32 index + comma, value
+logger = logging.getLogger(__name__)
 
 INDEXED_PAYL_FIELDS = { "chunk_nr":"integer", 
                         "book_id":"integer",
@@ -34,15 +46,30 @@ class QdrantVectorStore(AsyncVectorStore):
     distance:Distance = Distance.COSINE
     collection_name: str
     _client: AsyncQdrantClient = PrivateAttr()
+    _has_sparse: bool|None = PrivateAttr(default=None)      # collection has the bm25 sparse vector, None = not checked yet
 
     def model_post_init(self, __context):
         self._client = AsyncQdrantClient(url=self.settings.QDRANT_SEARCH_ENDPOINT, 
                                         api_key=self.settings.QDRANT_SEARCH_KEY,
+                                        prefer_grpc=self.settings.QDRANT_PREFER_GRPC,       # protobuf instead of JSON for bulk writes
+                                        grpc_port=self.settings.QDRANT_GRPC_PORT,
                                         verify=False,
                                         timeout=60)       # TODO: remove before prod and make proper fix
 
+    async def _sparse_enabled(self) -> bool:
+        """Collections created before hybrid search have no sparse vector, they're only searchable by dense vectors + MatchText."""
+        if self._has_sparse is None:
+            info = await self._client.get_collection(collection_name=self.collection_name)
+            self._has_sparse = SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+            if not self._has_sparse:
+                logger.warning("Collection %s has no '%s' sparse vector, keyword search falls back to unranked MatchText",
+                               self.collection_name, SPARSE_VECTOR_NAME)
+        return self._has_sparse
+
     def _build_must_filter(self, filters: dict[str, Any]) -> Filter:
-        return Filter(must=[FieldCondition(key=k, match=MatchValue(value=v)) for k, v in filters.items()])
+        """All fields must match, a list/set value matches any of its values, e.g. {"book_id": [84, 2701]}"""
+        return Filter(must=[FieldCondition(key=k, match=MatchAny(any=list(v)) if isinstance(v, (list, set, tuple)) else MatchValue(value=v)) 
+                            for k, v in filters.items()])
         
 
     async def _create_indexes(self) -> None:
@@ -59,9 +86,8 @@ class QdrantVectorStore(AsyncVectorStore):
         
         for p in points:
             payload = p.payload or {}
-            chunk = SearchChunk(
-                search_score=-1.0,              # scroll in Qdrant doesn't give a text relevance score - using dummy value instead
-                **payload)
+            chunk = SearchChunk.from_payload(payload, 
+                                             search_score=-1.0)     # scroll in Qdrant doesn't give a text relevance score - using dummy value instead
             chunks.append(chunk)
 
         return QDrantSearchPage(
@@ -80,8 +106,13 @@ class QdrantVectorStore(AsyncVectorStore):
                             )
         return count_res.count
     
+    def _with_payload(self, fields:list[str]|None) -> bool|list[str]:
+        """Qdrant payload selector for a field projection, True = whole payload."""
+        fields = validate_fields(fields)
+        return True if fields is None else fields
+
     #TODO: make another version that just returns 1 SP!! 
-    async def get_paginated_chunks_by_book_ids(self, book_ids:set[int]) -> QDrantSearchPage:
+    async def get_paginated_chunks_by_book_ids(self, book_ids:set[int], fields:list[str]|None=None) -> QDrantSearchPage:
         filter = Filter(      
             must=[FieldCondition(key="book_id", match=MatchAny(any=list(book_ids))) ]
         )
@@ -95,12 +126,12 @@ class QdrantVectorStore(AsyncVectorStore):
                                                     scroll_filter=filter,
                                                     limit=500,
                                                     offset=offset,
-                                                    with_payload=True,
+                                                    with_payload=self._with_payload(fields),
                                                     with_vectors=False,
                                                 )
             for p in points:
                 if p.payload: 
-                    point_matches.append(SearchChunk(search_score=-1.0, **p.payload))     
+                    point_matches.append(SearchChunk.from_payload(p.payload, search_score=-1.0))     
 
             if offset is None:
                 break
@@ -117,7 +148,7 @@ class QdrantVectorStore(AsyncVectorStore):
         return count
 
 
-    async def get_chunk_by_nr(self, *, chunk_nr:int, book_id:int) -> SearchPage:
+    async def get_chunk_by_nr(self, *, chunk_nr:int, book_id:int, fields:list[str]|None=None) -> SearchPage:
         qdrant_filter = Filter(
             must=[
                 FieldCondition(key="book_id", match=MatchValue(value=book_id)),
@@ -129,7 +160,7 @@ class QdrantVectorStore(AsyncVectorStore):
         points, next_offset = await self._client.scroll(
                                                 collection_name=self.collection_name,
                                                 scroll_filter=qdrant_filter,
-                                                with_payload=True,
+                                                with_payload=self._with_payload(fields),
                                                 with_vectors=False,
                                                 limit=100,   # adjust as needed
                                             )
@@ -142,8 +173,30 @@ class QdrantVectorStore(AsyncVectorStore):
         return sp
 
     
+    async def get_chunks_by_nrs(self, *, chunk_nrs_by_book:dict[int, set[int]], fields:list[str]|None=None) -> list[SearchChunk]:
+        n_wanted = sum(len(nrs) for nrs in chunk_nrs_by_book.values())
+        if n_wanted == 0:
+            return []
+
+        # (book_id = b1 AND chunk_nr IN nrs1) OR (book_id = b2 AND ...), served by the book_id + chunk_nr payload indexes
+        qdrant_filter = Filter(should=[
+                                Filter(must=[FieldCondition(key="book_id", match=MatchValue(value=book_id)),
+                                             FieldCondition(key="chunk_nr", match=MatchAny(any=sorted(nrs)))])
+                                for book_id, nrs in chunk_nrs_by_book.items() if nrs
+                            ])
+
+        points, _ = await self._client.scroll(
+                                        collection_name=self.collection_name,
+                                        scroll_filter=qdrant_filter,
+                                        limit=n_wanted,
+                                        with_payload=self._with_payload(fields),
+                                        with_vectors=False,
+                                    )
+        return [SearchChunk.from_payload(p.payload, search_score=-1.0) for p in points if p.payload]
+
+    
     async def get_missing_ids_in_store(self, book_ids:set[int]) -> set[int]:
-        search_page_matches = await self.get_paginated_chunks_by_book_ids(book_ids)
+        search_page_matches = await self.get_paginated_chunks_by_book_ids(book_ids, fields=["book_id"])     # no chunk texts needed
         existing_ids = {sp.book_id for sp in search_page_matches.chunks if sp.book_id}
         if not book_ids:
             return set()
@@ -152,18 +205,19 @@ class QdrantVectorStore(AsyncVectorStore):
 
 
 
-    # TODO: add feature to filter payload fields 
     async def paginated_search_by_text(self, *, 
                             text_query:str,
                             skip: int,  
                             limit: int = 50,
+                            fields: list[str]|None = None,
                             ) -> SearchPage:
         """
             Keyword-based search (no embeddings) in Qdrant matching on full-text field `content`.
-            The search is paginated based on the 'skip' and 'limit' parameters, and returns a custom SearchPage having all payload fields.
+            The search is paginated based on the 'skip' and 'limit' parameters, and returns a custom SearchPage with the payload fields requested.
             Args:
                 skip (int): Number of chunk items to skip in the search. Similar to an 'offset'.
                 limit (int): Number of chunk items to include after skipping. 
+                fields (list[str]|None): Payload fields to return, None returns all.
         """
         text_filter = Filter(
             must=[
@@ -174,29 +228,29 @@ class QdrantVectorStore(AsyncVectorStore):
             ]
         )
 
-        collected_points = []
-        next_offset = None
-
         total_count = await self._result_count_text_query(filter=text_filter)
+        next_offset = None
 
-        while len(collected_points) < skip + limit:
-            points, next_offset = await self._client.scroll(
+        if skip > 0:
+            # Skipped points are only scrolled past to find the offset, without downloading their payload
+            skipped, next_offset = await self._client.scroll(
                                             collection_name=self.collection_name,
                                             scroll_filter=text_filter,
-                                            limit=limit,       # no. chunk items to return for each scroll call
-                                            offset=next_offset,
-                                            with_payload=True,
+                                            limit=skip,
+                                            with_payload=False,
                                             with_vectors=False,
                                         )
-            if not points:
-                break  # no more results
-
-            collected_points.extend(points)
-
-            if next_offset is None:
-                break  # reached end
+            if len(skipped) < skip or next_offset is None:
+                return self._points_to_search_page(points=[], skip=skip, limit=limit, total_count=total_count)
 
-        page_points = collected_points[skip:skip + limit]               # apply skip/top on the collected points
+        page_points, _ = await self._client.scroll(
+                                        collection_name=self.collection_name,
+                                        scroll_filter=text_filter,
+                                        limit=limit,
+                                        offset=next_offset,
+                                        with_payload=self._with_payload(fields),
+                                        with_vectors=False,
+                                    )
 
         sp = self._points_to_search_page(points=page_points, 
                                     skip=skip, limit=limit, 
@@ -214,7 +268,9 @@ class QdrantVectorStore(AsyncVectorStore):
                                         size=hp.embed_dim,
                                         distance=self.distance,
                                     ),
+                    sparse_vectors_config={SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)},     # Qdrant computes the IDF part of BM25
                 )
+            self._has_sparse = None
             
             await self._create_indexes()
             
@@ -224,63 +280,106 @@ class QdrantVectorStore(AsyncVectorStore):
 
     async def delete_collection(self, collection_name:str) -> None:
         await self._client.delete_collection(collection_name)
+        self._has_sparse = None
     
 
-    def _estimate_bytes_of_point(self, points:PointStruct) -> int:
+    def _estimate_bytes_of_point(self, chunk:UploadChunk) -> int:
         """
-        Estimate the serialized JSON size of an upload chunk as a Qdrant Point.
+        Upper bound of the serialized JSON size of an upload chunk as a Qdrant Point.
+        Computed from vector dimension + payload string lengths, so the vector is never serialized just to size it.
         """
-        d = points.model_dump()
-        return  len(json.dumps(d, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        point_bytes = estimate_chunk_json_bytes(chunk)
+        if self._has_sparse:
+            point_bytes += SPARSE_JSON_BYTES_PR_TERM * len(set(tokenize(chunk.content))) + 64
+        return point_bytes
+
+
+    def _chunk_to_point(self, c:UploadChunk, with_sparse:bool=False) -> PointStruct:
+        vector: Any = c.content_vector.to_list()
+        if with_sparse:
+            indices, values = bm25_sparse_vector(c.content)
+            vector = {"": vector, SPARSE_VECTOR_NAME: SparseVector(indices=indices, values=values)}
+
+        return PointStruct(
+                    id=c.uuid_str,
+                    vector=vector,
+                    payload={
+                        "uuid_str": c.uuid_str,
+                        "chunk_nr": c.chunk_id,
+                        "book_name": c.book_name,
+                        "book_id": c.book_id,
+                        "content": c.content,
+                        "token_count": c.token_count,       # not a projectable field, used to budget context expansion
+                        "content_hash": c.content_hash,     # not projectable either, for diffing re-ingested books
+                    },
+                )
+
+
+    async def _upsert_batch(self, batch:list[UploadChunk], wait:bool=True) -> None:
+        # PointStructs (list[float] vectors) only exist for the batches in flight
+        await self._client.upsert(points=[self._chunk_to_point(c, with_sparse=bool(self._has_sparse)) for c in batch], 
+                                  collection_name=self.collection_name,
+                                  wait=wait)
+
+
+    async def _wait_until_indexed(self, poll_secs:float=0.5, timeout_secs:float=600) -> None:
+        """Poll the collection until Qdrant reports it green, i.e. no pending optimization/indexing."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_secs
+
+        while True:
+            info = await self._client.get_collection(collection_name=self.collection_name)
+            if info.status == CollectionStatus.GREEN:
+                return
+            if loop.time() > deadline:
+                raise TimeoutError(f"Collection {self.collection_name} still {info.status} after {timeout_secs}s")
+            await asyncio.sleep(poll_secs)
 
 
     async def upsert_chunks(
             self,
-            chunks: list[UploadChunk],
+            chunks: Sequence[UploadChunk],
             max_bytes: int = MAX_QDRANT_JSON_BYTES,
+            max_points: int|None = None,
+            max_concurrency: int|None = None,
+            wait: bool|None = None,
         ) -> None:
         """
         Upsert UploadChunk objects in batches whose JSON payload stays under max_bytes.
+        If max_points is given, a batch is also flushed once it holds max_points chunks (point-count batching).
+
+        Up to max_concurrency batches are in flight at once. With wait=False Qdrant acknowledges a batch 
+        once it's written to its WAL; the last batch is then sent with wait=True after all others are acknowledged 
+        (operations are applied in order), and the call returns when the collection is done indexing.
+        Both default to the ingestion hyperparams.
         """
-        batch: list[PointStruct] = []
-        batch_bytes = 2  # approx overhead for "[]"
-
-        points = [
-            PointStruct(
-                id=c.uuid_str,
-                vector=c.content_vector.vector,
-                payload={
-                    "uuid_str": c.uuid_str,
-                    "chunk_nr": c.chunk_id,
-                    "book_name": c.book_name,
-                    "book_id": c.book_id,
-                    "content": c.content,
-                },
-            ) for c in chunks]
+        hp = self.settings.get_hyperparams().ingestion
+        max_concurrency = max_concurrency or hp.upsert_max_concurrency
+        wait = hp.upsert_wait if wait is None else wait
 
-        for p in points:
-            item_bytes = self._estimate_bytes_of_point(p)
+        await self._sparse_enabled()        # resolved once, batches are sized + built with/without sparse vectors
+        sem = asyncio.Semaphore(max_concurrency)
+        last_batch: list[UploadChunk] | None = None
 
-            # If a single item is too large, batching cannot fix it.
-            if item_bytes > max_bytes:
-                raise ValueError(
-                    f"Single UploadChunk too large: ~{item_bytes / (1024*1024):.2f} MB. "
-                    "Reduce chunk size or store `content` elsewhere (and keep only an id/snippet in Qdrant)."
-                )
+        async def _send(batch:list[UploadChunk]) -> None:
+            try:
+                await self._upsert_batch(batch, wait=wait)
+            finally:
+                sem.release()
 
-            # Flush current batch if adding this item would exceed limit.
-            if batch and (batch_bytes + item_bytes) > max_bytes:
-                await self._client.upsert(points=batch, 
-                                          collection_name=self.collection_name)  
-                batch = []
-                batch_bytes = 2
+        async with asyncio.TaskGroup() as tg:
+            for batch in iter_batches_by_size(chunks, estimate_bytes=self._estimate_bytes_of_point,
+                                              max_bytes=max_bytes, max_items=max_points):
+                if last_batch is not None:
+                    await sem.acquire()         # bounds the no. batches (and their points) held in memory
+                    tg.create_task(_send(last_batch))
+                last_batch = batch
 
-            batch.append(p)
-            batch_bytes += item_bytes + 1  # +1 for comma/overhead
+        if last_batch is not None:
+            await self._upsert_batch(last_batch, wait=True)
 
-        if batch:
-            await self._client.upsert(points=batch, 
-                                        collection_name=self.collection_name)  
+        if not wait:
+            await self._wait_until_indexed()
 
 
     # async def upsert_chunks_(self, chunks: list[UploadChunk]) -> None:
@@ -305,21 +404,103 @@ class QdrantVectorStore(AsyncVectorStore):
     #             points=points,
     #         )
 
-    async def search_by_embedding(self, embed_query_vector: EmbeddingVec, filter:dict[str,Any]|None, k: int=10) -> list[SearchChunk]:
+    async def search_by_embedding(self, embed_query_vector: EmbeddingVec, filter:dict[str,Any]|None, k: int=10,
+                                  fields:list[str]|None=None, with_vectors:bool=False) -> list[SearchChunk]:
         qdrant_filter = self._build_must_filter(filter) if filter else None
 
         results = await self._client.query_points(
                                         collection_name=self.collection_name,
-                                        query=embed_query_vector.vector,
+                                        query=embed_query_vector.to_list(),
                                         limit=k,
                                         query_filter=qdrant_filter,
+                                        with_payload=self._with_payload(fields),
+                                        with_vectors=[""] if with_vectors else False,     # only the unnamed dense vector, not bm25
                                     )
+        return self._scored_points_to_chunks(results.points, with_vectors=with_vectors)
 
-        hits = [SearchChunk(search_score=p.score, **p.payload) for p in results.points if p.payload]
-        
+
+    async def search_by_embeddings(self, *, embed_query_vectors:list[EmbeddingVec], filter:dict[str,Any]|None=None, k:int=10,
+                                   fields:list[str]|None=None, with_vectors:bool=False) -> list[list[SearchChunk]]:
+        """All query vectors searched in one query_batch_points request."""
+        qdrant_filter = self._build_must_filter(filter) if filter else None
+        requests = [QueryRequest(query=v.to_list(), 
+                                 limit=k, 
+                                 filter=qdrant_filter, 
+                                 with_payload=self._with_payload(fields),
+                                 with_vector=[""] if with_vectors else False)
+                    for v in embed_query_vectors]
+
+        responses = await self._client.query_batch_points(collection_name=self.collection_name, requests=requests)
+        return [self._scored_points_to_chunks(r.points, with_vectors=with_vectors) for r in responses]
+
+
+    def _scored_points_to_chunks(self, points:list[ScoredPoint], with_vectors:bool) -> list[SearchChunk]:
+        hits = []
+        for p in points:
+            if not p.payload:
+                continue
+            chunk = SearchChunk.from_payload(p.payload, search_score=p.score)
+            if with_vectors:
+                vec = p.vector.get("") if isinstance(p.vector, dict) else p.vector
+                chunk.vector = np.asarray(vec, dtype=np.float32)
+            hits.append(chunk)
         return hits
 
 
+    async def search_by_keywords(self, *, query:str, k:int=10, fields:list[str]|None=None) -> list[SearchChunk]:
+        """
+        BM25 ranked search on the sparse vectors.
+        Collections without sparse vectors fall back to an unranked MatchText match on `content`.
+        """
+        if not await self._sparse_enabled():
+            points, _ = await self._client.scroll(
+                                        collection_name=self.collection_name,
+                                        scroll_filter=Filter(must=[FieldCondition(key="content", match=MatchText(text=query))]),
+                                        limit=k,
+                                        with_payload=self._with_payload(fields),
+                                        with_vectors=False,
+                                    )
+            return [SearchChunk.from_payload(p.payload, search_score=0.0) for p in points if p.payload]
+
+        indices, values = query_sparse_vector(query)
+        if not indices:
+            return []       # only stopwords
+
+        results = await self._client.query_points(
+                                        collection_name=self.collection_name,
+                                        query=SparseVector(indices=indices, values=values),
+                                        using=SPARSE_VECTOR_NAME,
+                                        limit=k,
+                                        with_payload=self._with_payload(fields),
+                                    )
+        return [SearchChunk.from_payload(p.payload, search_score=p.score) for p in results.points if p.payload]
+
+
+    async def delete_chunks(self, *, uuids: set[str]) -> None:
+        if uuids:
+            await self._client.delete(collection_name=self.collection_name, points_selector=PointIdsList(points=list(uuids)))
+
+
+    async def get_book_chunk_hashes(self, *, book_id: int) -> list[SearchChunk]:
+        chunks, offset = [], None
+        while True:
+            points, offset = await self._client.scroll(
+                                        collection_name=self.collection_name,
+                                        scroll_filter=Filter(must=[FieldCondition(key="book_id", match=MatchValue(value=book_id))]),
+                                        limit=500,
+                                        offset=offset,
+                                        with_payload=["uuid_str", "chunk_nr", "book_id", "content_hash"],
+                                        with_vectors=[""],      # only the dense vector
+                                    )
+            for p in points:
+                chunk = SearchChunk.from_payload(p.payload or {}, search_score=-1.0)
+                vec = p.vector.get("") if isinstance(p.vector, dict) else p.vector
+                chunk.vector = np.asarray(vec, dtype=np.float32)
+                chunks.append(chunk)
+            if offset is None:
+                return chunks
+
+
     async def delete_books(self, book_ids: set[int]) -> None:
         await self._client.delete(
             collection_name=self.collection_name,
@@ -351,6 +532,10 @@ class QdrantVectorStore(AsyncVectorStore):
         facet_vals = [str(hit.value) for hit in resp_hits]
         return facet_vals
 
+    async def get_all_book_ids(self) -> set[int]:
+        resp = await self._client.facet(collection_name=self.collection_name, key="book_id", limit=100_000)
+        return {int(hit.value) for hit in resp.hits}
+
 
 
 async def try_local() :
@@ -0,0 +1,67 @@
+import re
+from typing import Callable, Iterator, Sequence, TypeVar
+from models.vector_db_model import UploadChunk
+
+T = TypeVar("T")
+
+JSON_BYTES_PR_FLOAT = 25        # worst case float repr incl. comma, e.g. "-1.2345678901234567e-05,"
+CHUNK_OVERHEAD_BYTES = 352      # keys, braces, chunk_nr/book_id ints, the 64 char content_hash, "vector"/"payload" wrappers
+_JSON_ESCAPED_CHARS = re.compile(r'[\x00-\x1f"\\]')
+
+
+def _json_str_bytes_upper_bound(s:str) -> int:
+    """
+    Upper bound of a JSON encoded string in bytes, without encoding it as JSON.
+    Non-ascii chars are counted as a \\uXXXX surrogate pair (12 bytes) and escapable ascii chars as 6 bytes,
+    so the bound holds for both utf-8 and ascii-escaped serializers.
+    """
+    n_non_ascii = len(s.encode("utf-8")) - len(s)      # >= number of non-ascii chars
+    n_escapable = len(_JSON_ESCAPED_CHARS.findall(s))
+    return len(s) + 2 + 11 * n_non_ascii + 5 * n_escapable
+
+
+def estimate_chunk_json_bytes(chunk:UploadChunk) -> int:
+    """
+    Upper bound of an UploadChunk serialized as a JSON point/document (vector + payload fields).
+    Computed from vector dimension + string lengths, so the vector is never serialized just to size it.
+    """
+    vector_bytes = chunk.content_vector.dim.value * JSON_BYTES_PR_FLOAT
+    payload_bytes = (_json_str_bytes_upper_bound(chunk.content) 
+                     + _json_str_bytes_upper_bound(chunk.book_name) 
+                     + 2 * _json_str_bytes_upper_bound(chunk.uuid_str))       # id/key + uuid_str field
+    return CHUNK_OVERHEAD_BYTES + vector_bytes + payload_bytes
+
+
+def iter_batches_by_size(items:Sequence[T], *,
+                         estimate_bytes:Callable[[T], int],
+                         max_bytes:int,
+                         max_items:int|None=None) -> Iterator[list[T]]:
+    """
+    Greedily packs items into batches whose estimated JSON size stays under max_bytes,
+    and (if given) holds at most max_items items.
+    """
+    batch: list[T] = []
+    batch_bytes = 2  # approx overhead for "[]"
+
+    for item in items:
+        item_bytes = estimate_bytes(item)
+
+        # If a single item is too large, batching cannot fix it.
+        if item_bytes > max_bytes:
+            raise ValueError(
+                f"Single UploadChunk too large: ~{item_bytes / (1024*1024):.2f} MB. "
+                "Reduce chunk size or store `content` elsewhere (and keep only an id/snippet in the vector store)."
+            )
+
+        # Flush current batch if adding this item would exceed a limit.
+        batch_full = max_items is not None and len(batch) >= max_items
+        if batch and (batch_full or (batch_bytes + item_bytes) > max_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 2
+
+        batch.append(item)
+        batch_bytes += item_bytes + 1  # +1 for comma/overhead
+
+    if batch:
+        yield batch
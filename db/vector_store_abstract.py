@@ -1,4 +1,5 @@
 from __future__ import annotations
+import asyncio
 from abc import ABC, abstractmethod
 from pydantic import BaseModel 
 from typing import Sequence, Any
@@ -6,6 +7,20 @@ from models.vector_db_model import UploadChunk, SearchChunk, SearchPage, Embeddi
 from models.api_response_model import GBBookMeta
 # TODO: add paginated_search
 
+# Payload fields stored with every chunk, i.e. what can be requested via the `fields` projection
+PAYLOAD_FIELDS = ("uuid_str", "chunk_nr", "book_name", "book_id", "content")
+
+
+def validate_fields(fields:Sequence[str]|None) -> list[str]|None:
+    """Check a payload field projection. None means all fields."""
+    if fields is None:
+        return None
+    unknown = set(fields) - set(PAYLOAD_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown payload fields {sorted(unknown)}, choose from {PAYLOAD_FIELDS}")
+    return list(fields)
+
+
 class AsyncVectorStore(BaseModel, ABC):
     """Backend-agnostic vector db interface."""
 
@@ -19,6 +34,20 @@ class AsyncVectorStore(BaseModel, ABC):
         ...
 
 
+    @abstractmethod
+    async def delete_chunks(self, *, uuids:set[str]) -> None:
+        ...
+
+
+    @abstractmethod
+    async def get_book_chunk_hashes(self, *, book_id:int) -> list[SearchChunk]:
+        """
+        All chunks of a book with uuid_str, chunk_id, content_hash and the dense vector, without contents.
+        Used to diff a re-ingested book against what's stored, content_hash is None for chunks stored before it existed.
+        """
+        ...
+
+
     @abstractmethod
     async def get_missing_ids_in_store(self, *, book_ids:set[int]) -> set[int]:
         """Return a set of book_ids NOT present in the vector store from given param.
@@ -31,34 +60,73 @@ class AsyncVectorStore(BaseModel, ABC):
                                     embed_query_vector:EmbeddingVec,
                                     filter:dict[str,Any]|None=None,
                                     k: int = 10,
+                                    fields:list[str]|None=None,
+                                    with_vectors:bool=False,
                                 ) -> list[SearchChunk]:
         """
-        Returns a list of chunks.
+        Returns a list of chunks. 
+        `fields` limits the payload fields returned (see PAYLOAD_FIELDS), None returns all.
+        with_vectors=True also returns the stored dense vectors as SearchChunk.vector, e.g. for MMR.
+        """
+        ...
+
+
+    async def search_by_embeddings(self, *,
+                                   embed_query_vectors:list[EmbeddingVec],
+                                   filter:dict[str,Any]|None=None,
+                                   k: int = 10,
+                                   fields:list[str]|None=None,
+                                   with_vectors:bool=False,
+                                ) -> list[list[SearchChunk]]:
+        """
+        search_by_embedding for several query vectors, one result list pr. vector.
+        Runs the searches concurrently, stores with a batch search API override it with a single request.
+        """
+        return await asyncio.gather(*(self.search_by_embedding(embed_query_vector=v, filter=filter, k=k, 
+                                                               fields=fields, with_vectors=with_vectors)
+                                      for v in embed_query_vectors))
+
+
+    @abstractmethod
+    async def search_by_keywords(self, *, query:str, k:int=10, fields:list[str]|None=None) -> list[SearchChunk]:
+        """
+        Ranked keyword (BM25) search on the chunk contents, the sparse counterpart of search_by_embedding.
+        Returns at most k chunks, best match first.
         """
         ...
 
     
     @abstractmethod
-    async def get_paginated_chunks_by_book_ids(self, *, book_ids:set[int]) -> SearchPage:
+    async def get_paginated_chunks_by_book_ids(self, *, book_ids:set[int], fields:list[str]|None=None) -> SearchPage:
         """Return one SearchPage with chunks matching the book_ids given.
         
         """
         ...
     
     @abstractmethod
-    async def get_chunk_by_nr(self, *, chunk_nr:int, book_id:int) -> SearchPage:
+    async def get_chunk_by_nr(self, *, chunk_nr:int, book_id:int, fields:list[str]|None=None) -> SearchPage:
         ...
     
+    @abstractmethod
+    async def get_chunks_by_nrs(self, *, chunk_nrs_by_book:dict[int, set[int]], fields:list[str]|None=None) -> list[SearchChunk]:
+        """
+        Batched get_chunk_by_nr: all chunks with the given chunk_nrs pr. book_id, fetched in one request.
+        Chunk nrs that don't exist (e.g. past the end of the book) are left out. No particular order.
+        """
+        ...
+
     @abstractmethod
     async def get_chunk_count_in_book(self, *, book_id:int) -> int:
         ...
 
 
     @abstractmethod
-    async def paginated_search_by_text(self, *, text_query:str, limit:int, skip:int, continuation_token:str|None=None) -> SearchPage:
+    async def paginated_search_by_text(self, *, text_query:str, limit:int, skip:int, continuation_token:str|None=None,
+                                       fields:list[str]|None=None) -> SearchPage:
         """Return a list of chunks matching with the text_query argument
             If using Azure AI Search a continuation_token can be given,
             with Qdrant adjust the skip and top parameters 
+            `fields` limits the payload fields returned, None returns all.
         """
         ...
 
@@ -80,6 +148,11 @@ class AsyncVectorStore(BaseModel, ABC):
     async def get_all_unique_book_names(self) -> list[str]:
         ...
 
+    @abstractmethod
+    async def get_all_book_ids(self) -> set[int]:
+        """book_ids of all books with chunks in the store"""
+        ...
+
     # @abstractmethod
     # async def populate_small_collection(self) -> list[GBBookMeta]:
     #     """
@@ -1,5 +1,7 @@
 import backoff, asyncio
 import re, unicodedata, tiktoken
+import numpy as np
+from typing import Awaitable, Callable
 from openai import AzureOpenAI
 from openai._exceptions import RateLimitError
 from tiktoken import Encoding
@@ -10,17 +12,17 @@ from config.params import EmbeddingDimension
 from openai import RateLimitError
 from pyrate_limiter import Duration, Rate, Limiter, BucketFullException
 from openai import AsyncAzureOpenAI
+from embedding_providers import EmbeddingProvider, AzureOpenAIEmbeddings, _decode_embedding
+from rate_limit_buckets import budget_wait_secs
 
 
 @backoff.on_exception(wait_gen=backoff.expo, exception=RateLimitError, max_time=120, max_tries=6)
-async def _create_embeddings(*, embed_client:AsyncAzureOpenAI, 
+async def _create_embeddings(*, embed_client:AsyncAzureOpenAI|EmbeddingProvider, 
                                 model_deployed:str, 
                                 batches:list[str]) -> list[EmbeddingVec]:
-    resp = await embed_client.embeddings.create(
-                                            input=batches,
-                                            model=model_deployed,
-                                        )
-    return [EmbeddingVec(vector=emb_obj.embedding, dim=EmbeddingDimension.SMALL) for emb_obj in resp.data]
+    provider = embed_client if isinstance(embed_client, EmbeddingProvider) else AzureOpenAIEmbeddings(embed_client)
+    vectors = await provider.embed(batches, model=model_deployed)
+    return [EmbeddingVec(vector=v, dim=EmbeddingDimension(v.shape[0])) for v in vectors]
 
 
 def _count_tokens(text: str, enc:Encoding) -> int:
@@ -50,24 +52,30 @@ def batch_texts_by_tokens(*, texts: list[str],
     return batches
 
 async def _acquire_budget_async(*, tok_limiter:Limiter, req_limiter:Limiter, tokens_needed: int, identity: str = "embeddings"):
-    """Non-blocking: awaits until both token & request budgets allow the call."""
-    while True:
-        try:
-            await tok_limiter.try_acquire_async(f"{identity}_tpm", weight=tokens_needed)
-            await req_limiter.try_acquire_async(f"{identity}_rpm", weight=1)
-            return  # allowed
-        except BucketFullException as ex:
-            sleep_interval_secs = float(ex.rate.interval) / 1000        # precise wait suggested by the limiter
-            print(f"** Exceeding budget - async sleeping {sleep_interval_secs} secs")
-            await asyncio.sleep(sleep_interval_secs)
+    """Non-blocking: awaits until both token & request budgets allow the call. Each budget is reserved once,
+    so waiting for a request slot doesn't reserve the tokens again."""
+    for limiter, name, weight in [(tok_limiter, f"{identity}_tpm", tokens_needed), (req_limiter, f"{identity}_rpm", 1)]:
+        while True:
+            try:
+                await limiter.try_acquire_async(name, weight=weight)
+                break  # allowed
+            except BucketFullException as ex:
+                # weighted buckets know when the reservation fits, else wait out the whole rate interval
+                sleep_interval_secs = budget_wait_secs(limiter, default=float(ex.rate.interval) / 1000)
+                print(f"** Exceeding budget - async sleeping {sleep_interval_secs} secs")
+                await asyncio.sleep(sleep_interval_secs)
 
 
-async def create_embeddings_async(*, embed_client:AsyncAzureOpenAI, 
+async def create_embeddings_async(*, embed_client:AsyncAzureOpenAI|EmbeddingProvider, 
                                     model_deployed: str, 
                                     inp_batches: list[list[str]], 
                                     tok_limiter:Limiter, 
-                                    req_limiter:Limiter) -> list[EmbeddingVec]:
-    """Create async Azure embeddings with built-in rate limiting and graceful backoff."""
+                                    req_limiter:Limiter,
+                                    on_batch:Callable[[list[str], list[EmbeddingVec]], Awaitable[None]]|None=None) -> list[EmbeddingVec]:
+    """
+    Create async Azure embeddings with built-in rate limiting and graceful backoff.
+    await on_batch(texts, embeddings) is called after each batch, e.g. to checkpoint them before a later batch fails.
+    """
     all_embeddings = []
     enc_ = tiktoken.get_encoding("cl100k_base")
 
@@ -85,5 +93,7 @@ async def create_embeddings_async(*, embed_client:AsyncAzureOpenAI,
                                   batches=batch)
         
         all_embeddings.extend(embs)
+        if on_batch is not None:
+            await on_batch(batch, embs)
         
     return all_embeddings
@@ -0,0 +1,80 @@
+import asyncio, base64, hashlib, random, re
+from abc import ABC, abstractmethod
+from typing import Any
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class EmbeddingProvider(ABC):
+    """Backend behind create_embeddings_async / RateLimitedAzureEmbedding: one request embeds a batch of texts."""
+
+    @abstractmethod
+    async def embed(self, texts:list[str], *, model:str) -> list[np.ndarray]:
+        """One float32 vector pr. text"""
+        ...
+
+    def model_key(self, model:str) -> str:
+        """Key of the vectors in the embedding store/checkpoint, so vectors of different backends never mix"""
+        return model
+
+
+class AzureOpenAIEmbeddings(EmbeddingProvider):
+    """Any client with the (Async)AzureOpenAI `embeddings.create` API."""
+    def __init__(self, client:Any):
+        self.client = client
+
+    async def embed(self, texts:list[str], *, model:str) -> list[np.ndarray]:
+        # Explicit base64 -> the SDK hands back the raw string instead of decoding it into python floats
+        resp = await self.client.embeddings.create(input=texts, model=model, encoding_format="base64")
+        return [_decode_embedding(d.embedding) for d in resp.data]
+
+
+def _decode_embedding(data:str|list[float]) -> np.ndarray:
+    """Base64 payloads are raw little-endian float32, so they map straight onto an array without a list[float] detour."""
+    if isinstance(data, str):
+        return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+    return np.asarray(data, dtype=np.float32)
+
+
+class HashingEmbeddings(EmbeddingProvider):
+    """
+    Offline, deterministic embeddings for benchmarks/CI: signed feature hashing of word 1..max_ngram-grams
+    and char trigrams into `dim` buckets, L2 normalized. Texts sharing words get similar vectors, so retrieval
+    behaves sensibly, but the quality is of course not comparable to a real embedding model.
+    latency_secs (+ uniform 0..jitter_secs) is slept pr. request to simulate the API round trip.
+    """
+    def __init__(self, *, dim:int=1536, max_ngram:int=2, latency_secs:float=0.0, jitter_secs:float=0.0, seed:int=0):
+        self.dim = dim
+        self.max_ngram = max_ngram
+        self.latency_secs = latency_secs
+        self.jitter_secs = jitter_secs
+        self.n_requests = 0
+        self.n_texts = 0
+        self._rng = random.Random(seed)
+
+    def model_key(self, model:str) -> str:
+        return f"hashing-v1:{self.dim}:{self.max_ngram}"        # never the Azure deployment name
+
+    def embed_text(self, text:str) -> np.ndarray:
+        words = _WORD_RE.findall(text.lower())
+        feats = [" ".join(words[i:i + n]) for n in range(1, self.max_ngram + 1) for i in range(len(words) - n + 1)]
+        feats += [f"#{w}#"[i:i + 3] for w in words for i in range(len(w))]
+
+        vec = np.zeros(self.dim, dtype=np.float32)
+        if feats:
+            hashes = np.array([int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little") for f in feats],
+                              dtype=np.uint64)
+            signs = np.where(hashes >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+            np.add.at(vec, (hashes % np.uint64(self.dim)).astype(np.int64), signs)
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            vec[0], norm = 1.0, 1.0         # empty text, still a unit vector
+        return vec / norm
+
+    async def embed(self, texts:list[str], *, model:str) -> list[np.ndarray]:
+        self.n_requests += 1
+        self.n_texts += len(texts)
+        if self.latency_secs or self.jitter_secs:
+            await asyncio.sleep(self.latency_secs + self._rng.uniform(0, self.jitter_secs))
+        return [self.embed_text(t) for t in texts]
@@ -0,0 +1,203 @@
+import gzip, hashlib, io, os, sqlite3, threading, time, zlib
+from pathlib import Path
+from typing import Iterator
+from models.api_response_model import GBBookMeta
+from models.local_gb_book_model import GBBookMetaLocal
+
+MANIFEST_NAME = "manifest.sqlite"
+READ_BLOCK_CHARS = 1 << 16
+
+
+class BookCacheCorruptError(ValueError):
+    pass
+
+
+class BookCacheWriter:
+    """Streams a book into the cache: gzip + sha256 are computed incrementally, the object is only visible after commit()."""
+    def __init__(self, cache:"BookCache", gb_meta:GBBookMeta):
+        self._cache = cache
+        self._gb_meta = gb_meta
+        self._sha = hashlib.sha256()
+        self._raw_bytes = 0
+        self._tmp_p = cache.root / "objects" / f"incoming.{os.getpid()}.{threading.get_ident()}.{gb_meta.id}.tmp"
+        self._tmp_p.parent.mkdir(parents=True, exist_ok=True)
+        self._gz = gzip.open(self._tmp_p, "wb", compresslevel=6)
+
+    def write(self, text:str) -> None:
+        data = text.encode("utf-8")
+        self._sha.update(data)
+        self._raw_bytes += len(data)
+        self._gz.write(data)
+
+    def commit(self) -> str:
+        self._gz.close()
+        return self._cache._add_object(self._gb_meta, self._tmp_p, self._sha.hexdigest(), self._raw_bytes)
+
+    def abort(self) -> None:
+        self._gz.close()
+        self._tmp_p.unlink(missing_ok=True)
+
+
+class BookCache:
+    """
+    Local cache of downloaded book texts, so ingestion doesn't download a book twice.
+        - manifest.sqlite: gb_id -> content sha256, sizes, fetch/access time + the GBBookMeta json, one indexed lookup pr. book
+        - objects/<sha[:2]>/<sha>.txt.gz: gzipped content, content addressed (identical texts are stored once), written atomically
+    When the stored (compressed) bytes exceed max_bytes, the least recently used books are evicted.
+    Books cached by the old layout (<slug>_<gb_id>.json + .txt in the same folder) are imported once when the manifest is created.
+    """
+    def __init__(self, root:Path, max_bytes:int=2_000_000_000):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        is_new = not (self.root / MANIFEST_NAME).exists()
+        self._conn = sqlite3.connect(self.root / MANIFEST_NAME, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS books (gb_id INTEGER PRIMARY KEY, sha256 TEXT NOT NULL,
+                                  raw_bytes INTEGER NOT NULL, stored_bytes INTEGER NOT NULL,
+                                  fetched_at REAL NOT NULL, last_access REAL NOT NULL, meta_json TEXT NOT NULL)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_books_last_access ON books (last_access)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_books_sha256 ON books (sha256)")
+        if is_new:
+            self._import_legacy_files()
+
+    def _object_path(self, sha:str) -> Path:
+        return self.root / "objects" / sha[:2] / f"{sha}.txt.gz"
+
+    @property
+    def total_bytes(self) -> int:
+        """Stored (compressed) bytes of the distinct objects"""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(stored_bytes), 0) FROM (SELECT DISTINCT sha256, stored_bytes FROM books)").fetchone()[0]
+
+    def __contains__(self, gb_id:int) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM books WHERE gb_id = ?", (gb_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM books").fetchone()[0]
+
+    def get(self, gb_id:int) -> tuple[str, GBBookMeta]|None:
+        """(content, meta) of a cached book, None if not cached (or its object is missing/corrupt)"""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256, meta_json FROM books WHERE gb_id = ?", (gb_id,)).fetchone()
+        if row is None:
+            return None
+        sha, meta_json = row
+
+        try:
+            raw = gzip.decompress(self._object_path(sha).read_bytes())
+        except (OSError, EOFError) as exc:
+            print(f"Book cache: dropping {gb_id}, unreadable object: {exc}")
+            self.delete(gb_id)
+            return None
+        if hashlib.sha256(raw).hexdigest() != sha:
+            print(f"Book cache: dropping {gb_id}, content hash mismatch")
+            self.delete(gb_id)
+            return None
+
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE books SET last_access = ? WHERE gb_id = ?", (time.time(), gb_id))
+        return raw.decode("utf-8"), GBBookMeta.model_validate_json(meta_json)
+
+    def open_text(self, gb_id:int) -> tuple[Iterator[str], GBBookMeta]|None:
+        """
+        Like get(), but the content is streamed in text blocks, never held as one string.
+        The sha256 is checked at the end, raises BookCacheCorruptError (and drops the book) on a mismatch.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT sha256, meta_json FROM books WHERE gb_id = ?", (gb_id,)).fetchone()
+        if row is None or not self._object_path(row[0]).exists():
+            return None
+        sha, meta_json = row
+
+        def _blocks() -> Iterator[str]:
+            hasher = hashlib.sha256()
+            try:
+                with gzip.open(self._object_path(sha), "rb") as gz:
+                    text_f = io.TextIOWrapper(gz, encoding="utf-8", newline="")
+                    while block := text_f.read(READ_BLOCK_CHARS):
+                        hasher.update(block.encode("utf-8"))
+                        yield block
+            except (OSError, EOFError, zlib.error, UnicodeDecodeError) as exc:
+                self.delete(gb_id)
+                raise BookCacheCorruptError(f"Book {gb_id} unreadable in cache: {exc}") from exc
+            if hasher.hexdigest() != sha:
+                self.delete(gb_id)
+                raise BookCacheCorruptError(f"Book {gb_id} content hash mismatch in cache")
+            
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE books SET last_access = ? WHERE gb_id = ?", (time.time(), gb_id))
+
+        return _blocks(), GBBookMeta.model_validate_json(meta_json)
+
+    def writer(self, gb_meta:GBBookMeta) -> BookCacheWriter:
+        return BookCacheWriter(self, gb_meta)
+
+    def put(self, gb_meta:GBBookMeta, content:str) -> str:
+        """Cache a book, replacing an older version. Returns: the content sha256"""
+        w = self.writer(gb_meta)
+        w.write(content)
+        return w.commit()
+
+    def _add_object(self, gb_meta:GBBookMeta, tmp_p:Path, sha:str, raw_bytes:int) -> str:
+        obj_p = self._object_path(sha)
+        if obj_p.exists():
+            tmp_p.unlink()
+        else:
+            obj_p.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_p, obj_p)
+
+        now = time.time()
+        meta = GBBookMeta(**gb_meta.model_dump())           # without e.g. the local path of GBBookMetaLocal
+        with self._lock, self._conn:
+            old = self._conn.execute("SELECT sha256 FROM books WHERE gb_id = ?", (gb_meta.id,)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO books VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (gb_meta.id, sha, raw_bytes, obj_p.stat().st_size, now, now, meta.model_dump_json()))
+            if old and old[0] != sha:
+                self._delete_object_if_unused(old[0])
+        self._evict(keep_gb_id=gb_meta.id)
+        return sha
+
+    def delete(self, gb_id:int) -> None:
+        with self._lock, self._conn:
+            row = self._conn.execute("DELETE FROM books WHERE gb_id = ? RETURNING sha256", (gb_id,)).fetchone()
+            if row:
+                self._delete_object_if_unused(row[0])
+
+    def _delete_object_if_unused(self, sha:str) -> None:
+        """Call with the lock held"""
+        if self._conn.execute("SELECT 1 FROM books WHERE sha256 = ?", (sha,)).fetchone() is None:
+            self._object_path(sha).unlink(missing_ok=True)
+
+    def _evict(self, keep_gb_id:int) -> None:
+        """Delete least recently used books until the cache fits max_bytes"""
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        with self._lock:
+            lru_rows = self._conn.execute("SELECT gb_id, sha256, stored_bytes FROM books WHERE gb_id != ? ORDER BY last_access",
+                                          (keep_gb_id,)).fetchall()
+        for gb_id, sha, stored_bytes in lru_rows:
+            if total <= self.max_bytes:
+                break
+            with self._lock:
+                shared = self._conn.execute("SELECT count(*) FROM books WHERE sha256 = ?", (sha,)).fetchone()[0] > 1
+            self.delete(gb_id)
+            total -= 0 if shared else stored_bytes
+
+    def _import_legacy_files(self) -> None:
+        for json_p in self.root.glob("*.json"):
+            try:
+                meta = GBBookMetaLocal.model_validate_json(json_p.read_text(encoding="utf-8"))
+                content = Path(meta.path_to_content).read_text(encoding="utf-8")
+            except Exception as exc:
+                print(f"Book cache: skipping legacy file {json_p.name}: {exc}")
+                continue
+            self.put(meta, content)
+
+    def close(self) -> None:
+        self._conn.close()
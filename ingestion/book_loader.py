@@ -6,8 +6,12 @@ from pathlib import Path
 from sqlalchemy.ext.asyncio import AsyncSession
 from tqdm import tqdm
 from db.database import DbSessionFactory, get_async_db_sess, open_session
-from db.operations import insert_missing_book_db
+from db.operations import insert_missing_books_db
 from models.api_response_model import GBBookMeta
+from models.vector_db_model import IngestDiffReport
+from ingestion.gutendex_client import GutendexClient
+from ingestion.book_cache import BookCache, BookCacheCorruptError
+from ingestion.preprocess_book import GutenbergTextCleaner, iter_book_paragraphs
 from models.local_gb_book_model import GBBookMetaLocal
 from vector_store_utils import async_upload_book_to_index
 
@@ -15,7 +19,6 @@ from stats import make_collection_fingerprint
 from converters import gbbookmeta_to_db_obj
 from models.schema import DBBookChunkStats, DBBookMetaData
 from config.settings import Settings
-from ingestion.preprocess_book import make_slug_book_key
 
 # TODO: make async
 async def _fetch_book_content(*, download_url) -> str:
@@ -23,8 +26,12 @@ async def _fetch_book_content(*, download_url) -> str:
     resp.raise_for_status()
     return resp.text
 
-async def fetch_book_content_from_id(*, gutenberg_id:int) -> tuple[str, GBBookMeta]:
-    gb_meta = await _fetch_gutendex_meta_from_id(gb_id=gutenberg_id)
+async def fetch_book_content_from_id(*, gutenberg_id:int, gutendex:GutendexClient|None=None) -> tuple[str, GBBookMeta]:
+    """gutendex: shared client (local catalogue first, cached), else a one-off Gutendex request"""
+    if gutendex is not None:
+        gb_meta = await gutendex.get_book(gutenberg_id, with_summaries=True)
+    else:
+        gb_meta = await _fetch_gutendex_meta_from_id(gb_id=gutenberg_id)
     url = gb_meta.get_new_txt_url(gutenberg_id) #gb_meta.get_txt_url()
 
     if not url:
@@ -33,80 +40,119 @@ async def fetch_book_content_from_id(*, gutenberg_id:int) -> tuple[str, GBBookMe
     content = await _fetch_book_content(download_url=url)
     return content, gb_meta    
 
+async def stream_book_paragraphs(*, url:str, gb_meta:GBBookMeta, book_cache:BookCache, gutendex:GutendexClient) -> list[str]:
+    """
+    Download a book's text in blocks: each block is written to the cache (gzip + hash on the fly) and fed to the
+    incremental header/footer cleaner, so the raw book is never held in memory. Returns: paragraphs of the book body
+    """
+    writer = book_cache.writer(gb_meta)
+    cleaner = GutenbergTextCleaner()
+    paragraphs: list[str] = []
+    try:
+        async with gutendex.stream(url) as resp:
+            resp.raise_for_status()
+            async for block in resp.aiter_text():
+                writer.write(block)
+                paragraphs.extend(cleaner.feed(block))
+        paragraphs.extend(cleaner.close())
+    except BaseException:
+        writer.abort()
+        raise
+    await asyncio.to_thread(writer.commit)
+    return paragraphs
+
+
+async def _load_book_paragraphs(*, b_id:int, sett:Settings) -> tuple[list[str], GBBookMeta, str]:
+    """Cleaned paragraphs of a book from the local cache, else streamed from Gutenberg into the cache"""
+    book_cache = sett.get_book_cache()
+    cached = await asyncio.to_thread(book_cache.open_text, b_id)
+    if cached is not None:
+        blocks, gb_meta = cached
+        gutendex = sett.get_gutendex_client()
+        if not gb_meta.summaries and gutendex.catalog is not None and gutendex.catalog.get_book(b_id) is not None:
+            # cached with the catalogue's metadata, local lookup with the summaries once fetched (in the background)
+            gb_meta = await gutendex.get_book(b_id, with_summaries=True)
+        try:
+            paragraphs = await asyncio.to_thread(lambda: list(iter_book_paragraphs(blocks)))
+            return paragraphs, gb_meta, f"\n Is test? {sett.is_test} -- Loaded content from cache for book id {b_id}"
+        except BookCacheCorruptError as exc:
+            print(f"{exc} - fetching it again")
+
+    gutendex = sett.get_gutendex_client()
+    gb_meta = await gutendex.get_book(b_id, with_summaries=True)
+    paragraphs = await stream_book_paragraphs(url=gb_meta.get_new_txt_url(b_id), gb_meta=gb_meta,
+                                              book_cache=book_cache, gutendex=gutendex)
+    print(f"Book {b_id} not found in cache - fetched from Gutenberg and cached")
+    return paragraphs, gb_meta, " Wrote book to cache."
+
+
 def _load_gb_meta_local(*, path: Path) -> GBBookMetaLocal:
     json_text = Path(path).read_text(encoding="utf-8")
     return GBBookMetaLocal.model_validate_json(json_text)
 
 
-def get_cached_paths_by_book_id(*, book_id:int, folder_p:Path) -> list[Path]:
-    lst = [file for file in folder_p.iterdir() if file.is_file() and str(book_id) == file.stem.split('_')[-1] and file.suffix == '.json']
-    return lst
-
-
-def _write_to_files(book_content:str, gb_meta:GBBookMeta) -> Path:
-    loc_gb_p = Path("evals", "books", f"{make_slug_book_key(title=gb_meta.title, gutenberg_id=gb_meta.id, author=gb_meta.authors_as_str())}.txt")
-    loc_gb_p.parent.mkdir(parents=True, exist_ok=True)
-    
-    loc_gb_meta = GBBookMetaLocal(**gb_meta.model_dump(), path_to_content=loc_gb_p)
-    gb_json = loc_gb_meta.model_dump_json(indent=4)
-
-    assert len(gb_json) > 0
-
-    try:
-        with open(loc_gb_p, "w", encoding="utf-8") as f:
-            f.write(book_content)
-        
-        with open(loc_gb_p.with_suffix(".json"), "w", encoding='utf-8') as f:
-            f.write(gb_json)
-    except Exception as ex:
-        print(f"!! DEBUG TRACE local_book_content_p:{str(loc_gb_p)}")
-        print(f"local_gb_p {loc_gb_p}")
-
-    return loc_gb_p
-
-
 #TODO - make unit test
 async def upload_missing_book_ids(*, book_ids:set[int], 
                                   sett:Settings, 
                                   db_factory: DbSessionFactory,
-                                  time_started:str
+                                  time_started:str,
+                                  diff_existing:bool=False,
                                 ) -> tuple[list[GBBookMeta], str, list[DBBookChunkStats]]:
-    """Upload and book ids to vector index and insert into book meta DB if missing"""
+    """
+    Upload and book ids to vector index and insert into book meta DB if missing.
+    diff_existing: also re-ingest books already in the index (e.g. after changing hyperparams), diffing their chunks
+    by content hash so only new/changed chunks are embedded + upserted and stale ones deleted.
+    """
     vector_store = await sett.get_vector_store()
     missing_book_ids = await vector_store.get_missing_ids_in_store( book_ids=book_ids)
+    # started but not finished last time: some points may be in the store, but the book is incomplete
+    missing_book_ids |= book_ids & await asyncio.to_thread(sett.get_ingest_checkpoint().unfinished_book_ids)
+    diff_report = IngestDiffReport() if diff_existing else None
+    if diff_existing:
+        missing_book_ids = set(book_ids)
 
     gb_books = []
-    req_lim, token_lim = sett.get_limiters()
     print(f'--- Missing book ids: {missing_book_ids}')
     mess = ""
-    cache_p = Path("evals", "books")
-    cache_p.mkdir(parents=True, exist_ok=True)
 
     book_stats = []
+    db_books: list[DBBookMetaData] = []
+    try:
+        mess += await _upload_books(missing_book_ids=missing_book_ids, sett=sett, time_started=time_started,
+                                    gb_books=gb_books, book_stats=book_stats, db_books=db_books, diff_report=diff_report)
+        if diff_report is not None:
+            mess += f"\n{diff_report.summary()}"
+    finally:
+        # one bulk insert + commit for the batch, also for the books uploaded before a failing one
+        if db_books:
+            async with open_session(db_factory) as db_sess:
+                _, mess_ = await insert_missing_books_db(books=db_books, db_sess=db_sess)
+            mess += mess_
+
+    return gb_books, mess, book_stats
+
+
+async def _upload_books(*, missing_book_ids:set[int],
+                        sett:Settings,
+                        time_started:str,
+                        gb_books:list[GBBookMeta],
+                        book_stats:list[DBBookChunkStats],
+                        db_books:list[DBBookMetaData],
+                        diff_report:IngestDiffReport|None=None,
+                        ) -> str:
+    """Upload the books to the vector index, appending to the given lists as each book is done."""
+    vector_store = await sett.get_vector_store()
+    req_lim, token_lim = sett.get_limiters()
+    mess = ""
 
     for b_id in tqdm(missing_book_ids): 
-        eval_book_paths = get_cached_paths_by_book_id(book_id=b_id, folder_p=cache_p)
-        
-        if len(eval_book_paths) == 0:
-            book_content, gb_meta = await fetch_book_content_from_id(gutenberg_id=b_id)
-            assert len(book_content) > 0
-
-            local_gb_p = _write_to_files(book_content=book_content, gb_meta=gb_meta)
-            mess += " Wrote book to cache."
-            print(f"GB meta obj not found in cache - fetching from Gutendex. Wrote content + gb obj to: {local_gb_p.name}")
-        else:
-            gb_meta = _load_gb_meta_local(path=eval_book_paths[0])
-            gb_meta.path_to_content.parent.mkdir(parents=True, exist_ok=True)
-            
-            try:
-                with open(gb_meta.path_to_content, "r", encoding="utf-8") as f:
-                    book_content = f.read()
-                
-                book_content = book_content[:2000] if sett.is_test else book_content
-                mess += f"\n Is test? {sett.is_test} -- Loaded content from cache for book id {b_id}"
-                print(mess) 
-            except Exception as exc:
-                print(f"EXC: tried {str(gb_meta.path_to_content)} {exc}")
+        paragraphs, gb_meta, mess_ = await _load_book_paragraphs(b_id=b_id, sett=sett)
+        mess += mess_
+        print(mess_)
+
+        book_content = "\n\n".join(paragraphs)
+        del paragraphs
+        book_content = book_content[:2000] if sett.is_test else book_content
                 
         print(f"*** Uploading Book id {b_id} to index")
 
@@ -115,6 +161,8 @@ async def upload_missing_book_ids(*, book_ids:set[int],
                                                                     token_limiter=token_lim,
                                                                     request_limiter=req_lim,
                                                                     raw_book_content=book_content,
+                                                                    is_cleaned=True,
+                                                                    diff_report=diff_report,
                                                                     book_meta=gb_meta,
                                                                     sett=sett,
                                                                     time_started=time_started
@@ -123,15 +171,11 @@ async def upload_missing_book_ids(*, book_ids:set[int],
         
         db_book = gbbookmeta_to_db_obj(gbm=gb_meta)
         db_book.chunk_stats = db_b_stats
-        async with open_session(db_factory) as db_sess:
-            is_inserted, mess_ = await insert_missing_book_db(book_meta=db_book, 
-                                                                db_sess=db_sess)
-        mess += mess_
+        db_books.append(db_book)
 
         gb_books.append(gb_meta)
 
- 
-    return gb_books, mess, book_stats
+    return mess
 
 
 async def _fetch_gutendex_meta_from_id(*, gb_id:int) -> GBBookMeta:
@@ -0,0 +1,71 @@
+import sqlite3, threading, time, uuid
+from pathlib import Path
+import numpy as np
+from config.params import EmbeddingDimension
+from models.vector_db_model import EmbeddingVec, content_sha256
+
+# Fixed namespace, so the same chunk gets the same point id on every run/machine
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c2a0e-8d4b-5b7e-9a53-2f0d1c9e4b71")
+MAX_SQL_VARS = 900
+
+
+def chunk_point_id(*, book_id:int, config_id:int, chunk_nr:int, content:str) -> str:
+    """Deterministic uuid5 point id: re-uploading a chunk overwrites its point instead of adding an orphan"""
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{book_id}:{config_id}:{chunk_nr}:{content_sha256(content)}"))
+
+
+class IngestCheckpoint:
+    """
+    Persisted progress of book ingestion in a SQLite file:
+        - embeddings: every embedded text of a book (splitter sentences, chunks, summary) keyed by model + text sha256,
+          written after each embedding batch, so a failed upload is resumed without paying for those again
+        - books: books started but not finished, which must be retried even if some of their points reached the vector store
+    A book's rows are dropped once it is fully uploaded.
+    """
+    def __init__(self, path:Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (book_id INTEGER NOT NULL, model TEXT NOT NULL,
+                                  text_sha TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (book_id, model, text_sha))""")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS books (book_id INTEGER PRIMARY KEY, config_id INTEGER NOT NULL, started_at REAL NOT NULL)")
+
+    def start_book(self, book_id:int, config_id:int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO books VALUES (?, ?, ?)", (book_id, config_id, time.time()))
+
+    def finish_book(self, book_id:int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM books WHERE book_id = ?", (book_id,))
+            self._conn.execute("DELETE FROM embeddings WHERE book_id = ?", (book_id,))
+
+    def unfinished_book_ids(self) -> set[int]:
+        with self._lock:
+            return {r[0] for r in self._conn.execute("SELECT book_id FROM books")}
+
+    def get_embeddings(self, book_id:int, model:str, texts:list[str]) -> list[EmbeddingVec|None]:
+        shas = [content_sha256(t) for t in texts]
+        unique_shas = list(set(shas))
+        rows: dict[str, bytes] = {}
+        with self._lock:
+            for i in range(0, len(unique_shas), MAX_SQL_VARS):
+                part = unique_shas[i:i + MAX_SQL_VARS]
+                rows.update(self._conn.execute(f"""SELECT text_sha, vector FROM embeddings WHERE book_id = ? AND model = ?
+                                                   AND text_sha IN ({",".join("?" * len(part))})""", (book_id, model, *part)).fetchall())
+
+        vecs = []
+        for sha in shas:
+            blob = rows.get(sha)
+            arr = np.frombuffer(blob, dtype=np.float32) if blob is not None else None
+            vecs.append(EmbeddingVec(vector=arr, dim=EmbeddingDimension(arr.shape[0])) if arr is not None else None)
+        return vecs
+
+    def put_embeddings(self, book_id:int, model:str, texts:list[str], vecs:list[EmbeddingVec]) -> None:
+        rows = [(book_id, model, content_sha256(t), v.vector.astype(np.float32, copy=False).tobytes()) for t, v in zip(texts, vecs)]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,64 @@
+import sqlite3, threading
+from pathlib import Path
+import numpy as np
+from config.params import EmbeddingDimension
+from models.vector_db_model import EmbeddingVec, content_sha256
+
+MAX_SQL_VARS = 900
+
+
+class EmbeddingStore:
+    """
+    Local content addressed store of embeddings, keyed by (model, dim, sha256(text)), shared by all collections/configs,
+    so building a new collection variant over the same books mostly hits the store instead of the embedding API.
+    Vectors are stored as float16 blobs by default (half the size, cosine similarities change by ~1e-4), read back as float32.
+    SQLite in WAL mode, so several ingestion processes can share the file.
+    """
+    def __init__(self, path:Path, dtype:str="float16"):
+        self.path = Path(path)
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (model TEXT NOT NULL, dim INTEGER NOT NULL, text_sha TEXT NOT NULL,
+                                  dtype TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, dim, text_sha)) WITHOUT ROWID""")
+
+    def get_many(self, model:str, dim:int, texts:list[str]) -> list[EmbeddingVec|None]:
+        """Stored embeddings in the order of texts, None for the ones not stored"""
+        shas = [content_sha256(t) for t in texts]
+        unique_shas = list(set(shas))
+        rows: dict[str, tuple[str, bytes]] = {}
+        with self._lock:
+            for i in range(0, len(unique_shas), MAX_SQL_VARS):
+                part = unique_shas[i:i + MAX_SQL_VARS]
+                for sha, dtype, blob in self._conn.execute(f"""SELECT text_sha, dtype, vector FROM embeddings WHERE model = ? AND dim = ?
+                                                               AND text_sha IN ({",".join("?" * len(part))})""", (model, dim, *part)):
+                    rows[sha] = (dtype, blob)
+
+        vecs: list[EmbeddingVec|None] = []
+        for sha in shas:
+            if sha in rows:
+                dtype, blob = rows[sha]
+                vecs.append(EmbeddingVec(vector=np.frombuffer(blob, dtype=dtype).astype(np.float32), dim=EmbeddingDimension(dim)))
+            else:
+                vecs.append(None)
+        self.hits += len(shas) - vecs.count(None)
+        self.misses += vecs.count(None)
+        return vecs
+
+    def put_many(self, model:str, texts:list[str], vecs:list[EmbeddingVec]) -> None:
+        rows = [(model, v.vector.shape[0], content_sha256(t), self.dtype.name, v.vector.astype(self.dtype).tobytes())
+                for t, v in zip(texts, vecs)]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
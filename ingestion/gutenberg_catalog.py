@@ -0,0 +1,172 @@
+"""
+Local mirror of the Project Gutenberg catalogue, imported from the offline CSV feed
+(https://www.gutenberg.org/cache/epub/feeds/pg_catalog.csv.gz, updated daily), so book metadata lookups
+need no network. The books are stored as GBBookMeta json in a SQLite file keyed by Gutenberg id.
+The CSV has no summaries or download counts, GutendexClient fetches those in the background when a book is
+ingested/shown and stores them in the file's summaries table, which survives re-imports.
+
+    python -m ingestion.gutenberg_catalog --download --db gutenberg_catalog.sqlite
+    python -m ingestion.gutenberg_catalog --csv pg_catalog.csv --db gutenberg_catalog.sqlite
+"""
+import argparse, csv, gzip, json, os, re, sqlite3, threading
+from pathlib import Path
+from typing import Iterator
+import httpx
+from models.api_response_model import GBBookMeta
+
+PG_CATALOG_CSV_URL = "https://www.gutenberg.org/cache/epub/feeds/pg_catalog.csv.gz"
+GUTENDEX_PAGE_SIZE = 32
+_SUMMARIES_DDL = "CREATE TABLE IF NOT EXISTS summaries (gb_id INTEGER PRIMARY KEY, summaries_json TEXT NOT NULL, download_count INTEGER NOT NULL)"
+
+_YEARS_RE = re.compile(r"^(?P<name>.*?),\s*(?P<birth>\d{1,4})?\??\s*(?:BCE?)?\s*-\s*(?P<death>\d{1,4})?\??\s*(?:BCE?)?$")
+_ROLE_RE = re.compile(r"\s*\[(?P<role>[^\]]+)\]$")
+
+
+def _parse_person(entry:str) -> tuple[dict, str|None]:
+    """'Shelley, Mary Wollstonecraft, 1797-1851 [Editor]' -> ({name, birth_year, death_year} like Gutendex, 'Editor')"""
+    role = None
+    if m := _ROLE_RE.search(entry):
+        role, entry = m.group("role"), entry[:m.start()]
+    person = {"name": entry.strip(), "birth_year": None, "death_year": None}
+    if m := _YEARS_RE.match(entry.strip()):
+        person = {"name": m.group("name").strip(),
+                  "birth_year": int(m.group("birth")) if m.group("birth") else None,
+                  "death_year": int(m.group("death")) if m.group("death") else None}
+    return person, role
+
+
+def _split(field:str) -> list[str]:
+    return [v.strip() for v in field.split(";") if v.strip()]
+
+
+def catalog_row_to_gbbookmeta(row:dict[str, str]) -> GBBookMeta:
+    """A pg_catalog.csv row as the GBBookMeta Gutendex would return. The CSV has no summaries or download counts."""
+    gb_id = int(row["Text#"])
+    authors, editors = [], []
+    for entry in _split(row.get("Authors", "")):
+        person, role = _parse_person(entry)
+        if role is None:
+            authors.append(person)
+        elif role == "Editor":
+            editors.append(person)
+
+    return GBBookMeta(id=gb_id,
+                      title=" ".join(row["Title"].split()),          # titles can contain newlines
+                      summaries=[],
+                      subjects=_split(row.get("Subjects", "")),
+                      languages=_split(row.get("Language", "")),
+                      authors=authors,
+                      editors=editors,
+                      download_count=0,
+                      formats={"text/plain; charset=us-ascii": f"https://www.gutenberg.org/ebooks/{gb_id}.txt.utf-8",
+                               "text/html": f"https://www.gutenberg.org/ebooks/{gb_id}.html.images"},
+                      copyright=False)
+
+
+def _iter_catalog_rows(csv_path:Path) -> Iterator[dict[str, str]]:
+    opener = gzip.open if csv_path.suffix == ".gz" else open
+    with opener(csv_path, "rt", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def import_pg_catalog_csv(csv_path:Path, db_path:Path) -> int:
+    """
+    (Re-)build the catalogue file from pg_catalog.csv(.gz), text books only (no audio books etc.).
+    Written to a temp file and swapped in atomically, so readers never see a half import.
+    Summaries fetched into the old file are carried over.
+    Returns: number of books imported
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_p = db_path.with_suffix(".tmp")
+    tmp_p.unlink(missing_ok=True)
+
+    conn = sqlite3.connect(tmp_p)
+    try:
+        conn.execute("CREATE TABLE books (gb_id INTEGER PRIMARY KEY, meta_json TEXT NOT NULL)")
+        conn.execute(_SUMMARIES_DDL)
+        if db_path.exists():
+            conn.execute("ATTACH DATABASE ? AS old", (str(db_path),))
+            if conn.execute("SELECT 1 FROM old.sqlite_master WHERE name = 'summaries'").fetchone():
+                with conn:
+                    conn.execute("INSERT INTO summaries SELECT * FROM old.summaries")
+            conn.execute("DETACH DATABASE old")
+        rows = ((int(r["Text#"]), catalog_row_to_gbbookmeta(r).model_dump_json())
+                for r in _iter_catalog_rows(csv_path) if r.get("Type", "Text") == "Text")
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO books VALUES (?, ?)", rows)
+        n_books = conn.execute("SELECT count(*) FROM books").fetchone()[0]
+    finally:
+        conn.close()
+
+    os.replace(tmp_p, db_path)
+    return n_books
+
+
+def download_pg_catalog(dest:Path, url:str=PG_CATALOG_CSV_URL) -> Path:
+    """Stream the gzipped catalogue CSV (~15 MB) to dest."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with httpx.stream("GET", url, follow_redirects=True, timeout=60) as resp:
+        resp.raise_for_status()
+        with open(dest, "wb") as f:
+            for block in resp.iter_bytes():
+                f.write(block)
+    return dest
+
+
+class GutenbergCatalog:
+    """
+    Lookups in the catalogue file, primary key lookups take a few µs so they're done synchronously.
+    Books are returned with their summaries/download count if set_summaries() has stored them.
+    """
+    def __init__(self, db_path:Path):
+        self.db_path = Path(db_path)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(_SUMMARIES_DDL)          # files imported before the summaries table
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _to_meta(meta_json:str, summaries_json:str|None, download_count:int|None) -> GBBookMeta:
+        meta = GBBookMeta.model_validate_json(meta_json)
+        if summaries_json is not None:
+            meta = meta.model_copy(update={"summaries": json.loads(summaries_json), "download_count": download_count})
+        return meta
+
+    def get_book(self, gb_id:int) -> GBBookMeta|None:
+        with self._lock:
+            row = self._conn.execute("SELECT meta_json, summaries_json, download_count FROM books LEFT JOIN summaries USING (gb_id) "
+                                     "WHERE gb_id = ?", (gb_id,)).fetchone()
+        return self._to_meta(*row) if row else None
+
+    def set_summaries(self, book:GBBookMeta) -> None:
+        """Store the summaries + download count of a book, e.g. fetched from Gutendex"""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?)",
+                               (book.id, json.dumps(book.summaries), book.download_count))
+
+    def get_page(self, page_number:int, page_size:int=GUTENDEX_PAGE_SIZE) -> list[GBBookMeta]:
+        """Pages start at 1 like Gutendex's, ordered by Gutenberg id (the CSV has no download counts to sort by)."""
+        if page_number < 1:
+            return []
+        with self._lock:
+            rows = self._conn.execute("SELECT meta_json, summaries_json, download_count FROM books LEFT JOIN summaries USING (gb_id) "
+                                      "ORDER BY gb_id LIMIT ? OFFSET ?", (page_size, (page_number - 1) * page_size)).fetchall()
+        return [self._to_meta(*r) for r in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM books").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", type=Path, default=Path("pg_catalog.csv.gz"), help="pg_catalog.csv or .csv.gz")
+    parser.add_argument("--db", type=Path, default=Path("gutenberg_catalog.sqlite"))
+    parser.add_argument("--download", action="store_true", help=f"Download the CSV from {PG_CATALOG_CSV_URL} first")
+    args = parser.parse_args()
+
+    if args.download:
+        download_pg_catalog(args.csv)
+    print(f"Imported {import_pg_catalog_csv(args.csv, args.db)} books into {args.db}")
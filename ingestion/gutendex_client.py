@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+import httpx
+from models.api_response_model import GBBookMeta
+from ingestion.gutenberg_catalog import GutenbergCatalog
+
+GUTENDEX_URL = "https://gutendex.com"
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire after ttl_secs."""
+    def __init__(self, ttl_secs:float, max_entries:int):
+        self.ttl_secs = ttl_secs
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key:Any) -> Any|None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key:Any, value:Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_secs, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class GutendexClient:
+    """
+    Async Gutendex client sharing one pooled httpx connection pool (keep-alive, timeouts).
+    Book metadata and result pages are cached for ttl_secs. The books of a fetched page are cached by id too,
+    and concurrent requests for the same uncached url share one fetch.
+    With a local catalogue (see gutenberg_catalog.py) books are looked up there first, only missing ones
+    (e.g. added after the catalogue import) go over the network, and catalogue pages are served locally.
+    Summaries missing from the catalogue are fetched in the background and stored back in it.
+    Raises httpx.HTTPStatusError for non 2xx responses, httpx.TransportError on network errors/timeouts.
+    """
+    def __init__(self, *, base_url:str=GUTENDEX_URL,
+                 ttl_secs:float=3600,
+                 max_entries:int=4096,
+                 timeout_secs:float=10,
+                 max_connections:int=20,
+                 transport:httpx.AsyncBaseTransport|None=None,
+                 catalog:GutenbergCatalog|None=None,
+                 ):
+        self.catalog = catalog
+        self._client = httpx.AsyncClient(base_url=base_url,
+                                         timeout=httpx.Timeout(timeout_secs, connect=5),
+                                         limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                                         follow_redirects=True,
+                                         transport=transport)
+        self._cache = TTLCache(ttl_secs=ttl_secs, max_entries=max_entries)
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._summary_tasks: dict[int, asyncio.Task] = {}
+
+    async def _get_json(self, path:str) -> Any:
+        # The fetch runs in its own task that every caller awaits through shield, so a cancelled caller
+        # (e.g. a client disconnect) doesn't cancel the fetch for the others waiting on the same url
+        task = self._inflight.get(path)
+        if task is None:
+            task = asyncio.create_task(self._fetch_json(path))
+            self._inflight[path] = task
+            task.add_done_callback(lambda t: self._fetch_done(path, t))
+        return await asyncio.shield(task)
+
+    async def _fetch_json(self, path:str) -> Any:
+        resp = await self._client.get(path)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _fetch_done(self, path:str, task:asyncio.Task) -> None:
+        if self._inflight.get(path) is task:
+            del self._inflight[path]
+        if not task.cancelled():
+            task.exception()        # mark as retrieved when every caller was cancelled
+
+    async def get_book(self, gb_id:int, *, with_summaries:bool=False) -> GBBookMeta:
+        """
+        with_summaries: the catalogue has no summaries (or download counts) until they've been fetched once, so a
+        catalogue hit without them starts a background fetch from Gutendex that stores them in the catalogue.
+        The lookup itself stays local, i.e. the first ingestion/detail lookup of a book may be without its summary.
+        """
+        local = self.catalog.get_book(gb_id) if self.catalog is not None else None
+        if local is not None:
+            if with_summaries and not local.summaries:
+                self._fetch_summaries_in_background(gb_id)
+            return local
+        
+        book = self._cache.get(("book", gb_id))
+        if book is None:
+            book = GBBookMeta(**await self._get_json(f"/books/{gb_id}/"))
+            self._cache.set(("book", gb_id), book)
+        return book
+
+    def _fetch_summaries_in_background(self, gb_id:int) -> None:
+        if gb_id in self._summary_tasks or self._cache.get(("no_summaries", gb_id)):
+            return
+        task = asyncio.create_task(self._store_summaries(gb_id))
+        self._summary_tasks[gb_id] = task
+        task.add_done_callback(lambda t: self._summary_tasks.pop(gb_id, None))
+
+    async def _store_summaries(self, gb_id:int) -> None:
+        try:
+            book = GBBookMeta(**await self._get_json(f"/books/{gb_id}/"))
+        except httpx.HTTPError as exc:
+            self._cache.set(("no_summaries", gb_id), True)          # don't retry on every lookup while Gutendex is down
+            logger.warning("Gutendex failed for book %s, its summaries stay missing from the catalogue: %r", gb_id, exc)
+            return
+        await asyncio.to_thread(self.catalog.set_summaries, book)        # type:ignore
+
+    async def get_page(self, page_number:int) -> list[GBBookMeta]:
+        """A page of the Gutendex catalogue, Gutendex has a fixed page size of 32 books."""
+        if self.catalog is not None:
+            return self.catalog.get_page(page_number)
+        
+        books = self._cache.get(("page", page_number))
+        if books is None:
+            body = await self._get_json(f"/books/?page={page_number}")
+            books = [GBBookMeta(**b) for b in body["results"]]
+            self._cache.set(("page", page_number), books)
+            for b in books:
+                self._cache.set(("book", b.id), b)
+        return books
+
+    def stream(self, url:str):
+        """Streaming GET on the pooled connections, e.g. for book texts. Absolute urls don't use base_url. Use as: async with client.stream(url) as resp"""
+        return self._client.stream("GET", url)
+
+    async def aclose(self) -> None:
+        for task in list(self._summary_tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._summary_tasks.values(), return_exceptions=True)
+        await self._client.aclose()
+        if self.catalog is not None:
+            self.catalog.close()
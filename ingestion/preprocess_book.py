@@ -1,11 +1,76 @@
 from pathlib import Path
+from typing import Iterable, Iterator
 import unicodedata, re
 
-def clean_headers(*, raw_book: str) -> str:
-    start_match = re.search(pattern=r'\*\*\*\s?START OF TH(IS|E) PROJECT GUTENBERG EBOOK', string=raw_book)
-    end_match = re.search(pattern=r'\*\*\* end of the project gutenberg ebook', string=raw_book.lower())
+_START_RE = re.compile(r'^[ \t]*\*\*\*\s?START OF TH(IS|E) PROJECT GUTENBERG E-?BOOK.*\n?', re.IGNORECASE | re.MULTILINE)
+_END_RE = re.compile(r'^[ \t]*\*\*\*\s?END OF TH(IS|E) PROJECT GUTENBERG E-?BOOK', re.IGNORECASE | re.MULTILINE)
+_PARA_BREAK_RE = re.compile(r'\n[ \t]*\n\s*')
+
+
+class GutenbergTextCleaner:
+    """
+    Incremental version of clean_headers: feed() the book text in blocks of any size (e.g. as it's downloaded)
+    and get the paragraphs between the START/END marker lines back as soon as they're complete.
+    Blocks are cut at their last newline and the markers are searched for in whole lines, so the raw book
+    (or a lowercased copy of it) is never held in memory and markers split across blocks are still found.
+    Only the partial last line and the current paragraph are buffered.
+    Text after START without an END marker is kept; nothing is yielded if there's no START marker.
+    """
+    def __init__(self):
+        self.state = "header"           # header -> body -> footer
+        self._partial_line = ""
+        self._para = ""
+
+    def feed(self, block:str) -> Iterator[str]:
+        text = self._partial_line + block
+        cut = text.rfind("\n") + 1
+        self._partial_line = text[cut:]
+        if cut:
+            yield from self._on_lines(text[:cut])
+
+    def close(self) -> Iterator[str]:
+        if self._partial_line:
+            yield from self._on_lines(self._partial_line + "\n")
+            self._partial_line = ""
+        if self.state != "header":
+            yield from self._paragraphs(final=True)
+
+    def _on_lines(self, lines:str) -> Iterator[str]:
+        if self.state == "footer":
+            return
+        lines = lines.replace("\r\n", "\n")
+        if self.state == "header":
+            start_match = _START_RE.search(lines)
+            if start_match is None:
+                return
+            self.state = "body"
+            lines = lines[start_match.end():]
 
-    return raw_book[start_match.end():end_match.start()] if start_match and end_match else ""
+        end_match = _END_RE.search(lines)
+        if end_match:
+            self.state = "footer"
+            lines = lines[:end_match.start()]
+        self._para += lines
+        yield from self._paragraphs(final=self.state == "footer")
+
+    def _paragraphs(self, final:bool) -> Iterator[str]:
+        pieces = _PARA_BREAK_RE.split(self._para)
+        self._para = "" if final else pieces.pop()
+        for p in pieces:
+            if p.strip():
+                yield p.strip()         # also the indentation the break regex only eats if the next line is already buffered
+
+
+def iter_book_paragraphs(blocks:Iterable[str]) -> Iterator[str]:
+    cleaner = GutenbergTextCleaner()
+    for block in blocks:
+        yield from cleaner.feed(block)
+    yield from cleaner.close()
+
+
+def clean_headers(*, raw_book: str) -> str:
+    """The book text between the Gutenberg START/END markers, paragraphs separated by a blank line"""
+    return "\n\n".join(iter_book_paragraphs([raw_book]))
 
 
 
@@ -1,7 +1,7 @@
 from contextlib import asynccontextmanager
 from datetime import datetime
 from prometheus_client import Histogram
-import uvicorn, requests
+import asyncio, uvicorn, httpx
 from fastapi import Body, FastAPI, APIRouter, Depends, HTTPException, Query, Path, status
 from openai import AsyncAzureOpenAI
 from typing import Annotated
@@ -10,7 +10,8 @@ import psycopg2
 from app_factory import create_app
 from evals.timer_helper import Timer
 from db.database import DbSessionFactory, engine, Base, get_async_db_sess, get_db_session_factory
-from db.vector_store_abstract import AsyncVectorStore
+from db.book_search import create_book_search_indexes
+from db.vector_store_abstract import AsyncVectorStore, PAYLOAD_FIELDS
 from sqlalchemy.ext.asyncio import AsyncSession
 from db.operations import select_all_books_db, select_books_by_id_db, delete_book_db,  select_books_like_db, select_documents_paginated_db, BookNotFoundException
 
@@ -29,9 +30,11 @@ async def lifespan(app: FastAPI):
     print("Running startup, creating tables...")
     async with engine.begin() as conn:      # startup
         await conn.run_sync(Base.metadata.create_all)
+        await create_book_search_indexes(conn)
 
     yield  # now app starts serving
 
+    await get_settings().close_gutendex_client()
     await engine.dispose()  # shutdown
 
 
@@ -70,15 +73,17 @@ def ask():
 async def search_books(db:Annotated[AsyncSession, Depends(get_async_db_sess)], 
                        title: Annotated[str|None, Query(min_length=3, max_length=100)] = None, 
                        authors: Annotated[str|None, Query(min_length=3, max_length=100)] = None, 
-                       lang:Annotated[str|None, Query(min_length=2, max_length=2, examples=["en", "da", "nl"])] = None ):
+                       lang:Annotated[str|None, Query(min_length=2, max_length=2, examples=["en", "da", "nl"])] = None,
+                       skip:Annotated[int, Query(description="Number of matching books to skip", ge=0)] = 0,
+                       take:Annotated[int, Query(description="Number of matching books to take after skipping", ge=1, le=100)] = 50):
     
     if not any([title, authors, lang]):
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail="Provide at least one filter parameter.")
     
-    db_books = await select_books_like_db(title=title, authors=authors, db_sess=db)
+    db_books, total = await select_books_like_db(title=title, authors=authors, lang=lang, skip=skip, take=take, db_sess=db)
     book_meta_objs = [db_obj_to_response(b) for b in db_books]
 
-    return BookMetaApiResponse(data=book_meta_objs)
+    return BookMetaApiResponse(data=book_meta_objs, total=total)
 
 
 @prefix_router.get("/books/{book_id}", response_model=BookMetaApiResponse, status_code=status.HTTP_200_OK)
@@ -114,9 +119,13 @@ async def get_books_paginated(db:Annotated[AsyncSession, Depends(get_async_db_se
 @prefix_router.get("/index/{gutenberg_id}", response_model=SearchApiResponse, status_code=status.HTTP_200_OK)
 async def get_book_from_index(gutenberg_id:Annotated[int, Path(description="Gutenberg ID to delete", gt=0)],
                                 settings:Annotated[Settings, Depends(get_settings)],
+                                fields:Annotated[list[str]|None, Query(description=f"Payload fields to return, any of {PAYLOAD_FIELDS}. All if omitted")] = None,
                                 ):
     vec_store = await settings.get_vector_store()
-    book_search_page = await vec_store.get_paginated_chunks_by_book_ids(book_ids=set([gutenberg_id]))
+    try:
+        book_search_page = await vec_store.get_paginated_chunks_by_book_ids(book_ids=set([gutenberg_id]), fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
 
     return SearchApiResponse(data=[book_search_page])
 
@@ -130,12 +139,17 @@ async def search_index_by_texts(skip:Annotated[int, Query(description="Number of
                                 take:Annotated[int, Query(description="Number of search result documents to take after skipping", le=100, ge=1)],
                                 settings:Annotated[Settings, Depends(get_settings)],
                                 query:Annotated[str, Query(description="The search query")] = "", 
+                                fields:Annotated[list[str]|None, Query(description=f"Payload fields to return, any of {PAYLOAD_FIELDS}. All if omitted")] = None,
                                 ):
     vec_store = await settings.get_vector_store()
-    page = await vec_store.paginated_search_by_text(text_query=query, 
-                                                        skip=skip, 
-                                                        limit=take, 
-                                                    ) 
+    try:
+        page = await vec_store.paginated_search_by_text(text_query=query, 
+                                                            skip=skip, 
+                                                            limit=take, 
+                                                            fields=fields,
+                                                        ) 
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
     return SearchApiResponse(data=[page])
 
 #TODO: post book to vector db by using Gutendex ID
@@ -143,7 +157,8 @@ async def search_index_by_texts(skip:Annotated[int, Query(description="Number of
 @prefix_router.post("/index", status_code=status.HTTP_201_CREATED, response_model=GBMetaApiResponse)
 async def upload_book_to_index(gutenberg_ids:Annotated[list[int], Body(description="Unique Gutenberg IDs to upload", min_length=1, max_length=30)],
                                 db_factory: Annotated[DbSessionFactory, Depends(get_db_session_factory)],
-                                settings:Annotated[Settings, Depends(get_settings)]):
+                                settings:Annotated[Settings, Depends(get_settings)],
+                                reingest_changed:Annotated[bool, Query(description="Also re-ingest books already indexed, only re-embedding new/changed chunks")]=False):
     info = ""
 
     if len(gutenberg_ids) != len(set(gutenberg_ids)):
@@ -156,7 +171,8 @@ async def upload_book_to_index(gutenberg_ids:Annotated[list[int], Body(descripti
     gb_books_uploaded, info, book_stats = await upload_missing_book_ids(book_ids=set(gutenberg_ids), 
                                                                         sett=settings, 
                                                                         db_factory=db_factory,
-                                                                        time_started=now
+                                                                        time_started=now,
+                                                                        diff_existing=reingest_changed,
                                                                     )
 
     if len(gb_books_uploaded) == 0:
@@ -178,6 +194,8 @@ async def delete_book_from_index(gutenberg_id:Annotated[int, Path(description="G
     err_mess_not_found = ""
     if not missing_ids or len(missing_ids) == 0:
         await vec_store.delete_books(book_ids=set([gutenberg_id]))
+        await asyncio.to_thread(settings.get_bm25_index().delete_books, {gutenberg_id})       # both save to disk
+        await asyncio.to_thread(settings.get_book_router().delete_books, {gutenberg_id})
     else:
         err_mess_not_found =f"No items in vector found with book_id {gutenberg_id}"
 
@@ -192,35 +210,32 @@ async def delete_book_from_index(gutenberg_id:Annotated[int, Path(description="G
     
 
 @prefix_router.get("/books/gutenberg/{gutenberg_id}", status_code=status.HTTP_200_OK, response_model=GBMetaApiResponse)
-async def show_gutenberg_book(gutenberg_id:Annotated[int, Path(description="Gutenberg ID of book", gt=0)]):
+async def show_gutenberg_book(gutenberg_id:Annotated[int, Path(description="Gutenberg ID of book", gt=0)],
+                              settings:Annotated[Settings, Depends(get_settings)]):
     try:
-        res = requests.get(f"https://gutendex.com/books/{gutenberg_id}")
-    except Exception as exc:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=exc)
+        gb_meta = await settings.get_gutendex_client().get_book(gutenberg_id, with_summaries=True)
+    except httpx.HTTPStatusError as exc:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=exc.response.text)
+    except httpx.TransportError as exc:
+        raise HTTPException(status.HTTP_504_GATEWAY_TIMEOUT, detail=f"Gutendex unreachable: {exc!r}")
     
-    if res.status_code != status.HTTP_200_OK:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=res.json())
-    else:
-        body = res.json()
-        return GBMetaApiResponse(data=[GBBookMeta(**body)])
+    return GBMetaApiResponse(data=[gb_meta])
 
 
 @prefix_router.get("/books/gutenberg/paginated/", status_code=status.HTTP_200_OK, response_model=list[GBBookMeta])
 async def show_gutenberg_books_paginated(page_number:Annotated[int, Query(description="Page number to read from", ge=0)],
+                                         settings:Annotated[Settings, Depends(get_settings)],
                                          number_of_books:Annotated[int, Query(description="Number of books to show", ge=1, le=32)]=32
                                         ):
+    # Gutendex pages are always 32 books, the page is fetched once and cached, so other slices of it are free
     try:
-        res = requests.get(f"https://gutendex.com/books?page={page_number}")
-    except Exception as exc:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=exc)
+        gb_books = await settings.get_gutendex_client().get_page(page_number)
+    except httpx.HTTPStatusError as exc:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=exc.response.text)
+    except httpx.TransportError as exc:
+        raise HTTPException(status.HTTP_504_GATEWAY_TIMEOUT, detail=f"Gutendex unreachable: {exc!r}")
 
-    if res.status_code != status.HTTP_200_OK:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=res.json())
-    else:
-        body = res.json()["results"]
-        print(body)
-        gb_books = [GBBookMeta(**book_dict) for book_dict in body]
-        return gb_books[:number_of_books]
+    return gb_books[:number_of_books]
 
 # TODO: have default call to initialize db with e.g. 50 books (and use Celery for long time async job)
         # e.g. populate index
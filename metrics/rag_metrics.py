@@ -1,4 +1,4 @@
-from prometheus_client import Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 rag_stage_seconds = Histogram(
     "rag_stage_seconds",
@@ -6,3 +6,21 @@ rag_stage_seconds = Histogram(
     labelnames=("stage",),
     buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.35, 0.5, 0.75, 1, 1.5, 2, 3, 5, 8, 13, 21)      # after 21 the buckets scale upwards
 )
+
+rag_prompt_tokens = Histogram(
+    "rag_prompt_tokens",
+    "Input tokens of the answer generation prompt pr. request",
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 32000)
+)
+
+rate_limit_budget_remaining = Gauge(
+    "rate_limit_budget_remaining",
+    "Azure OpenAI budget left in the current window after the last reservation (tokens or requests), shared across workers with the sqlite/redis backends",
+    labelnames=("budget",)
+)
+
+rate_limit_rejections = Counter(
+    "rate_limit_rejections",
+    "Reservations rejected because the budget was used up, pr. process",
+    labelnames=("budget",)
+)
@@ -68,4 +68,5 @@ class QueryResponseApiResponse(ApiResponse):
     data: QueryResponse
 
 class BookMetaApiResponse(ApiResponse):
-    data:list[BookMetaDataResponse]
\ No newline at end of file
+    data:list[BookMetaDataResponse]
+    total:int|None = Field(default=None, description="Total number of matches, for paginated results")
\ No newline at end of file
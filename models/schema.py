@@ -1,4 +1,5 @@
 from db.database import Base
+from db.book_search import register_search_ddl
 from sqlalchemy import ARRAY, JSON, Column, Integer, String, Float, ForeignKey, TIMESTAMP
 from sqlalchemy.sql import func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -12,6 +13,7 @@ class DBBookMetaData(Base):
     authors:Mapped[str] = mapped_column(String, nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     summary:Mapped[str] = mapped_column(String, nullable=False)
+    languages:Mapped[str] = mapped_column(String, nullable=False, default="", server_default="")      # ISO codes separated by ;
 
     # one-to-one relationship
     chunk_stats: Mapped["DBBookChunkStats"] = relationship(
@@ -20,6 +22,9 @@ class DBBookMetaData(Base):
                                                     cascade="all, delete-orphan",
                                                 )
 
+register_search_ddl(DBBookMetaData.__table__)     # type:ignore
+
+
 class DBBookChunkStats(Base):
     __tablename__ = "book_chunk_stats"
     id:Mapped[int] = mapped_column(Integer,primary_key=True,nullable=False, autoincrement=True)
@@ -1,19 +1,43 @@
-from pydantic import BaseModel, Field, model_validator
+import hashlib
+import numpy as np
+from typing import Annotated, Any
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, PlainSerializer, model_validator
 from config.params import EmbeddingDimension
 
+
+def _as_float32_array(v) -> np.ndarray:
+    # One vectorised copy instead of validating every float, no copy if already float32
+    return np.asarray(v, dtype=np.float32)
+
+# Array-backed vector, only turned into list[float] at the client boundary (Qdrant/Azure/JSON)
+Float32Vector = Annotated[np.ndarray,
+                          BeforeValidator(_as_float32_array),
+                          PlainSerializer(lambda v: v.tolist(), return_type=list[float], when_used="json")]
+
+
 class EmbeddingVec(BaseModel):
-    vector: list[float] = Field(..., description="The embedding vector")
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector: Float32Vector = Field(..., description="The embedding vector as float32 array")
     dim: EmbeddingDimension = Field(..., description="Dimension of the embedding vector")
 
     @model_validator(mode="after")      # Run after field validators
     def validate_vector_dimension(self):
         expected_dim = self.dim.value        
 
-        if len(self.vector) != expected_dim:
-            raise ValueError(f"Vector dimension {len(self.vector)} does not match specified dimension {expected_dim}")
+        if self.vector.ndim != 1 or self.vector.shape[0] != expected_dim:
+            raise ValueError(f"Vector dimension {self.vector.shape} does not match specified dimension {expected_dim}")
         
         return self
 
+    def to_list(self) -> list[float]:
+        """Plain list[float] for clients that need JSON-serializable vectors."""
+        return self.vector.tolist()
+
+
+def content_sha256(text:str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 
 class UploadChunk(BaseModel):
     uuid_str:str = Field(...)
@@ -25,13 +49,20 @@ class UploadChunk(BaseModel):
     char_count:int
     content_vector:EmbeddingVec
 
+    @property
+    def content_hash(self) -> str:
+        """Stored in the payload, re-ingestion compares it to skip re-embedding unchanged chunks"""
+        return content_sha256(self.content)
+
     def to_dict(self) -> dict[str, int|str|list[float]]:
-        embed_vec = self.content_vector.vector
+        embed_vec = self.content_vector.to_list()
         return self.__dict__ | { "content_vector": embed_vec }
 
 
 # Uses optional since user search request can toggle fields on/off
 class SearchChunk(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     uuid_str: str|None = None
     chunk_id: int|None = Field(default=None,  description="Nth chunk of all chunks")
     book_name: str|None = None
@@ -41,7 +72,33 @@ class SearchChunk(BaseModel):
     char_count:int|None = None
     rank:int|None = Field(default=None, description="Rank recieved from the LLM re-ranker after initial vector search")
     rank_reason:str|None = None
+    content_hash:str|None = Field(default=None, description="sha256 of the content, None for chunks uploaded before it was stored")
     search_score: float
+    vector: Float32Vector|None = Field(default=None, exclude=True, description="Dense vector, only set when searched with_vectors")
+
+    @classmethod
+    def from_payload(cls, payload:dict[str, Any], search_score:float) -> "SearchChunk":
+        """From a vector store payload/document, where the chunk number is stored as `chunk_nr`."""
+        return cls(search_score=search_score, chunk_id=payload.get("chunk_nr"), **payload)
+
+
+class IngestDiffReport(BaseModel):
+    """Work saved by diffing re-ingested books against the chunks already in the vector store"""
+    books: int = 0
+    chunks_total: int = 0
+    chunks_unchanged: int = Field(default=0, description="Same id (book, config, chunk nr, content), not uploaded again")
+    chunks_reused: int = Field(default=0, description="Content already in the store, e.g. under another chunk nr: stored vector reused")
+    chunks_embedded: int = 0
+    chunks_deleted: int = 0
+    tokens_saved: int = 0
+
+    @property
+    def embeddings_saved(self) -> int:
+        return self.chunks_unchanged + self.chunks_reused
+
+    def summary(self) -> str:
+        return (f"Diffed {self.books} books: {self.chunks_total} chunks, {self.chunks_embedded} embedded, "
+                f"{self.embeddings_saved} embeddings ({self.tokens_saved} tokens) saved, {self.chunks_deleted} stale chunks deleted")
 
 
 class SearchPage(BaseModel):
@@ -0,0 +1,248 @@
+import asyncio, sqlite3, threading, uuid
+from abc import abstractmethod
+from pathlib import Path
+from typing import Any, Literal
+from pyrate_limiter import AbstractBucket, BucketAsyncWrapper, Limiter, Rate, RateItem
+from metrics.rag_metrics import rate_limit_budget_remaining, rate_limit_rejections
+
+RateLimitBackend = Literal["memory", "sqlite", "redis"]
+
+
+class WeightedBucket(AbstractBucket):
+    """
+    pyrate bucket storing one entry pr. reservation with its weight. pyrate's own buckets store `weight` copies of
+    the item, i.e. up to 501k list items / rows a minute for the embedding token budget.
+    After each put the remaining budget is exported as a gauge, and on a rejection retry_after_ms says when enough of
+    the window has expired for the rejected weight to fit (instead of sleeping a whole rate interval).
+    """
+    def __init__(self, rates:list[Rate], *, budget:str):
+        self.rates = sorted(rates, key=lambda r: r.interval)
+        self.budget = budget
+        self.failing_rate: Rate|None = None
+        self.retry_after_ms = 0
+
+    @abstractmethod
+    def _reserve(self, item:RateItem) -> bool:
+        """Atomically (across processes for the shared backends): load the reservations of the longest window,
+        call self._admit() on them and store the item's reservation if admitted."""
+        ...
+
+    @abstractmethod
+    def _entries(self) -> list[tuple[int, int]]:
+        """All stored (timestamp, weight) reservations, oldest first"""
+        ...
+
+    def _admit(self, entries:list[tuple[int, int]], item:RateItem) -> bool:
+        used = [sum(w for ts, w in entries if ts > item.timestamp - rate.interval) for rate in self.rates]
+        self.failing_rate, self.retry_after_ms = None, 0
+        for rate, u in zip(self.rates, used):
+            if u + item.weight > rate.limit:
+                self.failing_rate = rate
+                self.retry_after_ms = self._wait_ms(entries, item, rate, excess=u + item.weight - rate.limit)
+                break
+
+        admitted = self.failing_rate is None
+        if not admitted:
+            rate_limit_rejections.labels(budget=self.budget).inc()
+        rate_limit_budget_remaining.labels(budget=self.budget).set(
+            min(rate.limit - u - (item.weight if admitted else 0) for rate, u in zip(self.rates, used)))
+        return admitted
+
+    @staticmethod
+    def _wait_ms(entries:list[tuple[int, int]], item:RateItem, rate:Rate, excess:int) -> int:
+        """ms until the oldest reservations in the window holding `excess` weight have expired"""
+        if item.weight > rate.limit:
+            return -1           # never fits
+        freed = 0
+        for ts, w in sorted(entries):
+            if ts <= item.timestamp - rate.interval:
+                continue
+            freed += w
+            if freed >= excess:
+                return max(1, ts + rate.interval - item.timestamp)
+        return 1
+
+    def put(self, item:RateItem) -> bool:
+        return item.weight == 0 or self._reserve(item)
+
+    def waiting(self, item:RateItem) -> int:
+        return self.retry_after_ms if self.failing_rate is not None else 0
+
+    def count(self) -> int:
+        return sum(w for _, w in self._entries())
+
+    def peek(self, index:int) -> RateItem|None:
+        entries = self._entries()
+        if index >= len(entries):
+            return None
+        ts, w = entries[-1 - index]
+        return RateItem(self.budget, ts, w)
+
+
+class InMemoryWeightedBucket(WeightedBucket):
+    """Single process"""
+    def __init__(self, rates:list[Rate], *, budget:str):
+        super().__init__(rates, budget=budget)
+        self._items: list[tuple[int, int]] = []
+        self._lock = threading.Lock()
+
+    def _reserve(self, item:RateItem) -> bool:
+        with self._lock:
+            if not self._admit(self._items, item):
+                return False
+            self._items.append((item.timestamp, item.weight))
+            return True
+
+    def _entries(self) -> list[tuple[int, int]]:
+        return list(self._items)
+
+    def leak(self, current_timestamp:int|None=None) -> int:
+        assert current_timestamp is not None
+        with self._lock:
+            keep = [e for e in self._items if e[0] > current_timestamp - self.rates[-1].interval]
+            n_removed, self._items = len(self._items) - len(keep), keep
+        return n_removed
+
+    def flush(self) -> None:
+        with self._lock:
+            self._items.clear()
+        self.failing_rate = None
+
+
+class SQLiteWeightedBucket(WeightedBucket):
+    """
+    Shared by all processes using the same file, e.g. uvicorn workers on one host. BEGIN IMMEDIATE takes SQLite's
+    write lock before reading the window, so check + insert is atomic across processes without a separate file lock.
+    """
+    def __init__(self, rates:list[Rate], *, budget:str, path:Path):
+        super().__init__(rates, budget=budget)
+        self.table = f"budget_{budget}"
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" (ts INTEGER NOT NULL, weight INTEGER NOT NULL)')
+        self.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{self.table}_ts" ON "{self.table}" (ts)')
+
+    def _reserve(self, item:RateItem) -> bool:
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                entries = self.conn.execute(f'SELECT ts, weight FROM "{self.table}" WHERE ts > ?',
+                                            (item.timestamp - self.rates[-1].interval,)).fetchall()
+                admitted = self._admit(entries, item)
+                if admitted:
+                    self.conn.execute(f'INSERT INTO "{self.table}" (ts, weight) VALUES (?, ?)', (item.timestamp, item.weight))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return admitted
+
+    def _entries(self) -> list[tuple[int, int]]:
+        with self._lock:
+            return self.conn.execute(f'SELECT ts, weight FROM "{self.table}" ORDER BY ts').fetchall()
+
+    def leak(self, current_timestamp:int|None=None) -> int:
+        assert current_timestamp is not None
+        with self._lock:
+            return self.conn.execute(f'DELETE FROM "{self.table}" WHERE ts <= ?',
+                                     (current_timestamp - self.rates[-1].interval,)).rowcount
+
+    def flush(self) -> None:
+        with self._lock:
+            self.conn.execute(f'DELETE FROM "{self.table}"')
+        self.failing_rate = None
+
+
+class RedisWeightedBucket(WeightedBucket):
+    """
+    Shared by all replicas using the same Redis (redis-py or fakeredis client). A sorted set of reservations scored
+    by timestamp, updated in an optimistic WATCH/MULTI transaction (no Lua, so fakeredis works without lupa).
+    Timestamps come from each process' clock, so replicas on different hosts need synced clocks.
+    """
+    def __init__(self, rates:list[Rate], *, budget:str, redis:Any):
+        super().__init__(rates, budget=budget)
+        self.redis = redis
+        self.key = f"rate_budget:{budget}"
+
+    @staticmethod
+    def _parse(members:list[tuple[bytes|str, float]]) -> list[tuple[int, int]]:
+        # member = "<uuid>:<weight>", so equal timestamps/weights don't collapse into one entry
+        return [(int(score), int((m.decode() if isinstance(m, bytes) else m).rsplit(":", 1)[1])) for m, score in members]
+
+    def _reserve(self, item:RateItem) -> bool:
+        from redis.exceptions import WatchError
+        window_start = item.timestamp - self.rates[-1].interval
+
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.key)
+                    entries = self._parse(pipe.zrangebyscore(self.key, f"({window_start}", "+inf", withscores=True))
+                    if not self._admit(entries, item):
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.zremrangebyscore(self.key, "-inf", window_start)
+                    pipe.zadd(self.key, {f"{uuid.uuid4().hex}:{item.weight}": item.timestamp})
+                    pipe.pexpire(self.key, self.rates[-1].interval)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    continue            # another process reserved in between, re-check the window
+
+    def _entries(self) -> list[tuple[int, int]]:
+        return self._parse(self.redis.zrange(self.key, 0, -1, withscores=True))
+
+    def leak(self, current_timestamp:int|None=None) -> int:
+        assert current_timestamp is not None
+        return self.redis.zremrangebyscore(self.key, "-inf", current_timestamp - self.rates[-1].interval)
+
+    def flush(self) -> None:
+        self.redis.delete(self.key)
+        self.failing_rate = None
+
+
+class ThreadedBucketWrapper(BucketAsyncWrapper):
+    """
+    Async wrapper running the shared buckets' blocking calls in a worker thread, so the event loop keeps serving:
+    SQLite's BEGIN IMMEDIATE can wait up to the 30 s busy timeout under cross-worker contention, and Redis'
+    WATCH/MULTI makes several round trips pr. reservation.
+    """
+    async def put(self, item:RateItem) -> bool:
+        return await asyncio.to_thread(self.bucket.put, item)
+
+    async def leak(self, current_timestamp:int|None=None) -> int:
+        return await asyncio.to_thread(self.bucket.leak, current_timestamp)
+
+    async def count(self) -> int:
+        return await asyncio.to_thread(self.bucket.count)
+
+
+def create_budget_limiter(rate:Rate, *, budget:str, backend:RateLimitBackend="memory",
+                          sqlite_path:Path|None=None, redis_url:str|None=None) -> Limiter:
+    """Async limiter over a weighted bucket. Must be called with a running event loop (pyrate schedules the leak task)."""
+    if backend == "memory":
+        return Limiter(BucketAsyncWrapper(InMemoryWeightedBucket([rate], budget=budget)))      # never blocks
+
+    if backend == "sqlite":
+        assert sqlite_path is not None, "The sqlite rate limit backend needs a path"
+        bucket: WeightedBucket = SQLiteWeightedBucket([rate], budget=budget, path=sqlite_path)
+    elif backend == "redis":
+        import redis            # optional, only needed for this backend
+        assert redis_url is not None, "The redis rate limit backend needs a url"
+        bucket = RedisWeightedBucket([rate], budget=budget, redis=redis.Redis.from_url(redis_url))
+    else:
+        raise ValueError(f"Unknown rate limit backend {backend}")
+    return Limiter(ThreadedBucketWrapper(bucket))
+
+
+def budget_wait_secs(limiter:Limiter, *, default:float) -> float:
+    """Secs until the limiter's last rejected reservation fits, default if it doesn't know (e.g. pyrate's own buckets)"""
+    waits = []
+    for bucket in limiter.buckets():
+        bucket = getattr(bucket, "bucket", bucket)          # unwrap BucketAsyncWrapper/ThreadedBucketWrapper
+        if isinstance(bucket, WeightedBucket) and bucket.retry_after_ms > 0:
+            waits.append(bucket.retry_after_ms)
+    return max(waits) / 1000 if waits else default
@@ -6,7 +6,10 @@ from pydantic import Field, ConfigDict
 from llama_index.core.embeddings import BaseEmbedding
 
 from embedding_pipeline import batch_texts_by_tokens, create_embeddings_async
+from embedding_providers import EmbeddingProvider
 from models.vector_db_model import EmbeddingVec
+from ingestion.checkpoints import IngestCheckpoint
+from ingestion.embedding_store import EmbeddingStore
 
 Vector = list[float]
 
@@ -32,7 +35,7 @@ def _to_vector(v: Any) -> Vector:
     if isinstance(v, list):
         return [float(x) for x in v]
     elif isinstance(v, EmbeddingVec):
-        return v.vector
+        return v.to_list()
     
     try:
         return [float(x) for x in v]
@@ -51,12 +54,25 @@ class RateLimitedAzureEmbedding(BaseEmbedding):
     # _embed_dim: Optional[int] = Field(default=None, repr=False)
     embed_dim_value: int|None = Field(default=None)
 
+    # Resumable ingestion: embeddings of book_id are looked up in/written to the checkpoint, only missing texts are embedded
+    checkpoint: IngestCheckpoint|None = Field(default=None, exclude=True)
+    book_id: int|None = Field(default=None)
+    # Shared by all collections/configs: identical texts (same model + dim) are only embedded once
+    embedding_store: EmbeddingStore|None = Field(default=None, exclude=True)
+
     model_config = ConfigDict(arbitrary_types_allowed=True, extra="forbid")
 
     @property
     def embed_dim(self) -> int|None:
         return self.embed_dim_value
 
+    @property
+    def store_key(self) -> str:
+        """Model key of the checkpoint/embedding store, the provider's (e.g. hashing) if it isn't the Azure client"""
+        if isinstance(self.embed_client, EmbeddingProvider):
+            return self.embed_client.model_key(self.deployment_name)
+        return self.deployment_name
+
     def _get_text_embedding(self, text: str) -> Vector:
         return _to_vector(_run_async_only_if_no_loop(self._aget_text_embedding(text)))
 
@@ -73,19 +89,52 @@ class RateLimitedAzureEmbedding(BaseEmbedding):
     async def _aget_text_embedding(self, text: str) -> Vector:
         return (await self._aget_text_embeddings([text]))[0]
 
-    async def _aget_text_embeddings(self, texts: list[str]) -> list[Vector]:
+    async def aget_embedding_vecs(self, texts: list[str]) -> list[EmbeddingVec]:
+        """Same as _aget_text_embeddings, but keeps the float32 arrays for our own upload path."""
+        use_checkpoint = self.checkpoint is not None and self.book_id is not None
+        if not use_checkpoint and self.embedding_store is None:
+            return await self._embed(texts)
+
+        # SQLite lookups (+ float16 conversion) in a worker thread, they run inside the /index request
+        vecs: list[EmbeddingVec|None] = [None] * len(texts)
+        if use_checkpoint:
+            vecs = await asyncio.to_thread(self.checkpoint.get_embeddings, self.book_id, self.store_key, texts)        # type:ignore
+        if self.embedding_store is not None and self.embed_dim_value and None in vecs:
+            idxs = [i for i, v in enumerate(vecs) if v is None]
+            stored = await asyncio.to_thread(self.embedding_store.get_many, self.store_key, self.embed_dim_value, [texts[i] for i in idxs])
+            for i, v in zip(idxs, stored):
+                vecs[i] = v
+
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vecs) if v is None))
+        if missing:
+            new_vecs = dict(zip(missing, await self._embed(missing, on_batch=self._save_batch)))
+            vecs = [v if v is not None else new_vecs[t] for t, v in zip(texts, vecs)]
+        return vecs     # type:ignore
+
+    async def _save_batch(self, texts: list[str], vecs: list[EmbeddingVec]) -> None:
+        """Awaited after each embedding API batch, before a later one can fail. The commits run in a worker thread"""
+        if self.checkpoint is not None and self.book_id is not None:
+            await asyncio.to_thread(self.checkpoint.put_embeddings, self.book_id, self.store_key, texts, vecs)
+        if self.embedding_store is not None:
+            await asyncio.to_thread(self.embedding_store.put_many, self.store_key, texts, vecs)
+
+    async def _embed(self, texts: list[str], on_batch=None) -> list[EmbeddingVec]:
         inp_batches = batch_texts_by_tokens(
                                 texts=texts,
                                 max_tokens_per_request=self.batch_size,
                             )
         
-        vectors = await create_embeddings_async(
+        return await create_embeddings_async(
                             embed_client=self.embed_client,
                             model_deployed=self.deployment_name,
                             inp_batches=inp_batches,
                             tok_limiter=self.tok_limiter,
                             req_limiter=self.req_limiter,
+                            on_batch=on_batch,
                         )
 
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[Vector]:
+        vectors = await self.aget_embedding_vecs(texts)
+
         # Forcing list[list[float]] for LlamaIndex
         return [_to_vector(v) for v in vectors]
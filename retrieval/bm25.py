@@ -0,0 +1,256 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Sequence
+import numpy as np
+from models.vector_db_model import UploadChunk, SearchChunk
+
+# BM25 term weighting, shared by ingestion (chunk -> sparse vector) and retrieval (query -> sparse vector).
+# The sparse vectors only carry the term-frequency part, the IDF part is applied by the vector store (Qdrant Modifier.IDF).
+# BM25Index below is the local alternative, a full inverted index with its own IDF statistics.
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_AVG_DOC_LEN = 256          # approx. words pr. chunk, used for length normalisation without a corpus pass
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+STOPWORDS = frozenset("""
+    a an and are as at be been but by for from had has have he her his i if in into is it its me my no not of on or
+    our she so than that the their them then there these they this to was we were what when which who will with you your
+""".split())
+
+
+def tokenize(text:str) -> list[str]:
+    """Lowercased word tokens without stopwords."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def term_index(term:str) -> int:
+    """Stable (across processes, unlike hash()) sparse vector dimension of a term."""
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def bm25_sparse_vector(text:str) -> tuple[list[int], list[float]]:
+    """
+    (indices, values) of a document/chunk as a sparse vector with BM25 saturated term frequencies:
+        tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avg_doc_len))
+    Hash collisions just merge two terms' weights.
+    """
+    tokens = tokenize(text)
+    tf_counts = Counter(term_index(t) for t in tokens)
+    len_norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_DOC_LEN)
+
+    indices = list(tf_counts.keys())
+    values = [tf * (BM25_K1 + 1) / (tf + len_norm) for tf in tf_counts.values()]
+    return indices, values
+
+
+def query_sparse_vector(text:str) -> tuple[list[int], list[float]]:
+    """(indices, values) of a query, every unique term weighted 1 so the score is the sum of the matched terms' BM25 weights."""
+    indices = sorted({term_index(t) for t in tokenize(text)})
+    return indices, [1.0] * len(indices)
+
+
+@dataclass
+class _BookSegment:
+    """
+    Inverted index of one book's chunks. Postings of term i are doc_ids/tfs[offsets[i]:offsets[i+1]],
+    i.e. CSR arrays instead of a dict of lists, so a book of ~5k chunks is a few MB.
+    """
+    book_id: int
+    book_name: str
+    terms: list[str]                # sorted, looked up by bisect
+    offsets: np.ndarray             # int64, len(terms) + 1
+    doc_ids: np.ndarray             # int32, chunk positions in this segment
+    tfs: np.ndarray                 # uint16
+    doc_lens: np.ndarray            # int32, no. tokens pr. chunk
+    chunk_nrs: np.ndarray           # int32
+    uuids: list[str]
+    contents: list[str]
+
+    @classmethod
+    def from_chunks(cls, chunks:Sequence[UploadChunk]) -> "_BookSegment":
+        vocab: dict[str, int] = {}
+        token_ids = []
+        doc_lens = np.zeros(len(chunks), dtype=np.int32)
+
+        for doc_id, c in enumerate(chunks):
+            ids = [vocab.setdefault(t, len(vocab)) for t in tokenize(c.content)]
+            token_ids.append(np.array(ids, dtype=np.int64))
+            doc_lens[doc_id] = len(ids)
+
+        # renumber terms in sorted order, then count (term, doc) pairs - sorted by term, then doc
+        terms = sorted(vocab)
+        term_rank = np.empty(len(vocab), dtype=np.int64)
+        term_rank[[vocab[t] for t in terms]] = np.arange(len(terms))
+        all_ids = np.concatenate(token_ids) if token_ids else np.zeros(0, dtype=np.int64)
+        pair_keys = term_rank[all_ids] * len(chunks) + np.repeat(np.arange(len(chunks)), doc_lens)
+        pairs, tfs = np.unique(pair_keys, return_counts=True)
+
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(pairs // len(chunks), minlength=len(terms)))
+
+        return cls(book_id=chunks[0].book_id, 
+                   book_name=chunks[0].book_name,
+                   terms=terms, 
+                   offsets=offsets,
+                   doc_ids=(pairs % len(chunks)).astype(np.int32),
+                   tfs=np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16),
+                   doc_lens=doc_lens,
+                   chunk_nrs=np.array([c.chunk_id for c in chunks], dtype=np.int32),
+                   uuids=[c.uuid_str for c in chunks],
+                   contents=[c.content for c in chunks])
+
+    def doc_freqs(self) -> Counter:
+        return Counter(dict(zip(self.terms, np.diff(self.offsets).tolist())))
+
+    def postings(self, term:str) -> tuple[np.ndarray, np.ndarray] | None:
+        i = bisect_left(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def save(self, folder:Path) -> None:
+        # written to tmp files and renamed, so a crash never leaves a half written segment behind
+        arrays_p, meta_p = folder / f"book_{self.book_id}.npz", folder / f"book_{self.book_id}.json"
+        with open(arrays_p.with_suffix(".npz.tmp"), "wb") as f:
+            np.savez(f, offsets=self.offsets, doc_ids=self.doc_ids, tfs=self.tfs, 
+                     doc_lens=self.doc_lens, chunk_nrs=self.chunk_nrs)
+        meta_p.with_suffix(".json.tmp").write_text(json.dumps({"book_id": self.book_id, "book_name": self.book_name, 
+                                                                "terms": self.terms, "uuids": self.uuids, 
+                                                                "contents": self.contents}), encoding="utf-8")
+        os.replace(arrays_p.with_suffix(".npz.tmp"), arrays_p)
+        os.replace(meta_p.with_suffix(".json.tmp"), meta_p)
+
+    @classmethod
+    def load(cls, arrays_p:Path) -> "_BookSegment":
+        meta = json.loads(arrays_p.with_suffix(".json").read_text(encoding="utf-8"))
+        with np.load(arrays_p) as arrs:
+            return cls(**meta, **{k: arrs[k] for k in arrs.files})
+
+
+class BM25Index:
+    """
+    Local BM25 inverted index over the uploaded chunks, one segment pr. book.
+    Books are added/replaced/deleted as a whole, matching how books are (re-)uploaded to the vector store.
+    With index_dir set, every segment is persisted there when added and loaded on init.
+    """
+    def __init__(self, index_dir:Path|None=None, k1:float=BM25_K1, b:float=BM25_B):
+        self.index_dir = Path(index_dir) if index_dir else None
+        self.k1, self.b = k1, b
+        self._segments: dict[int, _BookSegment] = {}
+        self._doc_freqs: Counter = Counter()
+        self._n_docs = 0
+        self._total_len = 0
+        self._lock = threading.Lock()       # books are added from worker threads during ingestion
+
+        if self.index_dir:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            for arrays_p in sorted(self.index_dir.glob("book_*.npz")):
+                self._add_segment(_BookSegment.load(arrays_p))
+
+    @property
+    def n_docs(self) -> int:
+        return self._n_docs
+
+    @property
+    def book_ids(self) -> set[int]:
+        return set(self._segments)
+
+    def _add_segment(self, seg:_BookSegment) -> None:
+        self._remove_segment(seg.book_id)
+        self._segments[seg.book_id] = seg
+        self._doc_freqs.update(seg.doc_freqs())
+        self._n_docs += len(seg.uuids)
+        self._total_len += int(seg.doc_lens.sum())
+
+    def _remove_segment(self, book_id:int) -> None:
+        seg = self._segments.pop(book_id, None)
+        if seg is None:
+            return
+        self._doc_freqs.subtract(seg.doc_freqs())
+        self._doc_freqs = +self._doc_freqs          # drops terms with df 0
+        self._n_docs -= len(seg.uuids)
+        self._total_len -= int(seg.doc_lens.sum())
+
+    def add_chunks(self, chunks:Sequence[UploadChunk]) -> None:
+        """Index chunks, replacing the segment of each book already in the index."""
+        by_book: dict[int, list[UploadChunk]] = {}
+        for c in chunks:
+            by_book.setdefault(c.book_id, []).append(c)
+
+        for book_chunks in by_book.values():
+            seg = _BookSegment.from_chunks(book_chunks)     # tokenizing is the slow part, done outside the lock
+            if self.index_dir:
+                seg.save(self.index_dir)
+            with self._lock:
+                self._add_segment(seg)
+
+    def delete_books(self, book_ids:set[int]) -> None:
+        with self._lock:
+            for book_id in book_ids:
+                self._remove_segment(book_id)
+                if self.index_dir:
+                    for p in (self.index_dir / f"book_{book_id}.npz", self.index_dir / f"book_{book_id}.json"):
+                        p.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        self.delete_books(set(self._segments))
+
+    def _idf(self, term:str) -> float:
+        df = self._doc_freqs[term]
+        return math.log(1 + (self._n_docs - df + 0.5) / (df + 0.5))
+
+    def search_page(self, query:str, *, skip:int=0, limit:int=10, 
+                    book_ids:set[int]|None=None) -> tuple[list[SearchChunk], int]:
+        """
+        BM25 ranked chunks [skip:skip+limit] matching at least one query term, and the total no. matching chunks.
+        book_ids limits the search to those books.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or self._n_docs == 0:
+                return [], 0
+            avg_len = self._total_len / self._n_docs
+            idfs = {t: self._idf(t) for t in terms if self._doc_freqs[t] > 0}
+
+            total_matches = 0
+            candidates: list[tuple[float, int, int]] = []      # (score, book_id, doc_id)
+            for seg in self._segments.values():
+                if book_ids is not None and seg.book_id not in book_ids:
+                    continue
+                scores = self._score_segment(seg, idfs, avg_len)
+                matched = np.flatnonzero(scores)
+                total_matches += len(matched)
+                if len(matched) > skip + limit:         # only the segment's own top skip+limit can make the global top
+                    matched = matched[np.argpartition(-scores[matched], skip + limit - 1)[:skip + limit]]
+                candidates.extend((float(scores[d]), seg.book_id, int(d)) for d in matched)
+
+            top = heapq.nlargest(skip + limit, candidates)[skip:]
+            return [self._to_search_chunk(self._segments[book_id], doc_id, score) for score, book_id, doc_id in top], total_matches
+
+    def search(self, query:str, k:int=10, book_ids:set[int]|None=None) -> list[SearchChunk]:
+        return self.search_page(query, limit=k, book_ids=book_ids)[0]
+
+    def _score_segment(self, seg:_BookSegment, idfs:dict[str, float], avg_len:float) -> np.ndarray:
+        scores = np.zeros(len(seg.uuids), dtype=np.float32)
+        len_norm = self.k1 * (1 - self.b + self.b * seg.doc_lens / avg_len)
+        for term, idf in idfs.items():
+            postings = seg.postings(term)
+            if postings is None:
+                continue
+            doc_ids, tfs = postings
+            scores[doc_ids] += idf * tfs * (self.k1 + 1) / (tfs + len_norm[doc_ids])
+        return scores
+
+    def _to_search_chunk(self, seg:_BookSegment, doc_id:int, score:float) -> SearchChunk:
+        return SearchChunk(uuid_str=seg.uuids[doc_id], chunk_id=int(seg.chunk_nrs[doc_id]), book_id=seg.book_id, 
+                           book_name=seg.book_name, content=seg.contents[doc_id], search_score=score)
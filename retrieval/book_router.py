@@ -0,0 +1,99 @@
+import os
+import threading
+from pathlib import Path
+import numpy as np
+
+
+def _normalize(m:np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return (m / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+def spherical_kmeans(vecs:np.ndarray, k:int, n_iter:int=10, seed:int=0) -> np.ndarray:
+    """k unit length centroids of the (normalized) vecs by cosine similarity. Fewer vecs than k -> the vecs themselves."""
+    vecs = _normalize(vecs)
+    if len(vecs) <= k:
+        return vecs
+
+    rng = np.random.default_rng(seed)
+    centroids = vecs[rng.choice(len(vecs), size=k, replace=False)]
+    for _ in range(n_iter):
+        assigned = np.argmax(vecs @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assigned, vecs)
+        empty = ~np.bincount(assigned, minlength=k).astype(bool)
+        sums[empty] = centroids[empty]              # keep a centroid that lost all its vecs
+        centroids = _normalize(sums)
+    return centroids
+
+
+class BookRouter:
+    """
+    Book level routing index: a few vectors pr. book, i.e. k-means centroids of its chunk vectors
+    (a book covers several topics, one mean would blur them) + the embedded Gutendex summary.
+    First stage of two-stage retrieval: route() picks the books whose vectors are closest to the query,
+    then the chunk search is filtered to those book_ids.
+    With path set, the index is a single .npz file, saved on every change and loaded on init.
+    `complete` is set once the router is known to cover every book of the vector store (see backfill_book_router),
+    until then routing would hide the books it doesn't know, so search stays flat.
+    """
+    def __init__(self, path:Path|None=None):
+        self.path = Path(path) if path else None
+        self._book_ids = np.zeros(0, dtype=np.int32)       # book_id of each routing vector
+        self._vecs: np.ndarray|None = None                  # (n, dim) unit vectors
+        self._lock = threading.Lock()
+        self.complete = False
+
+        if self.path and self.path.exists():
+            with np.load(self.path) as arrs:
+                self._book_ids, self._vecs = arrs["book_ids"], arrs["vecs"]
+
+    @property
+    def book_ids(self) -> set[int]:
+        return set(self._book_ids.tolist())
+
+    def _save(self) -> None:
+        if self.path is None or self._vecs is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_p = self.path.with_suffix(".tmp.npz")
+        np.savez(tmp_p, book_ids=self._book_ids, vecs=self._vecs)
+        os.replace(tmp_p, self.path)
+
+    def add_book(self, book_id:int, chunk_vecs:np.ndarray, summary_vec:np.ndarray|None=None, n_centroids:int=4) -> None:
+        """(Re-)compute the routing vectors of a book, replacing its old ones."""
+        book_vecs = spherical_kmeans(np.asarray(chunk_vecs, dtype=np.float32), k=n_centroids)
+        if summary_vec is not None:
+            book_vecs = np.vstack([book_vecs, _normalize(np.asarray(summary_vec, dtype=np.float32)[None, :])])
+
+        with self._lock:
+            keep = self._book_ids != book_id
+            old_vecs = self._vecs[keep] if self._vecs is not None else np.zeros((0, book_vecs.shape[1]), dtype=np.float32)
+            self._vecs = np.vstack([old_vecs, book_vecs])
+            self._book_ids = np.concatenate([self._book_ids[keep], np.full(len(book_vecs), book_id, dtype=np.int32)])
+            self._save()
+
+    def delete_books(self, book_ids:set[int]) -> None:
+        with self._lock:
+            if self._vecs is None:
+                return
+            keep = ~np.isin(self._book_ids, list(book_ids))
+            self._vecs, self._book_ids = self._vecs[keep], self._book_ids[keep]
+            self._save()
+
+    def route(self, query_vec:np.ndarray, top_m:int) -> list[int]:
+        """The top_m book_ids, by the best similarity of any of their routing vectors to the query."""
+        with self._lock:
+            if self._vecs is None or len(self._vecs) == 0:
+                return []
+            sims = self._vecs @ _normalize(np.asarray(query_vec, dtype=np.float32))
+            book_ids = self._book_ids
+
+        picked: list[int] = []
+        for i in np.argsort(-sims):
+            b_id = int(book_ids[i])
+            if b_id not in picked:
+                picked.append(b_id)
+                if len(picked) == top_m:
+                    break
+        return picked
@@ -0,0 +1,81 @@
+import tiktoken
+from db.vector_store_abstract import AsyncVectorStore
+from embedding_pipeline import _count_tokens
+from models.vector_db_model import SearchChunk
+
+
+def _merge_runs(nrs:set[int]) -> list[list[int]]:
+    """Sorted chunk nrs split into runs of consecutive nrs, e.g. {1,2,3,7,8} -> [[1,2,3], [7,8]]"""
+    runs: list[list[int]] = []
+    for nr in sorted(nrs):
+        if runs and nr == runs[-1][-1] + 1:
+            runs[-1].append(nr)
+        else:
+            runs.append([nr])
+    return runs
+
+
+async def expand_with_neighbours(*, chunks:list[SearchChunk],
+                                 vector_store:AsyncVectorStore,
+                                 window:int,
+                                 token_budget:int,
+                                ) -> list[SearchChunk]:
+    """
+    Grow the (reranked) chunks with up to `window` adjacent chunks on each side from the same book,
+    so a scene cut in two by the chunking is given to the LLM as a whole.
+    All neighbours are fetched in one batched request. Neighbours are added nearest first, best ranked chunk first,
+    while the total context stays within token_budget (the best chunk is always kept).
+    Chunks whose windows overlap or touch are merged into one passage, ranked by its best chunk.
+    """
+    if window <= 0 or not chunks:
+        return chunks
+    assert all(c.book_id is not None and c.chunk_id is not None for c in chunks), "expansion needs book_id + chunk_nr"
+
+    wanted: dict[int, set[int]] = {}
+    for c in chunks:
+        nrs = wanted.setdefault(c.book_id, set())           # type:ignore
+        nrs.update(nr for d in range(1, window + 1) for nr in (c.chunk_id - d, c.chunk_id + d) if nr >= 0)     # type:ignore
+    hit_keys = {(c.book_id, c.chunk_id) for c in chunks}
+    for book_id, nrs in wanted.items():
+        nrs.difference_update(nr for b_id, nr in hit_keys if b_id == book_id)
+
+    neighbours = await vector_store.get_chunks_by_nrs(chunk_nrs_by_book=wanted)
+    by_key = {(n.book_id, n.chunk_id): n for n in neighbours}
+    by_key.update({(c.book_id, c.chunk_id): c for c in chunks})
+
+    tokens = {key: c.token_count if c.token_count is not None else _count_tokens(c.content or "", enc=tiktoken.get_encoding("cl100k_base"))
+              for key, c in by_key.items()}
+
+    # the hits themselves first, in rank order
+    selected: set[tuple] = set()
+    used = 0
+    for c in chunks:
+        key = (c.book_id, c.chunk_id)
+        if key not in selected and (not selected or used + tokens[key] <= token_budget):
+            selected.add(key)
+            used += tokens[key]
+
+    # then grow every selected hit one step outwards at a time, only contiguously
+    for d in range(1, window + 1):
+        for c in chunks:
+            if (c.book_id, c.chunk_id) not in selected:
+                continue
+            for step in (-1, 1):
+                key = (c.book_id, c.chunk_id + step * d)                        # type:ignore
+                inner = (c.book_id, c.chunk_id + step * (d - 1))                # type:ignore
+                if key in by_key and key not in selected and inner in selected and used + tokens[key] <= token_budget:
+                    selected.add(key)
+                    used += tokens[key]
+
+    rank_of = {(c.book_id, c.chunk_id): i for i, c in enumerate(chunks)}
+    passages: list[tuple[int, SearchChunk]] = []
+    for book_id in {b_id for b_id, _ in selected}:
+        for run in _merge_runs({nr for b_id, nr in selected if b_id == book_id}):
+            best_key = min(((book_id, nr) for nr in run if (book_id, nr) in rank_of), key=rank_of.__getitem__)
+            content = "\n".join(by_key[(book_id, nr)].content or "" for nr in run)
+            passage = by_key[best_key].model_copy(update={"content": content,
+                                                          "token_count": sum(tokens[(book_id, nr)] for nr in run),
+                                                          "char_count": len(content)})
+            passages.append((rank_of[best_key], passage))
+
+    return [p for _, p in sorted(passages, key=lambda t: t[0])]
@@ -0,0 +1,76 @@
+import tiktoken
+from embedding_pipeline import _count_tokens
+from models.vector_db_model import SearchChunk
+
+MIN_OVERLAP_CHARS = 40          # shorter shared affixes are coincidence, not chunk overlap
+MAX_OVERLAP_CHARS = 4000        # ~ the chunk_overlap of fixed size chunking, with margin
+
+
+def _chunk_tokens(c:SearchChunk) -> int:
+    if c.token_count is not None:
+        return c.token_count
+    return _count_tokens(c.content or "", enc=tiktoken.get_encoding("cl100k_base"))
+
+
+def _overlap_len(prev:str, nxt:str) -> int:
+    """Length of the longest suffix of prev that is also a prefix of nxt (at least MIN_OVERLAP_CHARS), else 0."""
+    for k in range(min(len(prev), len(nxt), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if prev.endswith(nxt[:k]):
+            return k
+    return 0
+
+
+def _trim_against(candidate:str, packed:list[str]) -> str|None:
+    """
+    The candidate's text that is not already in the packed texts:
+    None if it's contained in one of them, else with an overlapping start/end cut off.
+    """
+    text = candidate
+    for p in packed:
+        if text in p:
+            return None
+        if (k := _overlap_len(p, text)):            # p ... | overlap | ... text
+            text = text[k:]
+        if (k := _overlap_len(text, p)):            # text ... | overlap | ... p
+            text = text[:-k]
+    if text is candidate:
+        return candidate
+    return text.strip() or None
+
+
+def pack_context(chunks:list[SearchChunk], *, token_budget:int, max_chunks:int|None=None) -> list[SearchChunk]:
+    """
+    Fill the context with the ranked chunks, in rank order, until token_budget is used (the best chunk is always kept).
+    A chunk that doesn't fit is skipped so a smaller, lower ranked chunk can still use the rest of the budget.
+    Duplicate chunks are dropped, and text overlapping an already packed chunk of the same book is trimmed off.
+    Token counts come from the stored token_count, trimmed chunks are scaled by their remaining share of chars.
+    """
+    packed: list[SearchChunk] = []
+    packed_texts: dict[int|None, list[str]] = {}        # book_id -> packed contents
+    seen_uuids: set[str] = set()
+    used = 0
+
+    for c in chunks:
+        if max_chunks is not None and len(packed) >= max_chunks:
+            break
+        if c.uuid_str in seen_uuids or not c.content:
+            continue
+
+        content = _trim_against(c.content, packed_texts.get(c.book_id, []))
+        if content is None:
+            continue
+        tokens = _chunk_tokens(c)
+        if content != c.content:
+            tokens = max(1, round(tokens * len(content) / len(c.content)))
+
+        if packed and used + tokens > token_budget:
+            continue
+
+        if c.uuid_str:
+            seen_uuids.add(c.uuid_str)
+        packed_texts.setdefault(c.book_id, []).append(content)
+        packed.append(c if content == c.content else
+                      c.model_copy(update={"content": content, "token_count": tokens, "char_count": len(content)}))
+        used += tokens
+
+    return packed
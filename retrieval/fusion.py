@@ -0,0 +1,23 @@
+from models.vector_db_model import SearchChunk
+
+RRF_K = 60      # constant from the original RRF paper (Cormack et al. 2009), dampens the weight of the top ranks
+
+
+def reciprocal_rank_fusion(result_lists:list[list[SearchChunk]], *, k:int=RRF_K, top_n:int|None=None) -> list[SearchChunk]:
+    """
+    Fuse ranked result lists (e.g. dense + keyword search) by Reciprocal Rank Fusion:
+        score(chunk) = sum over lists of 1 / (k + rank)
+    Only the ranks are used, so the lists' scores don't need to be on the same scale.
+    Chunks are identified by uuid_str, the returned chunks carry the fused score as search_score.
+    """
+    fused_scores: dict[str, float] = {}
+    chunks_by_id: dict[str, SearchChunk] = {}
+
+    for results in result_lists:
+        for rank, chunk in enumerate(results, start=1):
+            assert chunk.uuid_str, "RRF needs uuid_str to identify chunks across result lists"
+            fused_scores[chunk.uuid_str] = fused_scores.get(chunk.uuid_str, 0.0) + 1.0 / (k + rank)
+            chunks_by_id.setdefault(chunk.uuid_str, chunk)
+
+    ranked_ids = sorted(fused_scores, key=fused_scores.__getitem__, reverse=True)[:top_n]
+    return [chunks_by_id[uid].model_copy(update={"search_score": fused_scores[uid]}) for uid in ranked_ids]
@@ -0,0 +1,39 @@
+import numpy as np
+from models.vector_db_model import SearchChunk
+
+
+def _normalize(m:np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(norms == 0, 1, norms)
+
+
+def mmr_select(query_vec:np.ndarray, chunks:list[SearchChunk], *, k:int, lambda_mult:float=0.7) -> list[SearchChunk]:
+    """
+    Maximal Marginal Relevance (Carbonell & Goldstein 1998): greedily pick k chunks maximizing
+        lambda_mult * sim(query, chunk) - (1 - lambda_mult) * max sim(chunk, already picked)
+    so near-duplicate chunks from the same passage don't all make it to the reranker.
+    lambda_mult=1 is plain relevance order, 0 is max diversity. Chunks need their .vector (search with_vectors=True).
+    Returned in pick order.
+    """
+    if k >= len(chunks):
+        return chunks
+    assert all(c.vector is not None for c in chunks), "MMR needs the chunk vectors, search with with_vectors=True"
+
+    vecs = _normalize(np.stack([c.vector for c in chunks]))               # type:ignore
+    query_sims = vecs @ _normalize(np.asarray(query_vec, dtype=np.float32))
+    chunk_sims = vecs @ vecs.T
+
+    picked = [int(np.argmax(query_sims))]
+    max_sim_to_picked = chunk_sims[picked[0]].copy()
+    available = np.ones(len(chunks), dtype=bool)
+    available[picked[0]] = False
+
+    while len(picked) < k:
+        mmr_scores = lambda_mult * query_sims - (1 - lambda_mult) * max_sim_to_picked
+        mmr_scores[~available] = -np.inf
+        nxt = int(np.argmax(mmr_scores))
+        picked.append(nxt)
+        available[nxt] = False
+        np.maximum(max_sim_to_picked, chunk_sims[nxt], out=max_sim_to_picked)
+
+    return [chunks[i] for i in picked]
@@ -0,0 +1,59 @@
+import logging
+from typing import Literal
+from openai import AzureOpenAI, OpenAIError
+from pydantic import BaseModel, Field, ValidationError
+
+QueryExpansionMode = Literal["none", "multi_query", "hyde", "both"]
+logger = logging.getLogger(__name__)
+
+
+class QueryExpansions(BaseModel):
+    paraphrases: list[str] = Field(default_factory=list, description="Rephrasings of the question")
+    hypothetical_passage: str|None = Field(default=None, description="A passage from a book that would answer the question")
+
+
+def expand_query(*, query:str,
+                 llm_client:AzureOpenAI,
+                 llm_model:str,
+                 mode:QueryExpansionMode,
+                 n_paraphrases:int=3,
+                 ) -> list[str]:
+    """
+    Extra search queries for a (vague) question, in one LLM call:
+        - multi_query: n_paraphrases rephrasings, using other words/names for the same thing
+        - hyde: a hypothetical passage answering the question (HyDE, Gao et al. 2022),
+          which embeds closer to the book text than the question itself
+    The original query is not included. The expansions are optional, if the LLM call fails the query is searched alone.
+    """
+    if mode == "none":
+        return []
+
+    wants = []
+    if mode in ("multi_query", "both"):
+        wants.append(f"- paraphrases: {n_paraphrases} different rephrasings of the question, e.g. using names or synonyms the book might use")
+    if mode in ("hyde", "both"):
+        wants.append("- hypothetical_passage: a short passage (~100 words) written as if taken from the book, that answers the question")
+    newline = "\n"
+
+    try:
+        resp = llm_client.responses.parse(
+                    model=llm_model,
+                    input=[
+                        {"role":"system","content":"You help a search engine over classic books from Project Gutenberg find relevant passages."},
+                        {"role":"user","content":f"Question: {query}\nWrite:\n{newline.join(wants)}"}
+                    ],
+                    text_format=QueryExpansions
+                )
+    except (OpenAIError, ValidationError) as exc:          # e.g. 429, timeout, unparsable output
+        logger.warning("Query expansion failed, searching with the query only: %r", exc)
+        return []
+
+    expansions = resp.output_parsed
+    if expansions is None:
+        logger.warning("Query expansion returned no parsed output, searching with the query only")
+        return []
+
+    queries = expansions.paraphrases[:n_paraphrases] if mode in ("multi_query", "both") else []
+    if mode in ("hyde", "both") and expansions.hypothetical_passage:
+        queries.append(expansions.hypothetical_passage)
+    return [q for q in queries if q.strip() and q.strip() != query.strip()]
@@ -1,3 +1,5 @@
+import asyncio
+from typing import Literal
 from evals.timer_helper import Timer
 from openai import AzureOpenAI, AsyncAzureOpenAI
 from config.settings import Settings, get_settings
@@ -9,7 +11,14 @@ from embedding_pipeline import create_embeddings_async
 from models.vector_db_model import SearchChunk
 from pydantic import Field, BaseModel
 from vector_store_utils import _split_by_size
-from metrics.rag_metrics import rag_stage_seconds
+from metrics.rag_metrics import rag_stage_seconds, rag_prompt_tokens
+from retrieval.fusion import reciprocal_rank_fusion, RRF_K
+from retrieval.bm25 import BM25Index
+from retrieval.book_router import BookRouter
+from retrieval.context_expansion import expand_with_neighbours
+from retrieval.context_packing import pack_context
+from retrieval.mmr import mmr_select
+from retrieval.query_expansion import expand_query
 
 class RankedChunk(BaseModel):
     score:int = Field(ge=0, le=10)
@@ -37,22 +46,66 @@ async def search_chunks(*, query: str,
                         tok_lim:Limiter,
                         req_lim:Limiter,
                         keep_top_k:int,
+                        search_type:Literal["vector", "hybrid_search"]="vector",
+                        rrf_k:int=RRF_K,
+                        keyword_index:BM25Index|None=None,
+                        mmr_k:int|None=None,
+                        mmr_lambda:float=0.7,
+                        query_expansions:list[str]|None=None,
+                        book_router:BookRouter|None=None,
+                        route_top_m:int|None=None,
                         ) -> list[SearchChunk]: 
+    """
+    Dense vector search, or with search_type="hybrid_search" dense + keyword (BM25) search fused by RRF.
+    The keyword search uses the local keyword_index if given, else the vector store's own.
+    With mmr_k set, the keep_top_k dense hits are narrowed to mmr_k diverse ones by MMR on their stored vectors.
+    query_expansions (see expand_query) are embedded in the same request as the query and searched in one batch, 
+    their dense hits are fused by RRF, which also dedupes them by uuid.
+    With a book_router and route_top_m set, the dense search is two-stage: only chunks of the route_top_m books 
+    closest to the query (by their centroid/summary vectors) are searched. Flat until the router is complete.
+    """
     print(f'TOP K : {keep_top_k}')
 
-    query_emb_vec = await create_embeddings_async(inp_batches=[[query]], 
-                                                embed_client=embed_client, 
-                                                model_deployed=embed_model_deployed,
-                                                tok_limiter=tok_lim,
-                                                req_limiter=req_lim
-                                                )
+    async def _dense_search() -> list[SearchChunk]:
+        query_emb_vec = await create_embeddings_async(inp_batches=[[query, *(query_expansions or [])]], 
+                                                    embed_client=embed_client, 
+                                                    model_deployed=embed_model_deployed,
+                                                    tok_limiter=tok_lim,
+                                                    req_limiter=req_lim
+                                                    )
+
+        book_filter = None
+        if book_router is not None and book_router.complete and route_top_m:
+            routed_books = book_router.route(query_emb_vec[0].vector, route_top_m)
+            book_filter = {"book_id": routed_books} if routed_books else None     # empty router -> flat search
+
+        if len(query_emb_vec) == 1:
+            hits = await vector_store.search_by_embedding(
+                                                        embed_query_vector=query_emb_vec[0],
+                                                        filter=book_filter,
+                                                        k=keep_top_k,
+                                                        with_vectors=mmr_k is not None,
+                                                    )
+        else:
+            hit_lists = await vector_store.search_by_embeddings(embed_query_vectors=query_emb_vec, 
+                                                                filter=book_filter,
+                                                                k=keep_top_k, 
+                                                                with_vectors=mmr_k is not None)
+            hits = reciprocal_rank_fusion(hit_lists, k=rrf_k, top_n=keep_top_k)
+        if mmr_k is not None:
+            hits = mmr_select(query_emb_vec[0].vector, hits, k=mmr_k, lambda_mult=mmr_lambda)
+        return hits
 
-    results:list[SearchChunk] = await vector_store.search_by_embedding(
-                                                embed_query_vector=query_emb_vec[0],
-                                                filter=None,
-                                                k=keep_top_k
-                                            )
-    return results
+    if search_type == "vector":
+        return await _dense_search()
+
+    # keyword search doesn't need the query embedding, so it runs while the query is being embedded
+    if keyword_index is not None:
+        keyword_search = asyncio.to_thread(keyword_index.search, query, keep_top_k)
+    else:
+        keyword_search = vector_store.search_by_keywords(query=query, k=keep_top_k)
+    dense_hits, keyword_hits = await asyncio.gather(_dense_search(), keyword_search)
+    return reciprocal_rank_fusion([dense_hits, keyword_hits], k=rrf_k, top_n=mmr_k or keep_top_k)
 
 
 def simple_llm_reranker(q:str, chunks:list[SearchChunk], 
@@ -148,6 +201,8 @@ def answer_with_context(*, query:str,
             text_format=AnswerChunk
         )
         llm_answer = resp.output_parsed
+        if resp.usage:
+            rag_prompt_tokens.observe(resp.usage.input_tokens)
 
     return llm_answer.answer, llm_answer.used_chunks    # type:ignore
 
@@ -161,6 +216,17 @@ async def answer_rag(*, query: str,
     req_lim, tok_lim = sett.get_limiters()
     hp = sett.get_hyperparams()
 
+    query_expansions = []
+    if hp.retrieval.query_expansion != "none":
+        with timer.start_timer("query_expansion"):
+            query_expansions = await asyncio.to_thread(expand_query, 
+                                                       query=query, 
+                                                       llm_client=sett.get_llm_client(),
+                                                       llm_model=hp.retrieval.query_expansion_model or hp.rerank.model,
+                                                       mode=hp.retrieval.query_expansion,
+                                                       n_paraphrases=hp.retrieval.n_query_paraphrases)
+        rag_stage_seconds.labels(stage="query_expansion").observe(timer.timings["query_expansion"])
+
     with timer.start_timer("search"):
         unranked_chunks = await search_chunks(query=query, 
                                             vector_store=await sett.get_vector_store(), 
@@ -169,6 +235,14 @@ async def answer_rag(*, query: str,
                                             tok_lim=tok_lim,
                                             req_lim=req_lim,
                                             keep_top_k=keep_top_k,
+                                            search_type=hp.retrieval.vector_db_type,
+                                            rrf_k=hp.retrieval.rrf_k,
+                                            keyword_index=sett.get_bm25_index() if hp.retrieval.keyword_index == "local_bm25" else None,
+                                            mmr_k=hp.retrieval.mmr_k,
+                                            mmr_lambda=hp.retrieval.mmr_lambda,
+                                            query_expansions=query_expansions,
+                                            book_router=sett.get_book_router() if hp.retrieval.route_top_m else None,
+                                            route_top_m=hp.retrieval.route_top_m,
                                         )
     rag_stage_seconds.labels(stage="search").observe(timer.timings["search"])
 
@@ -179,8 +253,19 @@ async def answer_rag(*, query: str,
                                         split_every_k=hp.rerank.batch_size,
                                         timer=timer)
     
-    top_chunks = ranked_chunks[:hp.generation.num_context_chunks]      
+    # fill the token budget in rank order, at most num_context_chunks chunks
+    top_chunks = pack_context(ranked_chunks, 
+                              token_budget=hp.generation.context_token_budget, 
+                              max_chunks=hp.generation.num_context_chunks)
     rag_stage_seconds.labels(stage="rerank_total").observe(timer.timings["rerank_total"])
+
+    if hp.generation.neighbour_window > 0:
+        with timer.start_timer("context_expansion"):
+            top_chunks = await expand_with_neighbours(chunks=top_chunks, 
+                                                      vector_store=await sett.get_vector_store(),
+                                                      window=hp.generation.neighbour_window,
+                                                      token_budget=hp.generation.context_token_budget)
+        rag_stage_seconds.labels(stage="context_expansion").observe(timer.timings["context_expansion"])
     
 
     with timer.start_timer("answer_with_contexts"):
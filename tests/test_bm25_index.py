@@ -0,0 +1,92 @@
+import uuid
+import numpy as np
+import pytest
+from config.params import EmbeddingDimension
+from db.fake_vector_store import InMemoryVectorStore
+from models.vector_db_model import UploadChunk, EmbeddingVec
+from retrieval.bm25 import BM25Index
+
+MOBY_DICK = [
+    "Call me Ishmael. Some years ago - never mind how long precisely - having little or no money in my purse.",
+    "Queequeg was a native of Kokovoko, an island far away to the West and South.",
+    "The whale, the whale! Ishmael saw the whale breach, and Queequeg raised his harpoon.",
+    "Captain Ahab stood upon the quarter-deck, his ivory leg in the auger hole.",
+]
+FRANKENSTEIN = [
+    "I beheld the wretch - the miserable monster whom I had created.",
+    "Felix soon learned that the treacherous Turk had quitted Italy with his daughter.",
+]
+
+
+def make_chunks(contents:list[str], book_id:int, book_name:str) -> list[UploadChunk]:
+    vec = np.zeros(EmbeddingDimension.SMALL.value, dtype=np.float32)
+    return [UploadChunk(uuid_str=str(uuid.uuid4()), book_name=book_name, book_id=book_id, chunk_id=i, content=c,
+                        token_count=1, char_count=len(c), content_vector=EmbeddingVec(vector=vec, dim=EmbeddingDimension.SMALL))
+            for i, c in enumerate(contents)]
+
+
+@pytest.fixture()
+def index() -> BM25Index:
+    idx = BM25Index()
+    idx.add_chunks(make_chunks(MOBY_DICK, 2701, "Moby Dick"))
+    idx.add_chunks(make_chunks(FRANKENSTEIN, 84, "Frankenstein"))
+    return idx
+
+
+def test_search_ranks_by_bm25(index:BM25Index):
+    hits = index.search("Queequeg harpoon", k=3)
+    assert [h.chunk_id for h in hits] == [2, 1]         # chunk 2 matches both terms
+    assert hits[0].search_score > hits[1].search_score > 0
+    assert hits[0].book_name == "Moby Dick" and "harpoon" in hits[0].content
+
+
+def test_rare_terms_weigh_more(index:BM25Index):
+    hits = index.search("Ishmael Kokovoko", k=3)
+    assert hits[0].chunk_id == 1        # Kokovoko occurs in 1 chunk, Ishmael in 2
+
+
+def test_search_page_and_book_filter(index:BM25Index):
+    page_1, total = index.search_page("whale Ishmael Queequeg monster", skip=0, limit=2)
+    page_2, _ = index.search_page("whale Ishmael Queequeg monster", skip=2, limit=2)
+    assert total == 4
+    assert len(page_1) == 2 and len(page_2) == 2
+    assert not {h.uuid_str for h in page_1} & {h.uuid_str for h in page_2}
+
+    hits = index.search("whale Ishmael Queequeg monster", k=10, book_ids={84})
+    assert [h.book_id for h in hits] == [84]
+
+
+def test_replace_and_delete_book(index:BM25Index):
+    index.add_chunks(make_chunks(["The whale is white."], 2701, "Moby Dick"))       # re-upload replaces the segment
+    assert index.n_docs == 1 + len(FRANKENSTEIN)
+    assert index.search("Queequeg") == []
+
+    index.delete_books({2701})
+    assert index.book_ids == {84}
+    assert index.search("whale") == []
+    assert index.search("monster")[0].book_id == 84
+
+
+def test_persisted_segments_are_loaded(tmp_path):
+    idx = BM25Index(index_dir=tmp_path)
+    idx.add_chunks(make_chunks(MOBY_DICK, 2701, "Moby Dick"))
+    idx.add_chunks(make_chunks(FRANKENSTEIN, 84, "Frankenstein"))
+    idx.delete_books({84})
+
+    loaded = BM25Index(index_dir=tmp_path)
+    assert loaded.book_ids == {2701}
+    assert [(h.uuid_str, h.search_score) for h in loaded.search("Queequeg harpoon")] == \
+           [(h.uuid_str, h.search_score) for h in idx.search("Queequeg harpoon")]
+
+
+async def test_in_memory_store_paginated_search_by_text():
+    store = InMemoryVectorStore()
+    await store.upsert_chunks(chunks=make_chunks(MOBY_DICK[:2], 2701, "Moby Dick"))
+    await store.upsert_chunks(chunks=make_chunks(MOBY_DICK[2:], 2701, "Moby Dick"))       # same book in 2 batches
+
+    page = await store.paginated_search_by_text(text_query="Ishmael", skip=0, limit=10, fields=["chunk_nr"])
+    assert page.total_count == 2
+    assert all(c.content is None for c in page.chunks)
+
+    await store.delete_books(book_ids={2701})
+    assert (await store.paginated_search_by_text(text_query="Ishmael", skip=0, limit=10)).total_count == 0
@@ -0,0 +1,83 @@
+import gzip, json
+from pathlib import Path
+import pytest
+from ingestion.book_cache import BookCache
+from models.api_response_model import GBBookMeta
+
+
+def gb_meta(gb_id:int) -> GBBookMeta:
+    return GBBookMeta(id=gb_id, title=f"Book {gb_id}", summaries=["A summary"], subjects=[], languages=["en"],
+                      authors=[{"name": "Melville, Herman"}], editors=[], download_count=1, formats={}, copyright=False)
+
+
+def book_text(gb_id:int, n_chars:int=20_000) -> str:
+    return (f"Call me Ishmael, book {gb_id}. " * n_chars)[:n_chars]
+
+
+@pytest.fixture()
+def cache(tmp_path) -> BookCache:
+    return BookCache(root=tmp_path / "books")
+
+
+def test_put_get_roundtrip_compressed(cache):
+    cache.put(gb_meta(2701), book_text(2701))
+    content, meta = cache.get(2701)           # type:ignore
+    assert content == book_text(2701) and meta == gb_meta(2701)
+    assert 2701 in cache and cache.get(84) is None
+    assert 0 < cache.total_bytes < len(book_text(2701)) / 5
+
+
+def test_persists_across_instances(tmp_path):
+    BookCache(root=tmp_path).put(gb_meta(84), "It was on a dreary night of November")
+    assert BookCache(root=tmp_path).get(84)[0] == "It was on a dreary night of November"      # type:ignore
+
+
+def test_identical_content_is_stored_once(cache):
+    cache.put(gb_meta(1), "same text")
+    cache.put(gb_meta(2), "same text")
+    assert len(list((cache.root / "objects").rglob("*.gz"))) == 1
+
+    cache.delete(1)
+    assert cache.get(2)[0] == "same text"           # type:ignore
+    cache.delete(2)
+    assert list((cache.root / "objects").rglob("*.gz")) == []
+
+
+def test_replacing_a_book_removes_its_old_object(cache):
+    cache.put(gb_meta(1), "first edition")
+    cache.put(gb_meta(1), "second edition")
+    assert cache.get(1)[0] == "second edition"      # type:ignore
+    assert len(list((cache.root / "objects").rglob("*.gz"))) == 1
+
+
+def test_lru_eviction(tmp_path):
+    probe = BookCache(root=tmp_path / "probe")
+    probe.put(gb_meta(0), book_text(0))
+    one_book = probe.total_bytes
+
+    cache = BookCache(root=tmp_path / "books", max_bytes=int(2.5 * one_book))
+    cache.put(gb_meta(1), book_text(1))
+    cache.put(gb_meta(2), book_text(2))
+    cache.get(1)                                    # 2 is now the least recently used
+    cache.put(gb_meta(3), book_text(3))
+    assert 2 not in cache and 1 in cache and 3 in cache
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_corrupt_object_is_dropped(cache):
+    cache.put(gb_meta(1), "some text")
+    obj_p = next((cache.root / "objects").rglob("*.gz"))
+    obj_p.write_bytes(gzip.compress(b"tampered"))
+    assert cache.get(1) is None and 1 not in cache
+
+
+def test_legacy_files_are_imported(tmp_path):
+    root = tmp_path / "books"
+    root.mkdir()
+    txt_p = root / "moby-dick_melville-herman_2701.txt"
+    txt_p.write_text("Call me Ishmael.", encoding="utf-8")
+    legacy = {**gb_meta(2701).model_dump(), "path_to_content": str(txt_p)}
+    txt_p.with_suffix(".json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    cache = BookCache(root=root)
+    assert cache.get(2701) == ("Call me Ishmael.", gb_meta(2701))
@@ -0,0 +1,127 @@
+import uuid
+from pathlib import Path
+import numpy as np
+import pytest
+from config.params import EmbeddingDimension
+from config.settings import Settings, get_settings
+from db.fake_vector_store import InMemoryVectorStore
+from db.qdrant_vector_store import QdrantVectorStore
+from models.vector_db_model import UploadChunk, EmbeddingVec
+from qdrant_client import AsyncQdrantClient
+from retrieval.book_router import BookRouter, spherical_kmeans
+from vector_store_utils import backfill_book_router
+
+DIM = EmbeddingDimension.SMALL.value
+
+
+def unit(v:np.ndarray) -> np.ndarray:
+    return (v / np.linalg.norm(v, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def book_vecs(topics:np.ndarray, n_pr_topic:int, seed:int) -> np.ndarray:
+    """Chunk vectors scattered around the given topic vectors."""
+    rng = np.random.default_rng(seed)
+    return unit(np.vstack([t + 0.1 * unit(rng.normal(size=(n_pr_topic, DIM))) for t in topics]))
+
+
+@pytest.fixture()
+def topics() -> np.ndarray:
+    return unit(np.random.default_rng(42).normal(size=(6, DIM)))
+
+
+def make_chunks(book_id:int, vecs:np.ndarray) -> list[UploadChunk]:
+    return [UploadChunk(uuid_str=str(uuid.uuid4()), book_name=f"book {book_id}", book_id=book_id, chunk_id=i,
+                        content=f"chunk {i}", token_count=2, char_count=7,
+                        content_vector=EmbeddingVec(vector=v, dim=EmbeddingDimension.SMALL))
+            for i, v in enumerate(vecs)]
+
+
+def test_spherical_kmeans_finds_topics(topics):
+    centroids = spherical_kmeans(book_vecs(topics[:3], 20, seed=0), k=3)
+    assert centroids.shape == (3, DIM)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1, atol=1e-5)
+    assert sorted(np.argmax(centroids @ topics[:3].T, axis=1).tolist()) == [0, 1, 2]      # one centroid pr. topic
+
+
+def test_spherical_kmeans_fewer_vecs_than_k(topics):
+    assert spherical_kmeans(topics[:2], k=4).shape == (2, DIM)
+
+
+def test_route_picks_the_book_of_any_topic(topics):
+    router = BookRouter()
+    router.add_book(1, book_vecs(topics[:3], 10, seed=1), n_centroids=3)
+    router.add_book(2, book_vecs(topics[3:], 10, seed=2), n_centroids=3)
+
+    assert router.route(topics[1], top_m=1) == [1]          # a minor topic of book 1 isn't blurred away by a mean
+    assert router.route(topics[5], top_m=1) == [2]
+    assert router.route(topics[5], top_m=5) == [2, 1]        # each book once
+
+
+def test_summary_vector_routes(topics):
+    router = BookRouter()
+    router.add_book(1, book_vecs(topics[:1], 5, seed=1), summary_vec=topics[4], n_centroids=1)
+    router.add_book(2, book_vecs(topics[2:3], 5, seed=2), n_centroids=1)
+    assert router.route(topics[4], top_m=1) == [1]
+
+
+def test_add_replaces_and_delete(topics):
+    router = BookRouter()
+    router.add_book(1, book_vecs(topics[:1], 5, seed=1), n_centroids=2)
+    router.add_book(1, book_vecs(topics[1:2], 5, seed=1), n_centroids=2)
+    router.add_book(2, book_vecs(topics[2:3], 5, seed=2), n_centroids=2)
+    assert router.route(topics[1], top_m=1) == [1]
+    assert len(router._vecs) == 4            # type:ignore
+
+    router.delete_books({1})
+    assert router.book_ids == {2}
+    assert router.route(topics[1], top_m=2) == [2]
+    assert BookRouter().route(topics[0], top_m=2) == []
+
+
+def test_router_persists(tmp_path, topics):
+    path = tmp_path / "router" / "test_collection.npz"
+    BookRouter(path=path).add_book(7, book_vecs(topics[:2], 5, seed=1), n_centroids=2)
+    reloaded = BookRouter(path=path)
+    assert reloaded.book_ids == {7}
+    assert reloaded.route(topics[0], top_m=1) == [7]
+
+
+async def test_qdrant_search_filtered_to_routed_books(topics):
+    store = QdrantVectorStore(settings=get_settings(is_test=True), collection_name="routing_test")
+    store._client = AsyncQdrantClient(location=":memory:")
+    await store.create_missing_collection(collection_name=store.collection_name)
+    for b_id in (1, 2, 3):
+        await store.upsert_chunks(chunks=make_chunks(b_id, book_vecs(topics[b_id-1:b_id], 3, seed=b_id)))
+
+    query = EmbeddingVec(vector=topics[0], dim=EmbeddingDimension.SMALL)
+    hits = await store.search_by_embedding(embed_query_vector=query, filter={"book_id": [2, 3]}, k=9)
+    assert {h.book_id for h in hits} == {2, 3} and len(hits) == 6
+    hit_lists = await store.search_by_embeddings(embed_query_vectors=[query], filter={"book_id": [3]}, k=9)
+    assert {h.book_id for h in hit_lists[0]} == {3}
+    assert await store.get_all_book_ids() == {1, 2, 3}
+    await store.close_conn()
+
+
+async def test_in_memory_search_filtered_to_routed_books(topics):
+    store = InMemoryVectorStore()
+    for b_id in (1, 2):
+        await store.upsert_chunks(chunks=make_chunks(b_id, book_vecs(topics[b_id-1:b_id], 3, seed=b_id)))
+
+    query = EmbeddingVec(vector=topics[0], dim=EmbeddingDimension.SMALL)
+    assert {h.book_id for h in await store.search_by_embedding(embed_query_vector=query, filter={"book_id": [2]}, k=6)} == {2}
+    assert {h.book_id for h in await store.search_by_embedding(embed_query_vector=query, filter={"book_id": 1}, k=6)} == {1}
+
+
+async def test_backfill_routes_books_indexed_before_the_router(topics):
+    sett = Settings(is_test=True, hyperparam_path=Path("config", "hp-sem70p-ch.json"))        # type:ignore
+    store = InMemoryVectorStore()
+    for b_id in (1, 2):
+        await store.upsert_chunks(chunks=make_chunks(b_id, book_vecs(topics[b_id-1:b_id], 3, seed=b_id)))
+    router = sett.get_book_router()
+    router.add_book(2, book_vecs(topics[1:2], 3, seed=2))
+    assert not router.complete           # search stays flat, book 1 couldn't be routed to
+
+    assert await backfill_book_router(sett=sett, vec_store=store) == {1}
+    assert router.complete and router.book_ids == {1, 2}
+    assert router.route(topics[0], top_m=1) == [1]
+    assert await backfill_book_router(sett=sett, vec_store=store) == set()
@@ -0,0 +1,96 @@
+from typing import AsyncGenerator
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from db.book_search import BOOK_FTS_TABLE, create_book_search_indexes
+from db.database import Base
+from db.operations import select_books_like_db, delete_book_db
+from models.schema import DBBookMetaData
+
+BOOKS = [
+    DBBookMetaData(gb_id=84, title="Frankenstein; Or, The Modern Prometheus", authors="Shelley, Mary Wollstonecraft", summary="", languages="en"),
+    DBBookMetaData(gb_id=42, title="The Strange Case of Dr. Jekyll and Mr. Hyde", authors="Stevenson, Robert Louis", summary="", languages="en"),
+    DBBookMetaData(gb_id=120, title="Treasure Island", authors="Stevenson, Robert Louis", summary="", languages="en;nl"),
+    DBBookMetaData(gb_id=2701, title="Moby Dick; Or, The Whale", authors="Melville, Herman", summary="", languages="en"),
+    DBBookMetaData(gb_id=17489, title="Les Misérables, Tome I", authors="Hugo, Victor", summary="", languages="fr"),
+]
+
+
+@pytest.fixture()
+async def db() -> AsyncGenerator[AsyncSession, None]:
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)       # creates the FTS table + triggers too
+        await create_book_search_indexes(conn)
+    async with AsyncSession(engine, expire_on_commit=False) as sess:
+        sess.add_all([DBBookMetaData(**{c: getattr(b, c) for c in ("gb_id", "title", "authors", "summary", "languages")})
+                      for b in BOOKS])
+        await sess.commit()
+        yield sess
+    await engine.dispose()
+
+
+async def test_title_substring_case_insensitive(db):
+    books, total = await select_books_like_db(title="frankenst", authors=None, db_sess=db)
+    assert [b.gb_id for b in books] == [84] and total == 1
+
+
+async def test_authors_any_of(db):
+    books, total = await select_books_like_db(title=None, authors="stevenson; melville", db_sess=db)
+    assert {b.gb_id for b in books} == {42, 120, 2701} and total == 3
+
+
+async def test_title_and_authors_and_lang(db):
+    books, _ = await select_books_like_db(title="island", authors="Stevenson", lang="nl", db_sess=db)
+    assert [b.gb_id for b in books] == [120]
+    books, _ = await select_books_like_db(title=None, authors=None, lang="fr", db_sess=db)
+    assert [b.gb_id for b in books] == [17489]
+    books, _ = await select_books_like_db(title=None, authors=None, lang="e", db_sess=db)      # whole codes only
+    assert books == []
+
+
+async def test_unknown_languages_match_any_lang(db):
+    # rows stored before the languages column existed get '' on Postgres
+    db.add(DBBookMetaData(gb_id=1661, title="The Adventures of Sherlock Holmes", authors="Doyle, Arthur Conan", summary="", languages=""))
+    await db.commit()
+    books, _ = await select_books_like_db(title=None, authors=None, lang="fr", db_sess=db)
+    assert [b.gb_id for b in books] == [1661, 17489]
+    books, _ = await select_books_like_db(title="sherlock", authors=None, lang="en", db_sess=db)
+    assert [b.gb_id for b in books] == [1661]
+
+
+async def test_short_terms_fall_back_to_like(db):
+    books, _ = await select_books_like_db(title="Dr", authors=None, db_sess=db)
+    assert [b.gb_id for b in books] == [42]
+
+
+async def test_pagination(db):
+    page_1, total = await select_books_like_db(title="the", authors=None, skip=0, take=2, db_sess=db)
+    page_2, total_2 = await select_books_like_db(title="the", authors=None, skip=2, take=2, db_sess=db)
+    assert total == total_2 == 3
+    assert len(page_1) == 2 and len(page_2) == 1
+    assert {b.gb_id for b in page_1 + page_2} == {84, 42, 2701}
+
+    past_end, total = await select_books_like_db(title="the", authors=None, skip=10, take=2, db_sess=db)
+    assert past_end == [] and total == 3
+
+
+async def test_fts_follows_deletes_and_updates(db):
+    await delete_book_db(db_sess=db, gb_id=84)
+    assert (await select_books_like_db(title="Frankenstein", authors=None, db_sess=db))[0] == []
+
+    book = await db.get(DBBookMetaData, 2701)
+    book.title = "Moby-Dick"
+    await db.commit()
+    assert (await select_books_like_db(title="whale", authors=None, db_sess=db))[0] == []
+    assert [b.gb_id for b in (await select_books_like_db(title="moby-d", authors=None, db_sess=db))[0]] == [2701]
+
+
+async def test_indexes_are_built_for_an_existing_table(db):
+    conn = await db.connection()
+    await conn.execute(text(f"DROP TABLE {BOOK_FTS_TABLE}"))
+    await create_book_search_indexes(conn)      # e.g. a DB created before the FTS table existed
+    await create_book_search_indexes(conn)      # idempotent
+    books, _ = await select_books_like_db(title="Misérables", authors=None, db_sess=db)
+    assert [b.gb_id for b in books] == [17489]
@@ -0,0 +1,76 @@
+import uuid
+import numpy as np
+import pytest
+from config.params import EmbeddingDimension
+from config.settings import get_settings
+from db.fake_vector_store import InMemoryVectorStore
+from db.qdrant_vector_store import QdrantVectorStore
+from models.vector_db_model import UploadChunk, EmbeddingVec, SearchChunk
+from qdrant_client import AsyncQdrantClient
+from retrieval.context_expansion import expand_with_neighbours
+
+# Every chunk is "b<book_id>c<chunk_nr>" repeated, 10 tokens each
+
+
+def make_book(book_id:int, n_chunks:int) -> list[UploadChunk]:
+    vec = np.zeros(EmbeddingDimension.SMALL.value, dtype=np.float32)
+    return [UploadChunk(uuid_str=str(uuid.uuid4()), book_name=f"book {book_id}", book_id=book_id, chunk_id=i,
+                        content=f" b{book_id}c{i}" * 5, token_count=10, char_count=0,
+                        content_vector=EmbeddingVec(vector=vec, dim=EmbeddingDimension.SMALL))
+            for i in range(n_chunks)]
+
+
+def as_hit(c:UploadChunk, score:float=1.0) -> SearchChunk:
+    return SearchChunk(uuid_str=c.uuid_str, chunk_id=c.chunk_id, book_id=c.book_id, book_name=c.book_name,
+                       content=c.content, token_count=c.token_count, search_score=score)
+
+
+@pytest.fixture()
+async def store_and_books():
+    store = InMemoryVectorStore()
+    books = {1: make_book(1, 10), 2: make_book(2, 3)}
+    for chunks in books.values():
+        await store.upsert_chunks(chunks=chunks)
+    return store, books
+
+
+async def test_overlapping_windows_are_merged(store_and_books):
+    store, books = store_and_books
+    hits = [as_hit(books[1][5]), as_hit(books[2][0]), as_hit(books[1][3])]
+
+    passages = await expand_with_neighbours(chunks=hits, vector_store=store, window=1, token_budget=1000)
+
+    assert len(passages) == 2
+    assert passages[0].uuid_str == hits[0].uuid_str             # ranked by the best chunk in the passage
+    assert passages[0].content == "\n".join(c.content for c in books[1][2:7])
+    assert passages[0].token_count == 50
+    assert passages[1].content == "\n".join(c.content for c in books[2][0:2])       # no chunk -1
+
+
+async def test_token_budget_is_respected(store_and_books):
+    store, books = store_and_books
+    hits = [as_hit(books[1][5]), as_hit(books[1][8])]
+
+    passages = await expand_with_neighbours(chunks=hits, vector_store=store, window=2, token_budget=40)
+
+    # both hits (20), then the best hit's neighbours (20) use up the budget
+    assert sum(p.token_count for p in passages) == 40
+    assert [p.content for p in passages] == ["\n".join(c.content for c in books[1][4:7]), books[1][8].content]
+
+
+async def test_window_zero_is_a_no_op(store_and_books):
+    store, books = store_and_books
+    hits = [as_hit(books[1][5])]
+    assert await expand_with_neighbours(chunks=hits, vector_store=store, window=0, token_budget=1000) == hits
+
+
+async def test_qdrant_get_chunks_by_nrs_in_one_request():
+    store = QdrantVectorStore(settings=get_settings(is_test=True), collection_name="expansion_test")
+    store._client = AsyncQdrantClient(location=":memory:")
+    await store.create_missing_collection(collection_name=store.collection_name)
+    await store.upsert_chunks(chunks=make_book(1, 10) + make_book(2, 3))
+
+    chunks = await store.get_chunks_by_nrs(chunk_nrs_by_book={1: {0, 4, 5, 42}, 2: {2}}, fields=["book_id", "chunk_nr"])
+    assert sorted((c.book_id, c.chunk_id) for c in chunks) == [(1, 0), (1, 4), (1, 5), (2, 2)]
+    assert all(c.content is None for c in chunks)
+    await store.close_conn()
@@ -0,0 +1,45 @@
+from models.vector_db_model import SearchChunk
+from retrieval.context_packing import pack_context
+
+OVERLAP = "and so the ship sailed on into the grey morning, the crew silent at their posts. "
+
+
+def chunk(uuid_str:str, content:str, tokens:int, book_id:int=2701) -> SearchChunk:
+    return SearchChunk(uuid_str=uuid_str, book_id=book_id, content=content, token_count=tokens, search_score=1.0)
+
+
+def test_fills_budget_in_rank_order_skipping_chunks_that_dont_fit():
+    chunks = [chunk("a", "first", 300), chunk("b", "huge", 900), chunk("c", "small", 200), chunk("d", "last", 200)]
+    packed = pack_context(chunks, token_budget=700)
+    assert [c.uuid_str for c in packed] == ["a", "c", "d"]
+
+
+def test_best_chunk_is_kept_even_if_over_budget():
+    packed = pack_context([chunk("a", "huge", 5000), chunk("b", "small", 10)], token_budget=1000)
+    assert [c.uuid_str for c in packed] == ["a"]
+
+
+def test_max_chunks():
+    chunks = [chunk(str(i), f"content {i}", 10) for i in range(10)]
+    assert len(pack_context(chunks, token_budget=10_000, max_chunks=4)) == 4
+
+
+def test_duplicates_are_dropped():
+    chunks = [chunk("a", "Call me Ishmael. Some years ago.", 10), chunk("a", "Call me Ishmael. Some years ago.", 10),
+              chunk("b", "Call me Ishmael.", 5)]
+    assert [c.uuid_str for c in pack_context(chunks, token_budget=100)] == ["a"]
+
+
+def test_overlapping_text_is_trimmed():
+    first = "Queequeg raised his harpoon. " + OVERLAP
+    second = OVERLAP + "Ahab stood on the quarter-deck."
+    packed = pack_context([chunk("a", first, 100), chunk("b", second, 100)], token_budget=1000)
+
+    assert packed[0].content == first
+    assert packed[1].content == "Ahab stood on the quarter-deck."
+    assert packed[1].token_count < 100
+
+
+def test_overlap_is_only_trimmed_within_a_book():
+    packed = pack_context([chunk("a", "x " + OVERLAP, 10), chunk("b", OVERLAP + " y", 10, book_id=84)], token_budget=1000)
+    assert packed[1].content == OVERLAP + " y"
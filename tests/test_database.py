@@ -0,0 +1,47 @@
+import asyncpg
+import pytest
+from config.settings import get_settings
+from db.database import create_db_engine
+
+PG_URL = "postgresql+asyncpg://user:pw@localhost:{port}/db"
+
+
+class _ConnectCalled(Exception):
+    pass
+
+
+async def _connect_kwargs(engine, monkeypatch) -> dict:
+    """The kwargs the pool passes to asyncpg.connect, without a server."""
+    calls = []
+    async def fake_connect(*args, **kwargs):
+        calls.append(kwargs)
+        raise _ConnectCalled()
+    monkeypatch.setattr(asyncpg, "connect", fake_connect)
+
+    with pytest.raises(_ConnectCalled):
+        async with engine.connect():
+            pass
+    await engine.dispose()
+    return calls[0]
+
+
+def test_pool_settings():
+    sett = get_settings(is_test=True).model_copy(update={"DB_POOL_SIZE": 7, "DB_MAX_OVERFLOW": 3, "DB_POOL_RECYCLE": 600})
+    engine = create_db_engine(PG_URL.format(port=5432), sett)
+    pool = engine.sync_engine.pool
+
+    assert pool.size() == 7 and pool._max_overflow == 3        # type:ignore
+    assert pool._recycle == 600 and pool._pre_ping                # type:ignore
+    assert engine.echo is False
+
+
+async def test_transaction_pooler_disables_statement_caching(monkeypatch):
+    sett = get_settings(is_test=True).model_copy(update={"DB_PGBOUNCER_TRANSACTION_MODE": None})
+    kwargs = await _connect_kwargs(create_db_engine(PG_URL.format(port=6543), sett), monkeypatch)
+    assert kwargs["statement_cache_size"] == 0
+
+
+async def test_session_pooler_keeps_statement_caching(monkeypatch):
+    sett = get_settings(is_test=True).model_copy(update={"DB_PGBOUNCER_TRANSACTION_MODE": None})
+    kwargs = await _connect_kwargs(create_db_engine(PG_URL.format(port=5432), sett), monkeypatch)
+    assert "statement_cache_size" not in kwargs
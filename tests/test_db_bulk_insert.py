@@ -0,0 +1,66 @@
+from typing import AsyncGenerator
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from db.database import Base
+from db.operations import insert_missing_books_db, insert_missing_book_db
+from models.schema import DBBookMetaData, DBBookChunkStats
+
+
+def make_book(gb_id:int, with_stats:bool=True) -> DBBookMetaData:
+    book = DBBookMetaData(gb_id=gb_id, title=f"title {gb_id}", authors="author", summary="summary")
+    if with_stats:
+        book.chunk_stats = DBBookChunkStats(id=gb_id, config_id_used=1, title=f"title {gb_id}", char_count=100, chunk_count=2,
+                                            token_mean=10.0, token_median=10.0, token_min=5, token_max=15, token_std=7.1,
+                                            token_counts=[5, 15])
+    return book
+
+
+@pytest.fixture()
+async def db() -> AsyncGenerator[tuple[AsyncSession, list[str]], None]:
+    """SQLite session + the SQL statements it sends."""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    statements: list[str] = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda conn, cursor, stmt, *args: statements.append(stmt))
+    event.listen(engine.sync_engine, "commit", lambda conn: statements.append("COMMIT"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    statements.clear()
+
+    async with AsyncSession(engine, expire_on_commit=False) as sess:
+        yield sess, statements
+    await engine.dispose()
+
+
+async def test_bulk_insert_books_and_stats(db):
+    sess, statements = db
+    inserted, _ = await insert_missing_books_db(books=[make_book(1), make_book(2), make_book(3, with_stats=False)], db_sess=sess)
+
+    assert inserted == {1, 2, 3}
+    assert len(statements) == 3             # books INSERT, stats INSERT, COMMIT
+    stats = (await sess.execute(select(DBBookChunkStats))).scalars().all()
+    assert sorted(s.book_meta_fk for s in stats) == [1, 2]
+    assert stats[0].token_counts == [5, 15]
+
+
+async def test_bulk_insert_skips_existing(db):
+    sess, _ = db
+    await insert_missing_books_db(books=[make_book(1)], db_sess=sess)
+    inserted, mess = await insert_missing_books_db(books=[make_book(1), make_book(2)], db_sess=sess)
+
+    assert inserted == {2}
+    assert "Already in DB" in mess
+    assert len((await sess.execute(select(DBBookMetaData))).scalars().all()) == 2
+    assert len((await sess.execute(select(DBBookChunkStats))).scalars().all()) == 2
+
+
+async def test_bulk_insert_round_trips_vs_per_book(db):
+    sess, statements = db
+    for b_id in range(10):
+        await insert_missing_book_db(book_meta=make_book(b_id), db_sess=sess)
+    per_book = len(statements)
+
+    statements.clear()
+    await insert_missing_books_db(books=[make_book(b_id) for b_id in range(10, 20)], db_sess=sess)
+    assert len(statements) == 3 < per_book
@@ -0,0 +1,66 @@
+import base64, time
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import tiktoken
+from pyrate_limiter import Limiter, Rate, Duration, InMemoryBucket, BucketAsyncWrapper
+from config.params import EmbeddingDimension
+from embedding_pipeline import _create_embeddings
+from embedding_providers import AzureOpenAIEmbeddings, HashingEmbeddings
+from ingestion.checkpoints import IngestCheckpoint
+from ingestion.embedding_store import EmbeddingStore
+from rate_limited_llama_embedder import RateLimitedAzureEmbedding
+
+
+async def test_hashing_embeddings_are_deterministic_unit_vectors():
+    provider = HashingEmbeddings(dim=1536)
+    a, b, empty = await provider.embed(["Call me Ishmael.", "Call me Ishmael.", ""], model="any")
+    assert a.dtype == np.float32 and a.shape == (1536,)
+    assert np.array_equal(a, b) and np.array_equal(a, HashingEmbeddings(dim=1536).embed_text("Call me Ishmael."))
+    assert np.isclose(np.linalg.norm(a), 1.0) and np.isclose(np.linalg.norm(empty), 1.0)
+    assert (provider.n_requests, provider.n_texts) == (1, 3)
+
+
+def test_shared_words_are_closer():
+    p = HashingEmbeddings(dim=1536)
+    query = p.embed_text("the white whale")
+    assert query @ p.embed_text("Ahab hunts the white whale across the sea") > query @ p.embed_text("Frankenstein builds his creature")
+
+
+async def test_latency_injection():
+    provider = HashingEmbeddings(dim=256, latency_secs=0.05, jitter_secs=0.01)
+    start = time.perf_counter()
+    await provider.embed(["a"], model="any")
+    assert 0.05 <= time.perf_counter() - start < 0.5
+
+
+async def test_create_embeddings_with_provider_or_openai_client():
+    vecs = await _create_embeddings(embed_client=HashingEmbeddings(dim=3072), model_deployed="any", batches=["a", "b"])
+    assert [v.dim for v in vecs] == [EmbeddingDimension.LARGE] * 2
+
+    class FakeOpenAIEmbeddings:        # the (Async)AzureOpenAI client surface, base64 encoded float32
+        async def create(self, *, input, model, encoding_format):
+            data = base64.b64encode(np.ones(1536, dtype=np.float32).tobytes()).decode()
+            return SimpleNamespace(data=[SimpleNamespace(embedding=data) for _ in input])
+    vecs = await _create_embeddings(embed_client=SimpleNamespace(embeddings=FakeOpenAIEmbeddings()), model_deployed="any", batches=["a"])
+    assert vecs[0].dim == EmbeddingDimension.SMALL and float(vecs[0].vector.sum()) == 1536.0
+
+
+async def test_hashing_vectors_never_reach_the_azure_store_key(tmp_path):
+    try:
+        tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:
+        pytest.skip(f"batching needs the cl100k_base encoding (downloaded on first use): {exc}")
+    provider = HashingEmbeddings(dim=1536)
+    limiter = lambda: Limiter(BucketAsyncWrapper(InMemoryBucket([Rate(1_000_000, Duration.MINUTE)])))
+    embedder = RateLimitedAzureEmbedding(embed_client=provider, deployment_name="text-embedding-3-small", tok_limiter=limiter(),
+                                         req_limiter=limiter(), batch_size=200, embed_dim_value=1536, book_id=84,
+                                         checkpoint=IngestCheckpoint(tmp_path / "cp.sqlite"), embedding_store=EmbeddingStore(tmp_path / "emb.sqlite"))
+    texts = ["Call me Ishmael.", "the white whale"]
+    await embedder.aget_embedding_vecs(texts)
+    assert embedder.store_key == "hashing-v1:1536:2" != AzureOpenAIEmbeddings(None).model_key("text-embedding-3-small")
+
+    store = EmbeddingStore(tmp_path / "emb.sqlite")         # reopened like a later Azure ingestion would
+    assert store.get_many("text-embedding-3-small", 1536, texts) == [None, None]
+    assert all(v is not None for v in store.get_many(embedder.store_key, 1536, texts))
+    assert IngestCheckpoint(tmp_path / "cp.sqlite").get_embeddings(84, "text-embedding-3-small", texts) == [None, None]
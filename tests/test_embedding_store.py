@@ -0,0 +1,87 @@
+import threading
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import tiktoken
+from pyrate_limiter import Limiter, Rate, Duration, InMemoryBucket, BucketAsyncWrapper
+from config.params import EmbeddingDimension
+from ingestion.checkpoints import IngestCheckpoint
+from ingestion.embedding_store import EmbeddingStore
+from models.vector_db_model import EmbeddingVec
+from rate_limited_llama_embedder import RateLimitedAzureEmbedding
+
+
+def unit_vec(seed:int, dim:int=1536) -> EmbeddingVec:
+    v = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return EmbeddingVec(vector=v / np.linalg.norm(v), dim=EmbeddingDimension(dim))
+
+
+def test_roundtrip_float16(tmp_path):
+    store = EmbeddingStore(tmp_path / "emb.sqlite")
+    vecs = [unit_vec(i) for i in range(3)]
+    store.put_many("text-embedding-3-small", ["a", "b", "c"], vecs)
+
+    got = store.get_many("text-embedding-3-small", 1536, ["c", "missing", "a", "a"])
+    assert got[1] is None and got[0].vector.dtype == np.float32        # type:ignore
+    for stored, orig in [(got[0], vecs[2]), (got[2], vecs[0]), (got[3], vecs[0])]:
+        assert float(stored.vector @ orig.vector) > 0.9999             # type:ignore
+    assert (store.hits, store.misses) == (3, 1)
+
+
+def test_keyed_by_model_and_dim(tmp_path):
+    store = EmbeddingStore(tmp_path / "emb.sqlite", dtype="float32")
+    store.put_many("small", ["a"], [unit_vec(0)])
+    store.put_many("large", ["a"], [unit_vec(1, dim=3072)])
+    assert store.get_many("other", 1536, ["a"]) == [None]
+    assert np.array_equal(store.get_many("small", 1536, ["a"])[0].vector, unit_vec(0).vector)       # type:ignore
+    assert store.get_many("large", 3072, ["a"])[0].dim == EmbeddingDimension.LARGE                   # type:ignore
+    assert len(EmbeddingStore(tmp_path / "emb.sqlite")) == 2            # persisted
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded: list[str] = []
+
+    async def create(self, *, input:list[str], model:str, encoding_format:str):
+        self.embedded.extend(input)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=unit_vec(len(t)).to_list()) for t in input])
+
+
+def make_embedder(embeddings, store:EmbeddingStore, checkpoint:IngestCheckpoint|None=None, book_id:int|None=None):
+    limiter = lambda: Limiter(BucketAsyncWrapper(InMemoryBucket([Rate(1_000_000, Duration.MINUTE)])))
+    return RateLimitedAzureEmbedding(embed_client=SimpleNamespace(embeddings=embeddings), deployment_name="text-embedding-3-small",
+                                     tok_limiter=limiter(), req_limiter=limiter(), batch_size=200, embed_dim_value=1536,
+                                     embedding_store=store, checkpoint=checkpoint, book_id=book_id)
+
+
+async def test_second_collection_build_hits_the_store(tmp_path):
+    try:
+        tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:
+        pytest.skip(f"batching needs the cl100k_base encoding (downloaded on first use): {exc}")
+    store = EmbeddingStore(tmp_path / "emb.sqlite")
+    texts = [f"sentence {i} of the book" for i in range(20)]
+
+    first = CountingEmbeddings()
+    await make_embedder(first, store, IngestCheckpoint(tmp_path / "cp.sqlite"), book_id=84).aget_embedding_vecs(texts)
+    assert first.embedded == texts
+
+    second = CountingEmbeddings()           # e.g. building another collection variant over the same book
+    vecs = await make_embedder(second, store).aget_embedding_vecs(texts[5:] + ["a new chunk"])
+    assert second.embedded == ["a new chunk"]
+    assert len(vecs) == 16 and all(v is not None for v in vecs)
+
+
+async def test_store_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    try:
+        tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:
+        pytest.skip(f"batching needs the cl100k_base encoding (downloaded on first use): {exc}")
+    store = EmbeddingStore(tmp_path / "emb.sqlite")
+    threads = []
+    for name in ("get_many", "put_many"):
+        method = getattr(store, name)
+        monkeypatch.setattr(store, name, lambda *args, _m=method: threads.append(threading.current_thread()) or _m(*args))
+
+    await make_embedder(CountingEmbeddings(), store).aget_embedding_vecs(["a", "b"])
+    assert len(threads) == 2 and threading.main_thread() not in threads
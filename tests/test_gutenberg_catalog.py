@@ -0,0 +1,110 @@
+import asyncio, gzip, shutil, time
+from pathlib import Path
+import httpx
+import pytest
+from ingestion.gutenberg_catalog import GutenbergCatalog, import_pg_catalog_csv, _parse_person
+from ingestion.gutendex_client import GutendexClient
+
+SAMPLE_CSV = Path(__file__).parent / "data" / "pg_catalog_sample.csv"
+
+
+@pytest.fixture()
+def catalog(tmp_path):
+    db_p = tmp_path / "catalog.sqlite"
+    assert import_pg_catalog_csv(SAMPLE_CSV, db_p) == 9          # the audio book is skipped
+    cat = GutenbergCatalog(db_p)
+    yield cat
+    cat.close()
+
+
+def test_book_as_gutendex_meta(catalog):
+    book = catalog.get_book(84)
+    assert book is not None
+    assert book.title == "Frankenstein; Or, The Modern Prometheus"
+    assert book.authors == [{"name": "Shelley, Mary Wollstonecraft", "birth_year": 1797, "death_year": 1851}]
+    assert book.authors_as_str() == "Shelley, Mary Wollstonecraft"
+    assert book.languages == ["en"]
+    assert "Gothic fiction" in book.subjects
+    assert catalog.get_book(25990) is None and catalog.get_book(999999) is None
+
+
+def test_roles_and_multiline_titles(catalog):
+    book = catalog.get_book(17489)
+    assert book.title == "Les misérables Tome I Fantine"
+    assert [a["name"] for a in book.authors] == ["Hugo, Victor"]
+    assert [e["name"] for e in book.editors] == ["Brière, Gustave"]
+    assert catalog.get_book(10).authors == []
+
+
+def test_parse_person():
+    assert _parse_person("Kennedy, John F. (John Fitzgerald), 1917-1963")[0]["name"] == "Kennedy, John F. (John Fitzgerald)"
+    assert _parse_person("Homer, 751? BCE-651? BCE")[0] == {"name": "Homer", "birth_year": 751, "death_year": 651}
+    assert _parse_person("Anonymous") == ({"name": "Anonymous", "birth_year": None, "death_year": None}, None)
+
+
+def test_pages_by_id(catalog):
+    page_1 = catalog.get_page(1, page_size=4)
+    assert [b.id for b in page_1] == [1, 3, 7, 10]
+    assert [b.id for b in catalog.get_page(2, page_size=4)] == [11, 84, 1661, 2701]
+    assert [b.id for b in catalog.get_page(3, page_size=4)] == [17489]
+    assert catalog.get_page(0) == [] and catalog.get_page(9) == []
+
+
+def test_gzipped_csv_and_reimport(tmp_path):
+    gz_p = tmp_path / "pg_catalog.csv.gz"
+    with open(SAMPLE_CSV, "rb") as src, gzip.open(gz_p, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    db_p = tmp_path / "catalog.sqlite"
+    assert import_pg_catalog_csv(gz_p, db_p) == 9
+    assert import_pg_catalog_csv(gz_p, db_p) == 9         # replaces the old file
+    assert len(GutenbergCatalog(db_p)) == 9
+
+
+def test_lookup_is_sub_millisecond(catalog):
+    start = time.perf_counter()
+    for _ in range(1000):
+        catalog.get_book(2701)
+    assert (time.perf_counter() - start) / 1000 < 1e-3
+
+
+async def test_gutendex_client_uses_catalog_first(catalog):
+    requested = []
+    def handler(request:httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        return httpx.Response(404, json={"detail": "Not found."})
+    client = GutendexClient(base_url="https://gutendex.test", transport=httpx.MockTransport(handler), catalog=catalog)
+
+    assert (await client.get_book(2701)).title == "Moby Dick; Or, The Whale"
+    assert len(await client.get_page(1)) == 9
+    assert requested == []
+    with pytest.raises(httpx.HTTPStatusError):          # not in the catalogue -> Gutendex
+        await client.get_book(123456)
+    assert requested == ["/books/123456/"]
+    await client.aclose()
+
+
+async def test_summaries_are_fetched_in_the_background_into_the_catalog(catalog, tmp_path):
+    requested = []
+    def handler(request:httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        if request.url.path == "/books/84/":
+            return httpx.Response(200, json={**catalog.get_book(84).model_dump(), "summaries": ["A scientist creates life."], "download_count": 9})
+        raise httpx.ConnectError("offline")
+    client = GutendexClient(base_url="https://gutendex.test", transport=httpx.MockTransport(handler), catalog=catalog)
+
+    assert (await client.get_book(84, with_summaries=True)).summaries == []        # local, no wait on Gutendex
+    assert (await client.get_book(84)).summaries == []                              # browse/lookups don't fetch
+    await asyncio.gather(*client._summary_tasks.values())
+    book = await client.get_book(84, with_summaries=True)
+    assert book.summaries == ["A scientist creates life."] and book.download_count == 9 and requested == ["/books/84/"]
+    assert catalog.get_page(2, page_size=4)[1] == book
+
+    await client.get_book(2701, with_summaries=True)         # Gutendex unreachable -> tried once pr. ttl
+    await asyncio.gather(*client._summary_tasks.values())
+    assert (await client.get_book(2701, with_summaries=True)).summaries == []
+    assert requested == ["/books/84/", "/books/2701/"] and not client._summary_tasks
+    await client.aclose()
+
+    db_p = tmp_path / "catalog.sqlite"                       # a re-import keeps the fetched summaries
+    assert import_pg_catalog_csv(SAMPLE_CSV, db_p) == 9
+    assert GutenbergCatalog(db_p).get_book(84) == book
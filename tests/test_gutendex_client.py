@@ -0,0 +1,98 @@
+import asyncio
+import httpx
+import pytest
+from ingestion.gutendex_client import GutendexClient, TTLCache
+
+
+def gb_book(gb_id:int) -> dict:
+    return {"id": gb_id, "title": f"Book {gb_id}", "summaries": [], "subjects": [], "languages": ["en"],
+            "authors": [{"name": "Shelley, Mary Wollstonecraft"}], "editors": [], "download_count": 1, "formats": {}, "copyright": False}
+
+
+class FakeGutendex:
+    """MockTransport handler counting the requests pr. path."""
+    def __init__(self, delay:float=0):
+        self.requests: list[str] = []
+        self.delay = delay
+
+    async def __call__(self, request:httpx.Request) -> httpx.Response:
+        self.requests.append(str(request.url))
+        await asyncio.sleep(self.delay)
+        if request.url.path == "/books/":
+            page = int(request.url.params["page"])
+            return httpx.Response(200, json={"count": 64, "results": [gb_book(page * 100 + i) for i in range(32)]})
+        gb_id = int(request.url.path.strip("/").split("/")[-1])
+        if gb_id == 404:
+            return httpx.Response(404, json={"detail": "Not found."})
+        return httpx.Response(200, json=gb_book(gb_id))
+
+
+@pytest.fixture()
+async def gutendex():
+    fake = FakeGutendex()
+    client = GutendexClient(base_url="https://gutendex.test", transport=httpx.MockTransport(fake))
+    yield client, fake
+    await client.aclose()
+
+
+async def test_book_is_cached(gutendex):
+    client, fake = gutendex
+    assert (await client.get_book(84)).id == 84
+    assert (await client.get_book(84)).title == "Book 84"
+    assert len(fake.requests) == 1
+
+
+async def test_page_is_cached_and_fills_book_cache(gutendex):
+    client, fake = gutendex
+    page = await client.get_page(1)
+    assert len(page) == 32 and page[0].id == 100
+    assert (await client.get_page(1))[:5] == page[:5]
+    assert (await client.get_book(131)).id == 131
+    assert len(fake.requests) == 1
+
+
+async def test_http_errors_are_raised_and_not_cached(gutendex):
+    client, fake = gutendex
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.get_book(404)
+    assert len(fake.requests) == 2
+
+
+async def test_concurrent_requests_share_one_fetch():
+    fake = FakeGutendex(delay=0.05)
+    client = GutendexClient(base_url="https://gutendex.test", transport=httpx.MockTransport(fake))
+    books = await asyncio.gather(*(client.get_book(7) for _ in range(10)))
+    assert {b.id for b in books} == {7}
+    assert len(fake.requests) == 1
+    await client.aclose()
+
+
+
+async def test_cancelled_first_caller_doesnt_fail_the_others():
+    fake = FakeGutendex(delay=0.05)
+    client = GutendexClient(base_url="https://gutendex.test", transport=httpx.MockTransport(fake))
+    first = asyncio.create_task(client.get_book(7))
+    await asyncio.sleep(0.01)           # first caller's fetch is in flight
+    second = asyncio.create_task(client.get_book(7))
+    await asyncio.sleep(0.01)
+    first.cancel()                      # e.g. its client disconnected
+
+    assert (await second).id == 7
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert len(fake.requests) == 1 and client._inflight == {}
+    await client.aclose()
+
+def test_ttl_cache_expires_and_evicts(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("ingestion.gutendex_client.time.monotonic", lambda: now[0])
+    cache = TTLCache(ttl_secs=10, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)                   # evicts the least recently used, b
+    assert cache.get("b") is None and cache.get("a") == 1
+
+    now[0] = 11
+    assert cache.get("a") is None and len(cache) == 1
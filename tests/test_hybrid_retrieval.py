@@ -0,0 +1,94 @@
+import uuid
+import numpy as np
+import pytest
+from config.params import EmbeddingDimension
+from config.settings import get_settings
+from db.qdrant_vector_store import QdrantVectorStore
+from models.vector_db_model import UploadChunk, EmbeddingVec, SearchChunk
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import VectorParams, Distance
+from retrieval.bm25 import tokenize, bm25_sparse_vector
+from retrieval.fusion import reciprocal_rank_fusion
+
+# Keyword search + RRF fusion, Qdrant runs in local in-process mode (no server needed)
+
+CONTENTS = [
+    "Call me Ishmael. Some years ago - never mind how long precisely - having little or no money in my purse.",
+    "Queequeg was a native of Kokovoko, an island far away to the West and South.",
+    "It was the best of times, it was the worst of times, it was the age of wisdom.",
+    "The whale, the whale! Ishmael saw the whale breach, and Queequeg raised his harpoon.",
+]
+
+
+def make_chunk(content:str, chunk_id:int) -> UploadChunk:
+    vec = np.random.default_rng(chunk_id).random(EmbeddingDimension.SMALL.value, dtype=np.float32)
+    return UploadChunk(uuid_str=str(uuid.uuid4()), book_name="Moby Dick; Or, The Whale", book_id=2701,
+                       chunk_id=chunk_id, content=content, token_count=1, char_count=len(content),
+                       content_vector=EmbeddingVec(vector=vec, dim=EmbeddingDimension.SMALL))
+
+
+def hit(uuid_str:str, score:float=1.0) -> SearchChunk:
+    return SearchChunk(uuid_str=uuid_str, search_score=score)
+
+
+@pytest.fixture()
+async def local_qdrant():
+    store = QdrantVectorStore(settings=get_settings(is_test=True), collection_name="hybrid_test")
+    store._client = AsyncQdrantClient(location=":memory:")
+    await store.create_missing_collection(collection_name=store.collection_name)
+    try:
+        yield store
+    finally:
+        await store.close_conn()
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("Call me Ishmael. The whale!") == ["call", "ishmael", "whale"]
+
+
+def test_bm25_sparse_vector_saturates_term_frequency():
+    indices, values = bm25_sparse_vector("whale " * 50 + "harpoon")
+    weights = dict(zip(indices, values))
+    assert len(weights) == 2
+    assert max(values) < 2.2           # tf saturates at k1 + 1
+
+
+def test_rrf_rewards_chunks_found_by_both_searches():
+    dense = [hit("a"), hit("b"), hit("c")]
+    keyword = [hit("d"), hit("c"), hit("a")]
+    fused = reciprocal_rank_fusion([dense, keyword], k=60)
+
+    assert [c.uuid_str for c in fused][:2] == ["a", "c"]
+    assert len(fused) == 4
+    assert fused[0].search_score == pytest.approx(1/61 + 1/63)
+
+
+def test_rrf_top_n():
+    fused = reciprocal_rank_fusion([[hit(str(i)) for i in range(10)]], top_n=3)
+    assert [c.uuid_str for c in fused] == ["0", "1", "2"]
+
+
+async def test_qdrant_keyword_search_ranks_named_entities(local_qdrant:QdrantVectorStore):
+    chunks = [make_chunk(c, i) for i, c in enumerate(CONTENTS)]
+    await local_qdrant.upsert_chunks(chunks=chunks)
+
+    hits = await local_qdrant.search_by_keywords(query="Who is Queequeg?", k=3)
+    assert {h.chunk_id for h in hits} == {1, 3}
+    assert all(h.search_score > 0 for h in hits)
+
+    hits = await local_qdrant.search_by_keywords(query="Queequeg Kokovoko", k=1, fields=["chunk_nr"])
+    assert hits[0].chunk_id == 1 and hits[0].content is None
+
+    assert await local_qdrant.search_by_keywords(query="who is it", k=3) == []     # only stopwords
+
+
+async def test_qdrant_keyword_search_falls_back_without_sparse_vectors():
+    store = QdrantVectorStore(settings=get_settings(is_test=True), collection_name="dense_only")
+    store._client = AsyncQdrantClient(location=":memory:")
+    await store._client.create_collection(collection_name="dense_only",         # collection from before hybrid search
+                                          vectors_config=VectorParams(size=EmbeddingDimension.SMALL.value, distance=Distance.COSINE))
+    await store.upsert_chunks(chunks=[make_chunk(c, i) for i, c in enumerate(CONTENTS)])
+
+    hits = await store.search_by_keywords(query="Kokovoko", k=3)
+    assert [h.chunk_id for h in hits] == [1]
+    await store.close_conn()
@@ -0,0 +1,119 @@
+import threading
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import tiktoken
+from pyrate_limiter import Limiter, Rate, Duration, InMemoryBucket, BucketAsyncWrapper
+from config.params import EmbeddingDimension
+from embedding_pipeline import batch_texts_by_tokens
+from ingestion.checkpoints import IngestCheckpoint, chunk_point_id
+from models.vector_db_model import EmbeddingVec
+from rate_limited_llama_embedder import RateLimitedAzureEmbedding
+
+
+class FakeEmbeddings:
+    """embeddings.create of the OpenAI client, fails on the call nr. fail_on_call"""
+    def __init__(self, fail_on_call:int|None=None):
+        self.fail_on_call = fail_on_call
+        self.embedded: list[str] = []
+        self.n_calls = 0
+
+    async def create(self, *, input:list[str], model:str, encoding_format:str):
+        self.n_calls += 1
+        if self.n_calls == self.fail_on_call:
+            raise ConnectionError("embedding endpoint down")
+        self.embedded.extend(input)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=np.full(1536, len(t), dtype=np.float32).tolist()) for t in input])
+
+
+def make_embedder(embeddings:FakeEmbeddings, checkpoint:IngestCheckpoint|None, book_id:int=84) -> RateLimitedAzureEmbedding:
+    limiter = lambda: Limiter(BucketAsyncWrapper(InMemoryBucket([Rate(1_000_000, Duration.MINUTE)])))
+    return RateLimitedAzureEmbedding(embed_client=SimpleNamespace(embeddings=embeddings), deployment_name="text-embedding-3-small",
+                                     tok_limiter=limiter(), req_limiter=limiter(), batch_size=20, embed_dim_value=1536,
+                                     checkpoint=checkpoint, book_id=book_id)
+
+
+@pytest.fixture()
+def cl100k():
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:
+        pytest.skip(f"batching needs the cl100k_base encoding (downloaded on first use): {exc}")
+
+
+TEXTS = [f"chunk number {i} of the book" for i in range(10)]
+
+
+def test_chunk_point_id_is_deterministic():
+    a = chunk_point_id(book_id=84, config_id=1, chunk_nr=3, content="It was a dreary night")
+    assert a == chunk_point_id(book_id=84, config_id=1, chunk_nr=3, content="It was a dreary night")
+    assert a != chunk_point_id(book_id=84, config_id=2, chunk_nr=3, content="It was a dreary night")
+    assert a != chunk_point_id(book_id=84, config_id=1, chunk_nr=3, content="It was a dreary night.")
+    assert a != chunk_point_id(book_id=84, config_id=1, chunk_nr=4, content="It was a dreary night")
+
+
+async def test_resume_only_embeds_missing_texts(tmp_path, cl100k):
+    cp = IngestCheckpoint(tmp_path / "cp.sqlite")
+    batches = batch_texts_by_tokens(texts=TEXTS, max_tokens_per_request=20)
+    assert len(batches) > 2
+    n_done = len(batches[0]) + len(batches[1])
+
+    failing = FakeEmbeddings(fail_on_call=3)
+    with pytest.raises(ConnectionError):
+        await make_embedder(failing, cp).aget_embedding_vecs(TEXTS)
+    assert failing.embedded == TEXTS[:n_done]           # two batches done before the failure
+
+    cp = IngestCheckpoint(tmp_path / "cp.sqlite")      # e.g. a new process
+    retry = FakeEmbeddings()
+    vecs = await make_embedder(retry, cp).aget_embedding_vecs(TEXTS)
+    assert retry.embedded == TEXTS[n_done:]
+    assert [float(v.vector[0]) for v in vecs] == [float(len(t)) for t in TEXTS]
+
+    other_book = FakeEmbeddings()                       # checkpoints are pr. book
+    await make_embedder(other_book, cp, book_id=1).aget_embedding_vecs(TEXTS[:2])
+    assert other_book.embedded == TEXTS[:2]
+
+
+async def test_duplicate_texts_embedded_once(tmp_path, cl100k):
+    embeddings = FakeEmbeddings()
+    vecs = await make_embedder(embeddings, IngestCheckpoint(tmp_path / "cp.sqlite")).aget_embedding_vecs(["a", "b", "a"])
+    assert embeddings.embedded == ["a", "b"] and len(vecs) == 3
+
+
+async def test_no_checkpoint_embeds_everything(cl100k):
+    embeddings = FakeEmbeddings()
+    await make_embedder(embeddings, None).aget_embedding_vecs(TEXTS)
+    assert embeddings.embedded == TEXTS
+
+
+class ThreadRecordingCheckpoint(IngestCheckpoint):
+    def __init__(self, path):
+        super().__init__(path)
+        self.threads: list[threading.Thread] = []
+
+    def get_embeddings(self, *args):
+        self.threads.append(threading.current_thread())
+        return super().get_embeddings(*args)
+
+    def put_embeddings(self, *args):
+        self.threads.append(threading.current_thread())
+        super().put_embeddings(*args)
+
+
+async def test_checkpoint_io_runs_off_the_event_loop(tmp_path, cl100k):
+    cp = ThreadRecordingCheckpoint(tmp_path / "cp.sqlite")
+    await make_embedder(FakeEmbeddings(), cp).aget_embedding_vecs(TEXTS)
+    assert len(cp.threads) > 1 and threading.main_thread() not in cp.threads
+
+
+def test_unfinished_books(tmp_path):
+    cp = IngestCheckpoint(tmp_path / "cp.sqlite")
+    cp.start_book(84, config_id=1)
+    cp.start_book(2701, config_id=1)
+    cp.put_embeddings(84, "m", TEXTS[:1], [EmbeddingVec(vector=np.ones(1536), dim=EmbeddingDimension.SMALL)])
+    cp.finish_book(2701)
+    assert IngestCheckpoint(tmp_path / "cp.sqlite").unfinished_book_ids() == {84}
+
+    cp.finish_book(84)
+    assert cp.unfinished_book_ids() == set() and cp.get_embeddings(84, "m", TEXTS[:1]) == [None]
+
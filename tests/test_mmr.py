@@ -0,0 +1,73 @@
+import uuid
+import numpy as np
+import pytest
+from config.params import EmbeddingDimension
+from config.settings import get_settings
+from db.qdrant_vector_store import QdrantVectorStore
+from models.vector_db_model import UploadChunk, EmbeddingVec, SearchChunk
+from qdrant_client import AsyncQdrantClient
+from retrieval.mmr import mmr_select
+
+DIM = EmbeddingDimension.SMALL.value
+
+
+def unit(v:np.ndarray) -> np.ndarray:
+    return (v / np.linalg.norm(v)).astype(np.float32)
+
+
+@pytest.fixture()
+def query_and_hits() -> tuple[np.ndarray, list[SearchChunk]]:
+    """3 near-duplicates of the best passage, then 2 distinct but slightly less relevant passages."""
+    rng = np.random.default_rng(0)
+    query = unit(rng.normal(size=DIM))
+    passage = unit(query + 0.3 * unit(rng.normal(size=DIM)))
+    dupes = [unit(passage + 0.01 * unit(rng.normal(size=DIM))) for _ in range(3)]
+    others = [unit(query + 0.5 * unit(rng.normal(size=DIM))) for _ in range(2)]
+
+    vecs = dupes + others
+    hits = [SearchChunk(uuid_str=f"dupe{i}" if i < 3 else f"other{i}", search_score=float(v @ query), vector=v)
+            for i, v in enumerate(vecs)]
+    hits.sort(key=lambda c: c.search_score, reverse=True)
+    return query, hits
+
+
+def test_mmr_skips_near_duplicates(query_and_hits):
+    query, hits = query_and_hits
+    picked = mmr_select(query, hits, k=3, lambda_mult=0.5)
+    assert picked[0].uuid_str == hits[0].uuid_str
+    assert sum(c.uuid_str.startswith("dupe") for c in picked) == 1
+
+
+def test_mmr_lambda_one_is_relevance_order(query_and_hits):
+    query, hits = query_and_hits
+    assert mmr_select(query, hits, k=3, lambda_mult=1.0) == hits[:3]
+
+
+def test_mmr_k_larger_than_hits(query_and_hits):
+    query, hits = query_and_hits
+    assert mmr_select(query, hits, k=10) == hits
+
+
+def test_vector_is_not_serialized(query_and_hits):
+    _, hits = query_and_hits
+    assert "vector" not in hits[0].model_dump_json()
+
+
+async def test_qdrant_search_with_vectors():
+    store = QdrantVectorStore(settings=get_settings(is_test=True), collection_name="mmr_test")
+    store._client = AsyncQdrantClient(location=":memory:")
+    await store.create_missing_collection(collection_name=store.collection_name)       # dense + bm25 sparse vectors
+    vecs = [unit(np.random.default_rng(i).normal(size=DIM)) for i in range(3)]
+    await store.upsert_chunks(chunks=[UploadChunk(uuid_str=str(uuid.uuid4()), book_name="b", book_id=1, chunk_id=i,
+                                                  content=f"chunk {i}", token_count=2, char_count=7,
+                                                  content_vector=EmbeddingVec(vector=v, dim=EmbeddingDimension.SMALL))
+                                      for i, v in enumerate(vecs)])
+
+    query = EmbeddingVec(vector=vecs[1], dim=EmbeddingDimension.SMALL)
+    hits = await store.search_by_embedding(embed_query_vector=query, filter=None, k=3, with_vectors=True)
+    assert hits[0].chunk_id == 1
+    assert isinstance(hits[0].vector, np.ndarray) and np.allclose(hits[0].vector, vecs[1], atol=1e-6)
+
+    hits = await store.search_by_embedding(embed_query_vector=query, filter=None, k=3)
+    assert hits[0].vector is None
+    await store.close_conn()
@@ -0,0 +1,57 @@
+import httpx
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from openai import AsyncAzureOpenAI, AzureOpenAI, RateLimitError
+from benchmarks.load_rag_query import histogram_quantile, parse_stage_buckets, stage_percentiles
+from benchmarks.openai_stub_server import StubConfig, create_stub_app
+from embedding_providers import HashingEmbeddings
+from retrieval.query_expansion import QueryExpansions
+from retrieval.retrieve import AnswerChunk, RankedChunks
+
+FAST = StubConfig(embed_latency_ms=0, llm_latency_ms=0, latency_sigma=0)
+
+
+def llm_client(config:StubConfig=FAST) -> AzureOpenAI:
+    return AzureOpenAI(azure_endpoint="http://testserver", api_key="x", api_version="2024-12-01-preview", max_retries=0,
+                       http_client=TestClient(create_stub_app(config)))
+
+
+async def test_embeddings_through_the_azure_sdk():
+    client = AsyncAzureOpenAI(azure_endpoint="http://stub", api_key="x", api_version="2024-12-01-preview",
+                              http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=create_stub_app(FAST))))
+    resp = await client.embeddings.create(input=["Call me Ishmael.", "the white whale"], model="text-embedding-3-small")
+    expected = HashingEmbeddings(dim=1536).embed_text("the white whale")
+    assert len(resp.data) == 2 and np.allclose(resp.data[1].embedding, expected)
+
+
+def test_parse_rerank_answer_and_expansion_formats():
+    client = llm_client()
+    prompt = "Query: who is Ahab? Documents: --- START #0, Document uuid:aaa ---\nAhab\n--- END #0 ---  --- START #1, Document uuid:bbb ---\nwhale"
+    ranked = client.responses.parse(model="gpt", input=[{"role": "user", "content": prompt}], text_format=RankedChunks).output_parsed
+    assert [rc.uuid_str for rc in ranked.ranked_chunks] == ["aaa", "bbb"] and all(0 <= rc.score <= 10 for rc in ranked.ranked_chunks)     # type:ignore
+
+    resp = client.responses.parse(model="gpt", input=[{"role": "user", "content": "Question: who is Ahab?"}], text_format=AnswerChunk)
+    again = client.responses.parse(model="gpt", input=[{"role": "user", "content": "Question: who is Ahab?"}], text_format=AnswerChunk)
+    assert resp.output_parsed.answer and resp.output_parsed == again.output_parsed and resp.usage.input_tokens > 0        # type:ignore
+
+    assert isinstance(client.responses.parse(model="gpt", input="Question: x", text_format=QueryExpansions).output_parsed, QueryExpansions)
+
+
+def test_injected_rate_limit():
+    client = llm_client(StubConfig(embed_latency_ms=0, llm_latency_ms=0, latency_sigma=0, rate_limit_rate=1.0, retry_after_secs=2))
+    with pytest.raises(RateLimitError) as exc_info:
+        client.responses.parse(model="gpt", input="hi", text_format=QueryExpansions)
+    assert exc_info.value.response.headers["retry-after"] == "2"
+
+
+def test_stage_percentiles_from_scraped_buckets():
+    assert histogram_quantile(0.5, [(0.1, 0), (0.2, 10), (float("inf"), 10)]) == pytest.approx(0.15)
+    assert histogram_quantile(0.99, [(0.1, 5), (float("inf"), 10)]) == 0.1
+
+    scrape = lambda n: (f'rag_stage_seconds_bucket{{le="0.5",stage="search"}} {n}\n'
+                        f'rag_stage_seconds_bucket{{le="1.0",stage="search"}} {2 * n}\n'
+                        f'rag_stage_seconds_bucket{{le="+Inf",stage="search"}} {2 * n}\n')
+    header = "# TYPE rag_stage_seconds histogram\n"
+    n, (p50, p95, p99) = stage_percentiles(parse_stage_buckets(header + scrape(3)), parse_stage_buckets(header + scrape(8)))["search"]
+    assert n == 10 and p50 == pytest.approx(0.5) and p95 == pytest.approx(0.95) and p99 == pytest.approx(0.99)
@@ -0,0 +1,95 @@
+import gzip
+import httpx
+import pytest
+from ingestion.book_cache import BookCache, BookCacheCorruptError
+from ingestion.book_loader import stream_book_paragraphs
+from ingestion.gutendex_client import GutendexClient
+from ingestion.preprocess_book import GutenbergTextCleaner, clean_headers, iter_book_paragraphs
+from models.api_response_model import GBBookMeta
+
+BOOK = ("The Project Gutenberg eBook of Frankenstein\r\n\r\nThis ebook is for the use of anyone anywhere.\r\n\r\n"
+        "*** START OF THE PROJECT GUTENBERG EBOOK FRANKENSTEIN; OR, THE MODERN PROMETHEUS ***\r\n\r\n"
+        "Letter 1\r\n\r\n"
+        "You will rejoice to hear that no disaster has accompanied\r\nthe commencement of an enterprise.\r\n\r\n\r\n"
+        "I am already far north of London.\r\n\r\n"
+        "*** END OF THE PROJECT GUTENBERG EBOOK FRANKENSTEIN; OR, THE MODERN PROMETHEUS ***\r\n\r\n"
+        "Updated editions will replace the previous one.\r\n")
+PARAGRAPHS = ["Letter 1",
+              "You will rejoice to hear that no disaster has accompanied\nthe commencement of an enterprise.",
+              "I am already far north of London."]
+
+
+def test_clean_headers():
+    assert clean_headers(raw_book=BOOK) == "\n\n".join(PARAGRAPHS)
+    assert clean_headers(raw_book="No markers in this text") == ""
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 7, 64, 10_000])
+def test_markers_split_across_blocks(block_size):
+    blocks = [BOOK[i:i + block_size] for i in range(0, len(BOOK), block_size)]
+    assert list(iter_book_paragraphs(blocks)) == PARAGRAPHS
+
+
+def test_result_doesnt_depend_on_the_block_size():
+    book = BOOK.replace("I am already", "   Indented para\r\n\r\n  \r\n\tI am already")
+    expected = clean_headers(raw_book=book).split("\n\n")
+    assert "Indented para" in expected
+    for block_size in range(1, len(book) + 1):
+        blocks = [book[i:i + block_size] for i in range(0, len(book), block_size)]
+        assert list(iter_book_paragraphs(blocks)) == expected, block_size
+
+
+def test_paragraphs_are_yielded_before_the_end():
+    cleaner = GutenbergTextCleaner()
+    head = BOOK[:BOOK.index("I am already")]
+    assert list(cleaner.feed(head)) == PARAGRAPHS[:2]
+    assert cleaner.state == "body"
+    assert list(cleaner.feed(BOOK[len(head):])) + list(cleaner.close()) == PARAGRAPHS[2:]
+
+
+def test_old_marker_variants_and_missing_end():
+    old = "header\n***START OF THIS PROJECT GUTENBERG EBOOK MOBY DICK***\nCall me Ishmael.\n*** End of this Project Gutenberg Ebook ***\nlicense"
+    assert clean_headers(raw_book=old) == "Call me Ishmael."
+    assert clean_headers(raw_book="*** START OF THE PROJECT GUTENBERG EBOOK X ***\nCall me Ishmael.") == "Call me Ishmael."
+
+
+def _gb_meta() -> GBBookMeta:
+    return GBBookMeta(id=84, title="Frankenstein", summaries=[], subjects=[], languages=["en"],
+                      authors=[], editors=[], download_count=1, formats={}, copyright=False)
+
+
+async def test_stream_download_into_cache(tmp_path):
+    async def body():
+        for i in range(0, len(BOOK), 5):
+            yield BOOK[i:i + 5].encode("utf-8")
+    transport = httpx.MockTransport(lambda req: httpx.Response(200, headers={"content-type": "text/plain; charset=utf-8"}, content=body()))
+    client = GutendexClient(base_url="https://gutendex.test", transport=transport)
+    cache = BookCache(root=tmp_path)
+
+    paragraphs = await stream_book_paragraphs(url="https://www.gutenberg.test/pg84.txt", gb_meta=_gb_meta(), book_cache=cache, gutendex=client)
+    assert paragraphs == PARAGRAPHS
+    assert cache.get(84) == (BOOK, _gb_meta())          # the raw text is cached
+
+    blocks, meta = cache.open_text(84)                  # type:ignore
+    assert list(iter_book_paragraphs(blocks)) == PARAGRAPHS and meta == _gb_meta()
+    await client.aclose()
+
+
+async def test_failed_download_leaves_no_cache_entry(tmp_path):
+    transport = httpx.MockTransport(lambda req: httpx.Response(404))
+    client = GutendexClient(base_url="https://gutendex.test", transport=transport)
+    cache = BookCache(root=tmp_path)
+    with pytest.raises(httpx.HTTPStatusError):
+        await stream_book_paragraphs(url="https://www.gutenberg.test/pg84.txt", gb_meta=_gb_meta(), book_cache=cache, gutendex=client)
+    assert 84 not in cache and list((tmp_path / "objects").rglob("*")) == []
+    await client.aclose()
+
+
+def test_open_text_verifies_hash(tmp_path):
+    cache = BookCache(root=tmp_path)
+    cache.put(_gb_meta(), BOOK)
+    next((tmp_path / "objects").rglob("*.gz")).write_bytes(gzip.compress(b"tampered"))
+    blocks, _ = cache.open_text(84)                     # type:ignore
+    with pytest.raises(BookCacheCorruptError):
+        list(blocks)
+    assert 84 not in cache
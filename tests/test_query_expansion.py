@@ -0,0 +1,84 @@
+import uuid
+from types import SimpleNamespace
+import httpx
+import numpy as np
+from openai import APITimeoutError
+from config.params import EmbeddingDimension
+from config.settings import get_settings
+from db.fake_vector_store import InMemoryVectorStore
+from db.qdrant_vector_store import QdrantVectorStore
+from models.vector_db_model import UploadChunk, EmbeddingVec
+from qdrant_client import AsyncQdrantClient
+from retrieval.query_expansion import QueryExpansions, expand_query
+
+DIM = EmbeddingDimension.SMALL.value
+
+
+class FakeLLMClient:
+    """Stands in for AzureOpenAI, answers every responses.parse with the given expansions."""
+    def __init__(self, expansions:QueryExpansions|Exception|None):
+        self.calls = []
+        self.responses = SimpleNamespace(parse=self._parse)
+        self._expansions = expansions
+
+    def _parse(self, **kwargs):
+        self.calls.append(kwargs)
+        if isinstance(self._expansions, Exception):
+            raise self._expansions
+        return SimpleNamespace(output_parsed=self._expansions)
+
+
+def make_chunks(n:int) -> list[UploadChunk]:
+    return [UploadChunk(uuid_str=str(uuid.uuid4()), book_name="b", book_id=1, chunk_id=i, content=f"chunk {i}",
+                        token_count=2, char_count=7,
+                        content_vector=EmbeddingVec(vector=np.eye(DIM, dtype=np.float32)[i], dim=EmbeddingDimension.SMALL))
+            for i in range(n)]
+
+
+def query_vec(i:int) -> EmbeddingVec:
+    return EmbeddingVec(vector=np.eye(DIM, dtype=np.float32)[i], dim=EmbeddingDimension.SMALL)
+
+
+def test_expand_query_modes():
+    expansions = QueryExpansions(paraphrases=["who is the captain", "name of the captain", "Who's the captain?", "extra"],
+                                 hypothetical_passage="Captain Ahab stood on the quarter-deck.")
+    client = FakeLLMClient(expansions)
+
+    assert expand_query(query="Who's the captain?", llm_client=client, llm_model="m", mode="none") == []     # type:ignore
+    assert client.calls == []
+
+    multi = expand_query(query="Who's the captain?", llm_client=client, llm_model="m", mode="multi_query", n_paraphrases=3)  # type:ignore
+    assert multi == ["who is the captain", "name of the captain"]          # the query itself is dropped
+    hyde = expand_query(query="Who's the captain?", llm_client=client, llm_model="m", mode="hyde")                # type:ignore
+    assert hyde == ["Captain Ahab stood on the quarter-deck."]
+    both = expand_query(query="Who's the captain?", llm_client=client, llm_model="m", mode="both", n_paraphrases=2)  # type:ignore
+    assert both == ["who is the captain", "name of the captain", "Captain Ahab stood on the quarter-deck."]
+    assert len(client.calls) == 3       # one LLM call pr. expansion
+
+
+def test_expand_query_failed_parse():
+    assert expand_query(query="q", llm_client=FakeLLMClient(None), llm_model="m", mode="both") == []     # type:ignore
+
+
+def test_expand_query_llm_error_searches_the_query_only():
+    timeout = APITimeoutError(request=httpx.Request("POST", "https://llm.test/responses"))
+    assert expand_query(query="q", llm_client=FakeLLMClient(timeout), llm_model="m", mode="both") == []     # type:ignore
+
+
+async def test_qdrant_search_by_embeddings_is_one_batch():
+    store = QdrantVectorStore(settings=get_settings(is_test=True), collection_name="expansion_batch_test")
+    store._client = AsyncQdrantClient(location=":memory:")
+    await store.create_missing_collection(collection_name=store.collection_name)
+    await store.upsert_chunks(chunks=make_chunks(4))
+
+    hit_lists = await store.search_by_embeddings(embed_query_vectors=[query_vec(0), query_vec(2)], k=1)
+    assert [[h.chunk_id for h in hits] for hits in hit_lists] == [[0], [2]]
+    await store.close_conn()
+
+
+async def test_default_search_by_embeddings():
+    store = InMemoryVectorStore()
+    await store.upsert_chunks(chunks=make_chunks(4))
+
+    hit_lists = await store.search_by_embeddings(embed_query_vectors=[query_vec(3), query_vec(1)], k=1)
+    assert [[h.chunk_id for h in hits] for hits in hit_lists] == [[3], [1]]
@@ -0,0 +1,77 @@
+import asyncio, multiprocessing, sqlite3, time
+import pytest
+from pyrate_limiter import BucketFullException, Duration, Rate, RateItem
+from embedding_pipeline import _acquire_budget_async
+from metrics.rag_metrics import rate_limit_budget_remaining
+from rate_limit_buckets import InMemoryWeightedBucket, RedisWeightedBucket, SQLiteWeightedBucket, create_budget_limiter
+
+
+def remaining(budget:str) -> float:
+    return rate_limit_budget_remaining.labels(budget=budget)._value.get()
+
+
+def test_weighted_reservation_and_wait_estimate():
+    bucket = InMemoryWeightedBucket([Rate(1000, Duration.MINUTE)], budget="test_tokens")
+    assert bucket.put(RateItem("tpm", 0, 600)) and bucket.put(RateItem("tpm", 10_000, 300))
+    assert remaining("test_tokens") == 100 and bucket.count() == 900
+
+    assert not bucket.put(RateItem("tpm", 20_000, 500))            # 400 of the 600 reserved at t=0 must expire first
+    assert bucket.failing_rate is not None and bucket.retry_after_ms == 40_000
+    assert remaining("test_tokens") == 100
+
+    assert bucket.put(RateItem("tpm", 60_001, 500))
+    assert bucket.leak(60_001) == 1 and bucket.count() == 800
+
+
+def _reserve_in_process(path:str, n:int, weight:int) -> int:
+    bucket = SQLiteWeightedBucket([Rate(1000, Duration.MINUTE)], budget="test_shared", path=path)
+    return sum(weight for _ in range(n) if bucket.put(RateItem("tpm", int(time.time() * 1000), weight)))
+
+
+def test_sqlite_budget_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / "rate_limits.sqlite")
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        reserved = pool.starmap(_reserve_in_process, [(path, 10, 50)] * 4)
+    assert sum(reserved) == 1000            # 4 workers x 500 tokens wanted, one shared 1000 budget
+    assert SQLiteWeightedBucket([Rate(1000, Duration.MINUTE)], budget="test_shared", path=path).count() == 1000
+
+
+def test_redis_budget_is_shared_between_clients():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    a, b = (RedisWeightedBucket([Rate(100, Duration.SECOND)], budget="test_redis", redis=fakeredis.FakeRedis(server=server)) for _ in range(2))
+    assert a.put(RateItem("rpm", 0, 60)) and not b.put(RateItem("rpm", 1, 60)) and b.put(RateItem("rpm", 2, 40))
+    assert b.retry_after_ms == 0 and a.count() == 100 and b.leak(1002) == 2
+
+
+async def test_acquire_waits_only_until_the_budget_fits():
+    tok_lim = create_budget_limiter(Rate(100, Duration.SECOND), budget="test_tok")
+    req_lim = create_budget_limiter(Rate(1000, Duration.SECOND), budget="test_req")
+    start = time.perf_counter()
+    await _acquire_budget_async(tok_limiter=tok_lim, req_limiter=req_lim, tokens_needed=80)
+    await _acquire_budget_async(tok_limiter=tok_lim, req_limiter=req_lim, tokens_needed=50)
+    assert 0.5 < time.perf_counter() - start < 1.5
+    with pytest.raises(BucketFullException):
+        await tok_lim.try_acquire_async("tpm", weight=80)
+    assert remaining("test_tok") == 50
+
+
+async def test_sqlite_reservation_waiting_on_a_lock_doesnt_block_the_loop(tmp_path):
+    path = tmp_path / "rate_limits.sqlite"
+    limiter = create_budget_limiter(Rate(1000, Duration.MINUTE), budget="test_locked", backend="sqlite", sqlite_path=path)
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")          # another worker holding the write lock
+    asyncio.get_running_loop().call_later(0.3, blocker.execute, "ROLLBACK")
+
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+    tick_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    assert await limiter.try_acquire_async("tpm", weight=100)
+    tick_task.cancel()
+    assert time.perf_counter() - start >= 0.25 and ticks >= 10         # the loop ran while the reservation waited
+    blocker.close()
@@ -0,0 +1,84 @@
+import hashlib
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import tiktoken
+from config.settings import get_settings
+from db.fake_vector_store import InMemoryVectorStore
+from ingestion.checkpoints import IngestCheckpoint
+from models.api_response_model import GBBookMeta
+from models.vector_db_model import IngestDiffReport
+from retrieval.bm25 import BM25Index
+from retrieval.book_router import BookRouter
+from vector_store_utils import async_upload_book_to_index
+
+
+class HashEmbeddings:
+    """Deterministic pseudo random unit vectors pr. text, so the semantic splitter finds breakpoints"""
+    def __init__(self):
+        self.n_texts = 0
+
+    async def create(self, *, input:list[str], model:str, encoding_format:str):
+        self.n_texts += len(input)
+        vecs = []
+        for t in input:
+            v = np.random.default_rng(int(hashlib.sha256(t.encode()).hexdigest()[:8], 16)).normal(size=1536)
+            vecs.append(SimpleNamespace(embedding=(v / np.linalg.norm(v)).astype(np.float32).tolist()))
+        return SimpleNamespace(data=vecs)
+
+
+SENTENCES = [f"Sentence {i} tells of the whale and the sea, chapter {i // 5}." for i in range(60)]
+BOOK = " ".join(SENTENCES)
+
+
+@pytest.fixture()
+def sett(tmp_path):
+    try:
+        tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:
+        pytest.skip(f"chunking needs the cl100k_base encoding (downloaded on first use): {exc}")
+    sett = get_settings(is_test=True).model_copy()
+    sett._ingest_checkpoint = IngestCheckpoint(tmp_path / "cp.sqlite")
+    sett._bm25_index = BM25Index()
+    sett._book_router = BookRouter()
+    return sett
+
+
+async def upload(sett, store, embeddings, text:str, report:IngestDiffReport|None):
+    gb_meta = GBBookMeta(id=2701, title="Moby Dick", summaries=[], subjects=[], languages=["en"],
+                         authors=[], editors=[], download_count=1, formats={}, copyright=False)
+    req_lim, tok_lim = sett.get_limiters()
+    await async_upload_book_to_index(vec_store=store, embed_client=SimpleNamespace(embeddings=embeddings), token_limiter=tok_lim,
+                                     request_limiter=req_lim, raw_book_content=text, book_meta=gb_meta, sett=sett,
+                                     time_started="test", is_cleaned=True, diff_report=report)
+
+
+async def test_unchanged_book_embeds_no_chunks(sett):
+    store = InMemoryVectorStore()
+    await upload(sett, store, HashEmbeddings(), BOOK, None)
+    first_ids = {c.uuid_str for c in store.data[2701]}
+
+    report = IngestDiffReport()
+    await upload(sett, store, HashEmbeddings(), BOOK, report)
+    assert report.chunks_embedded == 0 and report.chunks_deleted == 0
+    assert report.chunks_unchanged == report.chunks_total == len(first_ids)
+    assert report.tokens_saved > 0
+    assert {c.uuid_str for c in store.data[2701]} == first_ids
+    assert sett.get_book_router().book_ids == {2701} and sett.get_bm25_index().book_ids == set()       # local bm25 is opt-in
+
+
+async def test_changed_text_only_reembeds_changed_chunks(sett):
+    store = InMemoryVectorStore()
+    await upload(sett, store, HashEmbeddings(), BOOK, None)
+    n_chunks = len(store.data[2701])
+
+    changed = BOOK.replace("Sentence 55 tells of the whale", "Sentence 55 tells of the white whale")
+    report = IngestDiffReport()
+    await upload(sett, store, HashEmbeddings(), changed, report)
+    assert 0 < report.chunks_embedded < n_chunks
+    assert report.embeddings_saved == report.chunks_total - report.chunks_embedded
+
+    stored = store.data[2701]
+    assert len(stored) == report.chunks_total                       # stale chunks deleted
+    assert "".join(c.content for c in sorted(stored, key=lambda c: c.chunk_id)).count("white whale") == 1
+    assert all(c.content_hash for c in await store.get_book_chunk_hashes(book_id=2701))
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from azure.core.credentials import AzureKeyCredential
+from azure.search.documents.aio import SearchClient
+from config.params import EmbeddingDimension
+from config.settings import Settings, get_settings
+from db.qdrant_vector_store import QdrantVectorStore, MAX_QDRANT_JSON_BYTES
+from db.az_search_vector_store import AzSearchVectorStore, DocumentUploadError
+from db.fake_vector_store import InMemoryVectorStore
+from models.vector_db_model import UploadChunk, EmbeddingVec
+from qdrant_client.models import PointsList, CollectionStatus
+
+# Unit tests of the vector store implementations - no running Qdrant/Azure needed
+# Async tests + fixtures run on pytest-asyncio's loop (asyncio_mode=auto), so the fake servers share the test's loop
+
+TRICKY_CONTENT = [
+    "plain ascii text " * 50,
+    "“I suppose, Watson,” said he — naïve café \"quoted\" \\ back\nslash\ttab " * 20,
+    "emoji 🐋🐳 and control \x0c chars æøå " * 30,
+]
+
+
+class RecordingQdrantClient:
+    """Stands in for AsyncQdrantClient and records the upserted batches."""
+    def __init__(self, latency_secs:float=0.0):
+        self.batches = []
+        self.waits = []
+        self.latency_secs = latency_secs
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.status_polls = 0
+
+    async def upsert(self, *, points, collection_name, wait=True, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency_secs)
+        self.in_flight -= 1
+        self.batches.append(points)
+        self.waits.append(wait)
+
+    async def get_collection(self, *, collection_name):
+        self.status_polls += 1
+        return SimpleNamespace(status=CollectionStatus.GREEN, 
+                               config=SimpleNamespace(params=SimpleNamespace(sparse_vectors=None)))
+
+    async def scroll(self, *, collection_name, scroll_filter, limit, with_payload, with_vectors):
+        return [], None
+
+
+def make_chunk(content:str, chunk_id:int=0) -> UploadChunk:
+    rng = np.random.default_rng(chunk_id)
+    vec = (rng.random(EmbeddingDimension.SMALL.value, dtype=np.float32) - 0.5) * 1e-3      # small values -> long float reprs
+    return UploadChunk(uuid_str=str(uuid.uuid4()), book_name="Moby Dick; Or, The Whale", book_id=2701,
+                       chunk_id=chunk_id, content=content, token_count=1, char_count=len(content),
+                       content_vector=EmbeddingVec(vector=vec, dim=EmbeddingDimension.SMALL))
+
+
+@pytest.fixture()
+def qdrant_store() -> QdrantVectorStore:
+    sett:Settings = get_settings(is_test=True)
+    store = QdrantVectorStore(settings=sett, collection_name=sett.active_collection)
+    store._client = RecordingQdrantClient()      # type:ignore
+    return store
+
+
+@pytest.mark.parametrize("with_sparse", [False, True])
+@pytest.mark.parametrize("content", TRICKY_CONTENT)
+def test_estimate_bytes_of_point_is_upper_bound(qdrant_store:QdrantVectorStore, content:str, with_sparse:bool):
+    qdrant_store._has_sparse = with_sparse
+    chunk = make_chunk(content)
+    point = qdrant_store._chunk_to_point(chunk, with_sparse=with_sparse)
+    estimate = qdrant_store._estimate_bytes_of_point(chunk)
+
+    assert estimate >= len(point.model_dump_json().encode("utf-8"))
+    assert estimate >= len(json.dumps(point.model_dump(), ensure_ascii=True).encode("utf-8"))
+    assert estimate < MAX_QDRANT_JSON_BYTES
+
+
+async def test_upsert_chunks_batches_stay_under_max_bytes(qdrant_store:QdrantVectorStore):
+    chunks = [make_chunk(TRICKY_CONTENT[i % 3], chunk_id=i) for i in range(40)]
+    max_bytes = 300_000
+
+    await qdrant_store.upsert_chunks(chunks=chunks, max_bytes=max_bytes)
+    batches = qdrant_store._client.batches     # type:ignore
+
+    assert len(batches) > 1
+    assert sum(len(b) for b in batches) == len(chunks)
+    for b in batches:
+        assert len(PointsList(points=b).model_dump_json().encode("utf-8")) <= max_bytes
+
+
+async def test_upsert_chunks_point_count_batching(qdrant_store:QdrantVectorStore):
+    chunks = [make_chunk("short", chunk_id=i) for i in range(25)]
+
+    await qdrant_store.upsert_chunks(chunks=chunks, max_points=10)
+    assert [len(b) for b in qdrant_store._client.batches] == [10, 10, 5]      # type:ignore
+
+
+async def test_upsert_chunks_bounded_concurrency_no_wait(qdrant_store:QdrantVectorStore):
+    client = RecordingQdrantClient(latency_secs=0.01)
+    qdrant_store._client = client       # type:ignore
+    chunks = [make_chunk("short", chunk_id=i) for i in range(50)]
+
+    await qdrant_store.upsert_chunks(chunks=chunks, max_points=5, max_concurrency=3, wait=False)
+
+    assert sum(len(b) for b in client.batches) == len(chunks)
+    assert 1 < client.max_in_flight <= 3
+    assert client.waits[:-1] == [False] * (len(client.batches) - 1)
+    assert client.waits[-1] is True         # last batch confirms all earlier (in order) writes are applied
+    assert client.status_polls >= 1
+
+
+async def test_keyword_search_without_sparse_vector_warns_once(qdrant_store:QdrantVectorStore, caplog):
+    with caplog.at_level("WARNING", logger="db.qdrant_vector_store"):
+        for _ in range(3):
+            assert await qdrant_store.search_by_keywords(query="white whale") == []
+    assert [r.levelname for r in caplog.records] == ["WARNING"] and "sparse vector" in caplog.records[0].getMessage()
+
+
+
+class FakeAzureSearchIndex:
+    """Local HTTP fake of the Azure AI Search `docs/search.index` endpoint. Rejects documents containing 'REJECT'."""
+    def __init__(self, latency_secs:float=0.01):
+        self.latency_secs = latency_secs
+        self.batch_sizes:list[int] = []
+        self.request_bytes:list[int] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def index(self, request:web.Request) -> web.Response:
+        raw = await request.read()
+        docs = json.loads(raw)["value"]
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency_secs)
+        self.in_flight -= 1
+        self.batch_sizes.append(len(docs))
+        self.request_bytes.append(len(raw))
+
+        results = [{"key": d["uuid_str"], 
+                    "status": "REJECT" not in d["content"], 
+                    "errorMessage": "Rejected by fake index" if "REJECT" in d["content"] else None,
+                    "statusCode": 400 if "REJECT" in d["content"] else 201} for d in docs]
+        all_ok = all(r["status"] for r in results)
+        return web.json_response({"value": results}, status=200 if all_ok else 207)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=32 * 1024**2)
+        app.router.add_post("/indexes('{index_name}')/docs/search.index", self.index)
+        return app
+
+
+@pytest.fixture()
+async def fake_azure():
+    fake = FakeAzureSearchIndex()
+    server = TestServer(fake.app())
+    await server.start_server()
+    try:
+        yield fake, str(server.make_url(""))
+    finally:
+        await server.close()
+
+
+@pytest.fixture()
+async def az_store(fake_azure):
+    fake, url = fake_azure
+    sett:Settings = get_settings(is_test=True)
+    store = AzSearchVectorStore(settings=sett)
+    store._search_client = SearchClient(endpoint=url, index_name=sett.active_collection, 
+                                        credential=AzureKeyCredential("fake-key"))
+    try:
+        yield store, fake
+    finally:
+        await store.close_conn()
+
+
+async def test_az_upsert_chunks_batches_by_count_with_bounded_concurrency(az_store):
+    store, fake = az_store
+    chunks = [make_chunk("short content", chunk_id=i) for i in range(45)]
+
+    await store.upsert_chunks(chunks=chunks, max_docs=10, max_concurrency=2)
+
+    assert sorted(fake.batch_sizes) == [5, 10, 10, 10, 10]
+    assert 1 < fake.max_in_flight <= 2
+
+
+async def test_az_upsert_chunks_batches_by_size(az_store):
+    store, fake = az_store
+    chunks = [make_chunk(TRICKY_CONTENT[i % 3], chunk_id=i) for i in range(20)]
+    max_bytes = 200_000
+
+    await store.upsert_chunks(chunks=chunks, max_bytes=max_bytes)
+
+    assert len(fake.batch_sizes) > 1 and sum(fake.batch_sizes) == len(chunks)
+    assert all(b <= max_bytes for b in fake.request_bytes)
+
+
+async def test_az_upsert_chunks_reports_failed_documents(az_store):
+    store, fake = az_store
+    chunks = [make_chunk("REJECT me" if i in (3, 17) else "fine", chunk_id=i) for i in range(30)]
+
+    with pytest.raises(DocumentUploadError) as exc_info:
+        await store.upsert_chunks(chunks=chunks, max_docs=10)
+
+    assert sum(fake.batch_sizes) == len(chunks)         # remaining batches are still sent
+    assert {r.key for r in exc_info.value.failed} == {chunks[3].uuid_str, chunks[17].uuid_str}
+
+
+async def test_az_default_fields_include_content_hash(az_store):
+    store, _ = az_store
+    assert "content_hash" in store._select(None)        # like the Qdrant/in-memory payloads
+    assert store._select(["book_id"]) == ["book_id"]
+
+
+async def test_search_by_embedding_returns_only_requested_fields():
+    store = InMemoryVectorStore()
+    await store.upsert_chunks(chunks=[make_chunk("some text", chunk_id=i) for i in range(3)])
+    query_vec = make_chunk("query").content_vector
+
+    hits = await store.search_by_embedding(embed_query_vector=query_vec, k=2, fields=["book_id", "chunk_nr"])
+    assert len(hits) == 2
+    assert all(h.content is None and h.book_name is None for h in hits)
+    assert all(h.book_id is not None and h.chunk_id is not None for h in hits)
+
+    all_fields_hits = await store.search_by_embedding(embed_query_vector=query_vec, k=2)
+    assert all(h.content == "some text" for h in all_fields_hits)
+
+
+async def test_search_by_embedding_rejects_unknown_fields():
+    store = InMemoryVectorStore()
+    with pytest.raises(ValueError):
+        await store.search_by_embedding(embed_query_vector=make_chunk("query").content_vector, fields=["content_vector"])
@@ -2,6 +2,7 @@ from datetime import datetime
 import uuid, tiktoken
 from statistics import mean, median, stdev
 import asyncio
+import numpy as np
 # from azure.search.documents import SearchClient,SearchItemPaged
 
 from pyrate_limiter import Limiter
@@ -10,10 +11,11 @@ from pathlib import Path
 from create_visualizations import plot_token_counts_bar
 from ingestion.preprocess_book import clean_headers 
 from ingestion.chunking import fixed_size_chunking
+from ingestion.checkpoints import chunk_point_id
 from config.settings import Settings, get_settings
 from embedding_pipeline import _count_tokens, batch_texts_by_tokens, create_embeddings_async
 from models.api_response_model import GBBookMeta
-from models.vector_db_model import EmbeddingVec, UploadChunk
+from models.vector_db_model import EmbeddingVec, UploadChunk, IngestDiffReport, content_sha256
 from db.vector_store_abstract import AsyncVectorStore
 from config.params import EmbeddingDimension
 from models.schema import DBBookChunkStats
@@ -109,10 +111,13 @@ async def async_upload_book_to_index(*, vec_store:AsyncVectorStore,
                                 book_meta: GBBookMeta,
                                 sett:Settings,
                                 time_started:str,
-                                calc_chunk_stats=True
+                                calc_chunk_stats=True,
+                                is_cleaned=False,
+                                diff_report:IngestDiffReport|None=None,
                             ) -> tuple[list[UploadChunk], DBBookChunkStats|None]:
-    
-    book_str = clean_headers(raw_book=raw_book_content) if not sett.is_test else raw_book_content
+    # is_cleaned: header/footer already stripped while streaming the download (GutenbergTextCleaner)
+    # diff_report: diff against the book's stored chunks, only new/changed chunks are embedded + upserted, the savings are added to it
+    book_str = raw_book_content if is_cleaned or sett.is_test else clean_headers(raw_book=raw_book_content)
     
     if len(book_str) == 0:      
         return ([], None)
@@ -121,14 +126,19 @@ async def async_upload_book_to_index(*, vec_store:AsyncVectorStore,
     vector_items_added:list[UploadChunk] = []
     
     hp = sett.get_hyperparams()
+    checkpoint = sett.get_ingest_checkpoint()
+    await asyncio.to_thread(checkpoint.start_book, book_meta.id, hp.config_id)
 
     embed_model = RateLimitedAzureEmbedding(
                         embed_client=embed_client,
-                        deployment_name="text-embedding-3-small",
+                        deployment_name=sett.EMBED_MODEL_DEPLOYMENT,
                         tok_limiter=token_limiter,
                         req_limiter=request_limiter,
                         batch_size=hp.ingestion.max_tokens_pr_req,
                         embed_dim_value=hp.ingestion.embed_dim,
+                        checkpoint=checkpoint,          # splitter + chunk embeddings already paid for by a failed run are reused
+                        book_id=book_meta.id,
+                        embedding_store=sett.get_embedding_store(),     # ... and the ones of other collections/configs
                     )
 
     splitter = SemanticSplitterNodeParser(
@@ -142,22 +152,64 @@ async def async_upload_book_to_index(*, vec_store:AsyncVectorStore,
     nodes = await asyncio.to_thread(splitter.get_nodes_from_documents, [doc])
 
     chunks: list[str] = [n.get_content() for n in nodes]
-    embeddings = await embed_model._aget_text_embeddings(chunks)
+    hashes = [content_sha256(c) for c in chunks]
+
+    stored_ids: set[str] = set()
+    unchanged_ids: set[str] = set()                 # stored with the same id, incl. its content hash -> nothing to upload
+    stored_vecs: dict[str, np.ndarray] = {}         # content hash -> stored vector
+    if diff_report is not None:
+        stored = await vec_store.get_book_chunk_hashes(book_id=book_meta.id)
+        stored_ids = {c.uuid_str for c in stored if c.uuid_str}
+        unchanged_ids = {c.uuid_str for c in stored if c.uuid_str and c.content_hash}
+        stored_vecs = {c.content_hash: c.vector for c in stored if c.content_hash and c.vector is not None}
+
+    to_embed = [c for c, h in zip(chunks, hashes) if h not in stored_vecs]
+    summary = " ".join(book_meta.summaries).strip()
+    embeddings = await embed_model.aget_embedding_vecs(to_embed + ([summary] if summary else []))     # summary is embedded in the same batches
+    summary_vec = embeddings.pop().vector if summary else None
+    embedded = dict(zip(to_embed, embeddings))
     
-    for i, (chunk, emb_vec) in enumerate(zip(chunks, embeddings)):
+    enc = tiktoken.get_encoding("cl100k_base")
+    for i, (chunk, h) in enumerate(zip(chunks, hashes)):
+        emb_vec = embedded.get(chunk)
+        if emb_vec is None:
+            emb_vec = EmbeddingVec(vector=stored_vecs[h], dim=EmbeddingDimension(stored_vecs[h].shape[0]))
         chapter_item = UploadChunk(
-                            uuid_str=str(uuid.uuid4()),
+                            uuid_str=chunk_point_id(book_id=book_meta.id, config_id=hp.config_id, chunk_nr=i, content=chunk),
                             book_name=book_meta.title,
                             book_id=book_meta.id,
                             chunk_id=i,
                             content=chunk,
-                            content_vector=EmbeddingVec(vector=emb_vec, dim=EmbeddingDimension.SMALL),
+                            content_vector=emb_vec,
                             char_count=len(chunk),
-                            token_count=_count_tokens(chunk, enc=tiktoken.get_encoding("cl100k_base"))
+                            token_count=_count_tokens(chunk, enc=enc)
                         )
         upload_chunks.append(chapter_item)
- 
-    await vec_store.upsert_chunks(chunks=upload_chunks)
+
+    # unchanged chunks have the same deterministic id, only new/moved ones are upserted, then the stale ones deleted
+    to_upsert = [c for c in upload_chunks if c.uuid_str not in unchanged_ids]
+    stale_ids = stored_ids - {c.uuid_str for c in upload_chunks}
+    if to_upsert:
+        await vec_store.upsert_chunks(chunks=to_upsert)
+    if stale_ids:
+        await vec_store.delete_chunks(uuids=stale_ids)
+
+    if diff_report is not None:
+        reused = [c for c in upload_chunks if c.content not in embedded]
+        diff_report.books += 1
+        diff_report.chunks_total += len(upload_chunks)
+        diff_report.chunks_unchanged += len(upload_chunks) - len(to_upsert)
+        diff_report.chunks_reused += len(reused) - (len(upload_chunks) - len(to_upsert))
+        diff_report.chunks_embedded += len(embedded)
+        diff_report.chunks_deleted += len(stale_ids)
+        diff_report.tokens_saved += sum(c.token_count for c in reused)
+
+    if hp.retrieval.keyword_index == "local_bm25":      # opt-in local keyword index (stores the chunk texts), replaces the book's old segment
+        await asyncio.to_thread(sett.get_bm25_index().add_chunks, upload_chunks)
+    await asyncio.to_thread(sett.get_book_router().add_book, book_meta.id, 
+                            np.stack([c.content_vector.vector for c in upload_chunks]), summary_vec, 
+                            n_centroids=hp.ingestion.router_centroids_pr_book)
+    await asyncio.to_thread(checkpoint.finish_book, book_meta.id)
     hp = sett.get_hyperparams()
     book_chunk_stats = calc_book_chunk_stats(all_chunks=upload_chunks, conf_id=hp.config_id)
 
@@ -171,6 +223,26 @@ async def async_upload_book_to_index(*, vec_store:AsyncVectorStore,
     return vector_items_added, book_chunk_stats
 
 
+async def backfill_book_router(*, sett:Settings, vec_store:AsyncVectorStore) -> set[int]:
+    """
+    Add the stored books the book router doesn't know (e.g. indexed before it existed) from their stored chunk vectors,
+    without a summary vector, then mark the router complete so two-stage search can filter by it.
+    Ingestion keeps it complete from then on. Returns: the backfilled book_ids
+    """
+    router = sett.get_book_router()
+    missing = await vec_store.get_all_book_ids() - router.book_ids
+    for b_id in sorted(missing):
+        chunks = await vec_store.get_book_chunk_hashes(book_id=b_id)
+        vecs = [c.vector for c in chunks if c.vector is not None]
+        if vecs:
+            await asyncio.to_thread(router.add_book, b_id, np.stack(vecs), 
+                                    n_centroids=sett.get_hyperparams().ingestion.router_centroids_pr_book)
+    router.complete = True
+    if missing:
+        print(f"Book router backfilled with {len(missing)} books from their stored vectors")
+    return missing
+
+
 
 async def _try():
     from ingestion.book_loader import _load_gb_meta_local